@@ -1,3 +1,4 @@
+import argparse
 import logging
 import os
 import sys
@@ -6,6 +7,7 @@ import random
 import time
 
 # pyinstaller --onefile --add-data "templates:templates" --name EKS_Configurator app.py
+# For faster start-up use 'python build.py --mode onedir' or '--mode zipapp', see build.py
 
 # Set up logging
 logging.basicConfig(
@@ -25,6 +27,9 @@ def get_user_selection():
         '2': 'Ingress',
         '3': 'Config-map',
         '4': 'Secret',
+        '5': 'HorizontalPodAutoscaler',
+        '6': 'PodDisruptionBudget',
+        '7': 'JVM Tuning',
     }
 
     for key, value in options.items():
@@ -53,6 +58,33 @@ def get_ingress_path():
     ingress_path = input("e.g. '/your-microservice/api' : ").strip()
     return ingress_path
 
+def get_ingress_profile():
+    from utils.eks_handler import load_ingress_profiles
+
+    profiles = load_ingress_profiles()
+    print("\nSelect an Ingress performance profile (press Enter for none):")
+    names = list(profiles)
+    for number, name in enumerate(names, start=1):
+        print(f"{number}. {name} - {profiles[name].get('description', '')}")
+    choice = input("Enter the number of the profile: ").strip()
+    if not choice:
+        return None
+    if choice.isdigit() and 1 <= int(choice) <= len(names):
+        return names[int(choice) - 1]
+    print("Invalid profile selected, no profile is applied.")
+    return None
+
+def get_hpa_custom_metric():
+    print("\nEnter a custom per-pod metric the HorizontalPodAutoscaler should also scale on (press Enter for CPU and memory only)")
+    metric_name = input("e.g. 'http_requests_per_second' : ").strip()
+    if not metric_name:
+        return None
+    target = input(f"Enter the target average value of {metric_name} per pod: ").strip()
+    if not target:
+        print("No target entered, the custom metric is skipped.")
+        return None
+    return {'name': metric_name, 'target': target}
+
 def get_options(prompt, options_dict, custom_option_name):
     """
     Generic function to get options from the user, including handling custom options.
@@ -161,18 +193,34 @@ def get_thank_you_message():
     ]
     return random.choice(messages)
 
-def animate_text(text):
+def is_interactive():
+    """True when a person is at the console, False for piped or scripted runs."""
+    return sys.stdin.isatty() and sys.stdout.isatty()
+
+def animate_text(text, animate=True):
+    if not animate:
+        print(text)
+        return
     for char in text:
         print(char, end='', flush=True)
         time.sleep(0.05)
     print()
 
-def main():
-    print_ascii_logo()
-    animate_text("Welcome to EKS Configurator!")
-    print("\nMade with love <3 by HyperAutomation - ITaaP team\n")
-    print(get_welcome_message())
-    print("------------------------------------")
+def pause_before_exit(seconds, fast_start=False):
+    # Keeps the console window of a double-clicked binary open long enough to read the last message
+    if not fast_start:
+        time.sleep(seconds)
+
+def main(fast_start=None, server_side_apply=False):
+    if fast_start is None:
+        fast_start = not is_interactive()
+
+    if not fast_start:
+        print_ascii_logo()
+        animate_text("Welcome to EKS Configurator!")
+        print("\nMade with love <3 by HyperAutomation - ITaaP team\n")
+        print(get_welcome_message())
+        print("------------------------------------")
     
     try:
         current_dir = os.getcwd()
@@ -186,13 +234,16 @@ def main():
         if not os.path.exists(yaml_file_path):
             logging.error(f"Error: '{yaml_file_name}' not found in the current directory.")
             print(f"Error: '{yaml_file_name}' not found in the current directory, closing the application...")
-            time.sleep(10)
+            pause_before_exit(10, fast_start)
             sys.exit(1)
         option_map = {
             'Service Account': 'Service Account',
             'Ingress': 'Ingress',
             'Config-map': 'Config-map',
-            'Secret': 'Secret'
+            'Secret': 'Secret',
+            'HorizontalPodAutoscaler': 'HorizontalPodAutoscaler',
+            'PodDisruptionBudget': 'PodDisruptionBudget',
+            'JVM Tuning': 'JVM Tuning'
         }
 
         while True:
@@ -200,7 +251,7 @@ def main():
 
             if selected_configs == 'quit':
                 print(get_thank_you_message())
-                time.sleep(5)
+                pause_before_exit(5, fast_start)
                 sys.exit(0)
 
             if not selected_configs:
@@ -212,18 +263,25 @@ def main():
             ingress_path = None
             configmap_options = None
             secretmap_options = None
+            hpa_custom_metric = None
+            ingress_profile = None
             
             for config in selected_configs:
                 if config == 'Ingress':
                     ingress_path = get_ingress_path()
+                    ingress_profile = get_ingress_profile()
                 elif config == 'Config-map': 
                     configmap_options = get_configmap_options()
                 elif config == 'Secret':
                     secretmap_options = get_secretmap_options()
+                elif config == 'HorizontalPodAutoscaler':
+                    hpa_custom_metric = get_hpa_custom_metric()
                 options.append(option_map[config])
 
             # Handle the YAML modifications based on the user's selection
-            handle_eks_yaml(yaml_file_path, options, ingress_path, configmap_options, secretmap_options)
+            handle_eks_yaml(yaml_file_path, options, ingress_path, configmap_options, secretmap_options,
+                            server_side_apply=server_side_apply, hpa_custom_metric=hpa_custom_metric,
+                            ingress_profile=ingress_profile)
 
             logging.info("Configurations added successfully!")
             print("Configurations added successfully!")
@@ -231,19 +289,395 @@ def main():
             continue_choice = input("Do you want to add another configuration? (yes/no): ").strip().lower()
             if continue_choice != 'yes':
                 print(get_thank_you_message())
-                time.sleep(5)
+                pause_before_exit(5, fast_start)
                 break
                 
     except KeyError as e:
         logging.exception(f"A KeyError occurred: {e}")
         print(f"A KeyError occurred: {e}. Please check your input.")
-        time.sleep(5)
+        pause_before_exit(5, fast_start)
         sys.exit(1)
     except Exception as e:
         logging.exception("An unexpected error occurred:")
         print("An unexpected error occurred. Check the log file for details.")
-        time.sleep(5)
+        pause_before_exit(5, fast_start)
         sys.exit(1)
 
+def read_repo_list(repos_file):
+    """Read repo directories from a file, one per line. Blank lines and '#' comments are skipped."""
+    with open(repos_file, 'r') as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith('#')]
+
+def run_fleet_command(args):
+    """Apply a selection spec to many repos without prompting."""
+    from utils.fleet_handler import load_selection_spec, run_fleet, print_fleet_report
+
+    repo_dirs = list(args.repos)
+    if args.repos_file:
+        repo_dirs.extend(read_repo_list(args.repos_file))
+
+    if not repo_dirs:
+        print("No repo directories given.")
+        return 1
+
+    try:
+        selection = load_selection_spec(args.spec)
+    except (OSError, ValueError) as e:
+        logging.error(f"Invalid selection spec '{args.spec}': {e}")
+        print(f"Invalid selection spec '{args.spec}': {e}")
+        return 1
+
+    logging.info(f"Configuring {len(repo_dirs)} repos with {args.spec}")
+    results, elapsed = run_fleet(repo_dirs, selection, max_workers=args.workers, incremental=args.incremental)
+    print_fleet_report(results, elapsed)
+
+    return 0 if all(result['success'] for result in results) else 1
+
+def run_reconcile_command(args):
+    """Bring repos in line with their desired-state file, changing only what differs."""
+    import contextlib
+    import io
+    from utils.reconciler import DESIRED_STATE_FILE_NAME, load_desired_state, reconcile_repo
+
+    failed = 0
+    for repo_dir in args.repos or ['.']:
+        state_path = args.state or os.path.join(repo_dir, DESIRED_STATE_FILE_NAME)
+        try:
+            desired = load_desired_state(state_path)
+            # The handlers print progress for the interactive mode, the change list replaces it
+            with contextlib.redirect_stdout(io.StringIO()):
+                changes = reconcile_repo(repo_dir, desired, dry_run=args.dry_run)
+        except Exception as e:
+            logging.exception(f"Failed to reconcile {repo_dir}:")
+            print(f"FAIL    {repo_dir} - {e}")
+            failed += 1
+            continue
+
+        if not changes:
+            print(f"IN SYNC {repo_dir}")
+            continue
+        print(f"{'PLAN   ' if args.dry_run else 'CHANGED'} {repo_dir}")
+        for change in changes:
+            print(f"    {change}")
+
+    return 1 if failed else 0
+
+def run_serve_command(args):
+    """Serve configure/preview/reconcile requests over HTTP/JSON until interrupted."""
+    import contextlib
+    import signal
+    from utils.api_server import create_server, warm_up
+
+    warm_up()
+    server = create_server(args.host, args.port, socket_path=args.socket, repo_root=args.repo_root)
+    address = args.socket or f"http://{args.host}:{args.port}"
+    logging.info(f"API server listening on {address}")
+    print(f"EKS Configurator API listening on {address} (Ctrl+C to stop)", flush=True)
+
+    # Stop as cleanly on SIGTERM (service managers, containers) as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        # The handlers print progress for the interactive mode, which has no place in server output
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+def run_apply_command(args):
+    """Filter a multi-document manifest from stdin (or --input) to stdout (or --output)."""
+    from utils.fleet_handler import load_selection_spec
+    from utils.stream_filter import filter_stream
+
+    try:
+        selection = load_selection_spec(args.spec)
+    except (OSError, ValueError) as e:
+        logging.error(f"Invalid selection spec '{args.spec}': {e}")
+        print(f"Invalid selection spec '{args.spec}': {e}", file=sys.stderr)
+        return 1
+
+    input_file = open(args.input, 'rb') if args.input != '-' else sys.stdin.buffer
+    output_file = open(args.output, 'wb') if args.output != '-' else sys.stdout.buffer
+    try:
+        filter_stream(input_file, output_file, selection, app=args.app)
+    except ValueError as e:
+        logging.error(str(e))
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        for file in (input_file, output_file):
+            if file not in (sys.stdin.buffer, sys.stdout.buffer):
+                file.close()
+    return 0
+
+def parse_variables(assignments):
+    """Turn NAME=VALUE strings into a dict."""
+    variables = {}
+    for assignment in assignments or []:
+        name, separator, value = assignment.partition('=')
+        if not separator or not name:
+            raise ValueError(f"Expected NAME=VALUE, got '{assignment}'")
+        variables[name] = value
+    return variables
+
+def run_render_command(args):
+    """Render the manifests of every pipeline environment ahead of deployment."""
+    from utils.prerender import prerender_repo
+
+    output_dir = args.output or os.path.join(args.repo, 'rendered')
+    try:
+        variables = parse_variables(args.var)
+        result = prerender_repo(args.repo, output_dir, variables=variables, force=args.force)
+    except (OSError, ValueError) as e:
+        logging.error(f"Rendering {args.repo} failed: {e}")
+        print(f"Rendering {args.repo} failed: {e}")
+        return 1
+
+    if result['errors']:
+        for error in result['errors']:
+            print(f"ERROR {error}")
+        print(f"Nothing written, {len(result['errors'])} problems found.")
+        return 1
+
+    for name, environment in result['manifest']['environments'].items():
+        line = f"{name:<12} {environment['namespace'] or '-':<40} {len(environment['files'])} files"
+        if environment['deploy_time_variables']:
+            line += f", set at deploy time: {', '.join(environment['deploy_time_variables'])}"
+        print(line)
+    print(f"{'Up to date' if result['cached'] else 'Rendered'}: {output_dir}")
+    return 0
+
+def run_resources_command(args):
+    """Size container requests and limits from recorded usage samples."""
+    from utils.resources_advisor import advise_resources, read_samples
+
+    file_path = os.path.join(args.repo, 'eks-deployment.yaml')
+    containers = args.containers if args.containers in (None, 'all') else [name.strip() for name in args.containers.split(',')]
+    try:
+        samples = read_samples(args.samples)
+        sized = advise_resources(
+            file_path, samples, target_containers=containers, dry_run=args.dry_run,
+            request_percentile=args.request_percentile, limit_percentile=args.limit_percentile, headroom=args.headroom
+        )
+    except (OSError, ValueError) as e:
+        logging.error(f"Sizing resources from {args.samples} failed: {e}")
+        print(f"Sizing resources from {args.samples} failed: {e}")
+        return 1
+
+    if not sized:
+        print(f"No container in {file_path} matches the samples.")
+        return 1
+    for name, recommendation in sized.items():
+        observed = recommendation['observed']
+        print(f"{name}: requests {recommendation['requests']['cpu']}/{recommendation['requests']['memory']}, "
+              f"limits {recommendation['limits']['cpu']}/{recommendation['limits']['memory']} "
+              f"({observed['samples']} samples, peak {observed['cpu_max']}/{observed['memory_max']})")
+    if args.dry_run:
+        print("Dry run, eks-deployment.yaml was not changed.")
+    return 0
+
+def run_pool_command(args):
+    """Size the HikariCP pools of the services sharing a database within its connection budget."""
+    from utils.pool_sizing import load_pool_spec, plan_pools, pool_settings, write_pool_settings
+
+    try:
+        spec = load_pool_spec(args.spec)
+        plan = plan_pools(spec)
+    except (OSError, ValueError) as e:
+        logging.error(f"Sizing connection pools from {args.spec} failed: {e}")
+        print(f"Sizing connection pools from {args.spec} failed: {e}")
+        return 1
+
+    for service in plan['services']:
+        print(f"{service['name']}: {service['cpu']:g} cores, {service['min_replicas']}-{service['max_replicas']} replicas, "
+              f"pool {service['pool']} (wanted {service['desired']}), {service['connections']} connections at max replicas")
+    print(f"Total: {plan['total']} of {plan['available']} available connections")
+    for warning in plan['warnings']:
+        print(f"WARNING: {warning}")
+
+    if not plan['fits']:
+        print("The pools do not fit the budget, no files were changed.")
+        return 1
+    if args.dry_run:
+        print("Dry run, no files were changed.")
+        return 0
+
+    for service in plan['services']:
+        if not service['repo']:
+            continue
+        settings = pool_settings(
+            service['pool'], connection_timeout_ms=spec['connection_timeout_ms'],
+            idle_timeout_ms=spec['idle_timeout_ms'], max_lifetime_ms=spec['max_lifetime_ms'])
+        try:
+            changed = write_pool_settings(service['repo'], settings)
+        except (OSError, ValueError) as e:
+            logging.error(f"Writing the pool settings of {service['name']} failed: {e}")
+            print(f"Writing the pool settings of {service['name']} failed: {e}")
+            return 1
+        print(f"{service['repo']}: {'updated ' + ', '.join(os.path.basename(path) for path in changed) if changed else 'up to date'}")
+    return 0
+
+def run_scan_command(args):
+    """Scan many repos into the SQLite inventory database."""
+    from utils.inventory import scan_fleet
+
+    repo_dirs = list(args.repos)
+    if args.repos_file:
+        repo_dirs.extend(read_repo_list(args.repos_file))
+    if not repo_dirs:
+        print("No repo directories given.")
+        return 1
+
+    report = scan_fleet(repo_dirs, database_path=args.db, max_workers=args.workers, full=args.full)
+    for repo_dir in report['failed']:
+        print(f"FAIL {repo_dir}")
+    print(f"{len(report['scanned'])} scanned, {len(report['skipped'])} unchanged, {len(report['failed'])} failed "
+          f"in {report['elapsed']:.2f}s: {args.db}")
+    return 1 if report['failed'] else 0
+
+def run_query_command(args):
+    """Answer fleet-wide questions from the inventory database."""
+    import sqlite3
+    from utils.inventory import QUERIES, query_inventory
+
+    if args.sql:
+        sql, parameters = args.sql, ()
+    elif args.query:
+        if args.query not in QUERIES:
+            print(f"Unknown query '{args.query}'. Available queries: {', '.join(sorted(QUERIES))}.")
+            return 1
+        sql, parameters = QUERIES[args.query][1], {'value': args.value}
+        if args.value is None and ':value' in sql:
+            print(f"The {args.query} query needs a value, e.g. 'query {args.query} NAME'.")
+            return 1
+    else:
+        for name, (description, _) in QUERIES.items():
+            print(f"{name:<14} {description}")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        columns, rows = query_inventory(args.db, sql, parameters)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Query failed: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    if columns:
+        print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join('' if value is None else str(value) for value in row))
+    print(f"({len(rows)} rows in {elapsed * 1000:.1f} ms)", file=sys.stderr)
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EKS Configurator. Runs interactively when no command is given.")
+    parser.add_argument('--fast-start', action='store_true', default=None,
+                        help="Skip the banner, animation and exit pauses. Implied when not run from a terminal.")
+    parser.add_argument('--server-side-apply', action='store_true',
+                        help="Also rewrite the pipeline's kubectl applies into one server-side apply per stage.")
+    parser.add_argument('--profile', nargs='?', const='table', choices=('table', 'json'), default=None,
+                        help="Print per-stage timings on exit; 'json' also writes them to --profile-output.")
+    parser.add_argument('--profile-output', default='eks_configurator_profile.json',
+                        help="Where '--profile json' writes its report (default: %(default)s).")
+    parser.add_argument('--cprofile', metavar='PATH', help="Also record a cProfile of the run to PATH (implies --profile).")
+    parser.add_argument('--tracemalloc', action='store_true', help="Also report peak memory and top allocations (implies --profile).")
+    subparsers = parser.add_subparsers(dest='command')
+
+    fleet_parser = subparsers.add_parser('fleet', help="Apply a selection spec to many repos in parallel, without prompts.")
+    fleet_parser.add_argument('repos', nargs='*', help="Repo directories containing eks-deployment.yaml.")
+    fleet_parser.add_argument('--spec', required=True, help="YAML/JSON file with the options to apply.")
+    fleet_parser.add_argument('--repos-file', help="File listing repo directories, one per line.")
+    fleet_parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count).")
+    fleet_parser.add_argument('--incremental', action='store_true',
+                              help="Skip repos whose files and spec are unchanged since their last incremental run.")
+
+    reconcile_parser = subparsers.add_parser('reconcile', help="Bring repos in line with a desired-state file, adding and removing only what differs.")
+    reconcile_parser.add_argument('repos', nargs='*', help="Repo directories (default: the current directory).")
+    reconcile_parser.add_argument('--state', help="Desired-state file for every repo (default: eks-desired-state.yaml in each repo).")
+    reconcile_parser.add_argument('--dry-run', action='store_true', help="Only print the changes that would be made.")
+
+    apply_parser = subparsers.add_parser('apply', help="Add ConfigMap/Secret env entries to a manifest stream, e.g. between helm template and kubectl apply.")
+    apply_parser.add_argument('--spec', required=True, help="YAML/JSON file with the options to apply (Config-map and Secret only).")
+    apply_parser.add_argument('--app', help="Only change Deployments with this app label.")
+    apply_parser.add_argument('--input', default='-', help="Manifest to read (default: stdin).")
+    apply_parser.add_argument('--output', default='-', help="Where to write the result (default: stdout).")
+
+    render_parser = subparsers.add_parser('render', help="Render the manifests of every pipeline stage ahead of deployment.")
+    render_parser.add_argument('repo', nargs='?', default='.', help="Repo directory (default: the current directory).")
+    render_parser.add_argument('--output', help="Artifact directory (default: <repo>/rendered).")
+    render_parser.add_argument('--var', action='append', metavar='NAME=VALUE',
+                               help="Value of a pipeline variable, e.g. imageTagName=1.4.2. Repeatable.")
+    render_parser.add_argument('--force', action='store_true', help="Render even when the artifacts are up to date.")
+
+    resources_parser = subparsers.add_parser('resources', help="Set container requests and limits from recorded CPU/memory usage samples.")
+    resources_parser.add_argument('samples', help="CSV or Parquet file with cpu (cores) and memory (bytes) columns, optionally container.")
+    resources_parser.add_argument('--repo', default='.', help="Repo directory (default: the current directory).")
+    resources_parser.add_argument('--containers', help="Containers for samples without a container column: 'all' or comma-separated names (default: the first).")
+    resources_parser.add_argument('--request-percentile', type=float, default=90, help="Usage percentile for requests (default: %(default)s).")
+    resources_parser.add_argument('--limit-percentile', type=float, default=99, help="Usage percentile for limits (default: %(default)s).")
+    resources_parser.add_argument('--headroom', type=float, default=1.2, help="Factor applied on top of the limit percentile (default: %(default)s).")
+    resources_parser.add_argument('--dry-run', action='store_true', help="Only print the recommendations.")
+
+    pool_parser = subparsers.add_parser('pool', help="Size the HikariCP pools of the services sharing a database within its connection budget.")
+    pool_parser.add_argument('spec', help="YAML file with the database budget and the services sharing it.")
+    pool_parser.add_argument('--dry-run', action='store_true', help="Only print the pool sizes.")
+
+    scan_parser = subparsers.add_parser('scan', help="Scan many repos into a SQLite inventory for fleet-wide queries.")
+    scan_parser.add_argument('repos', nargs='*', help="Repo directories containing eks-deployment.yaml.")
+    scan_parser.add_argument('--repos-file', help="File listing repo directories, one per line.")
+    scan_parser.add_argument('--db', default='fleet-inventory.db', help="Inventory database (default: %(default)s).")
+    scan_parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count).")
+    scan_parser.add_argument('--full', action='store_true', help="Scan every repo, also those whose files are unchanged.")
+
+    query_parser = subparsers.add_parser('query', help="Query the inventory, e.g. 'query env-ref DB_PASSWORD' or 'query missing-kind Ingress'.")
+    query_parser.add_argument('query', nargs='?', help="Name of a predefined query, or none to list them.")
+    query_parser.add_argument('value', nargs='?', help="The value the query looks for.")
+    query_parser.add_argument('--sql', help="Run this SQL against the inventory instead, read-only.")
+    query_parser.add_argument('--db', default='fleet-inventory.db', help="Inventory database (default: %(default)s).")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve configure/preview/reconcile requests over HTTP/JSON with warm caches.")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: %(default)s).")
+    serve_parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: %(default)s).")
+    serve_parser.add_argument('--socket', help="Listen on this Unix socket instead of a TCP port.")
+    serve_parser.add_argument('--repo-root', help="Only accept repos below this directory.")
+
+    return parser.parse_args(argv)
+
+def cli(argv=None):
+    args = parse_args(argv)
+    profiling = args.profile or args.cprofile or args.tracemalloc
+    if profiling:
+        from utils import timing
+        timing.start_profiling(cprofile_path=args.cprofile, trace_memory=args.tracemalloc)
+
+    try:
+        if args.command == 'fleet':
+            sys.exit(run_fleet_command(args))
+        if args.command == 'reconcile':
+            sys.exit(run_reconcile_command(args))
+        if args.command == 'apply':
+            sys.exit(run_apply_command(args))
+        if args.command == 'render':
+            sys.exit(run_render_command(args))
+        if args.command == 'resources':
+            sys.exit(run_resources_command(args))
+        if args.command == 'pool':
+            sys.exit(run_pool_command(args))
+        if args.command == 'scan':
+            sys.exit(run_scan_command(args))
+        if args.command == 'query':
+            sys.exit(run_query_command(args))
+        if args.command == 'serve':
+            sys.exit(run_serve_command(args))
+        main(fast_start=args.fast_start, server_side_apply=args.server_side_apply)
+    finally:
+        if profiling:
+            timing.stop_profiling(json_path=args.profile_output if args.profile == 'json' else None)
+
 if __name__ == "__main__":
-    main()
+    cli()
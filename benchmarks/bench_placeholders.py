@@ -0,0 +1,73 @@
+"""
+Compare the legacy regex placeholder round-trip with the placeholder-aware YAML processor.
+
+Usage:
+    python benchmarks/bench_placeholders.py --placeholders 100 1000 5000
+"""
+import argparse
+import io
+import re
+import sys
+
+from generator import best_of, generate_deployment
+from ruamel.yaml import YAML
+
+from utils.placeholder_yaml import create_yaml
+
+
+def legacy_round_trip(content):
+    """The regex pre-pass / str.replace post-pass the utils modules used before."""
+    yaml = YAML()
+    yaml.preserve_quotes = True
+    yaml.default_flow_style = False
+    yaml.width = float('inf')
+    yaml.indent(mapping=2, sequence=4, offset=2)
+
+    placeholder_map = {}
+
+    def replace_placeholder(match):
+        placeholder = f'__PLACEHOLDER_{len(placeholder_map) + 1}__'
+        placeholder_map[placeholder] = match.group(0)
+        return placeholder
+
+    content = re.sub(r'\{\{.*?\}\}', replace_placeholder, content)
+    documents = list(yaml.load_all(content))
+
+    stream = io.StringIO()
+    yaml.dump_all(documents, stream)
+    content = stream.getvalue()
+    for placeholder, original_value in placeholder_map.items():
+        content = content.replace(placeholder, original_value)
+    return content
+
+
+def placeholder_round_trip(content):
+    yaml = create_yaml()
+    documents = list(yaml.load_all(content))
+
+    stream = io.StringIO()
+    yaml.dump_all(documents, stream)
+    return stream.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--placeholders', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'placeholders':>12} {'legacy (s)':>12} {'native (s)':>12} {'speedup':>8}")
+    for count in args.placeholders:
+        content = generate_deployment(placeholder_count=count)
+        if legacy_round_trip(content) != placeholder_round_trip(content):
+            print(f"Round-trip output differs for {count} placeholders")
+            return 1
+
+        legacy = best_of(lambda: legacy_round_trip(content), args.repeat)
+        native = best_of(lambda: placeholder_round_trip(content), args.repeat)
+        print(f"{count:>12} {legacy:>12.4f} {native:>12.4f} {legacy / native:>7.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
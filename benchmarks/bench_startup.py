@@ -0,0 +1,75 @@
+"""
+Measure time-to-first-prompt and time-to-exit of the configurator.
+
+The tool is started in a scratch directory holding a copy of eks-deployment.yaml,
+answers 'quit' at the first prompt, and the timings of each run are reported.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --command dist/EKS_Configurator/EKS_Configurator
+    python benchmarks/bench_startup.py --command "python3 dist/EKS_Configurator.pyz"
+"""
+import argparse
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b'Enter the numbers'
+
+
+def run_once(command, work_dir):
+    """Return (time to first prompt, time to exit) in seconds for one run."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=work_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    output = b''
+    while PROMPT not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            raise RuntimeError(f"Process exited before prompting: {output.decode(errors='replace')}")
+        output += chunk
+    first_prompt = time.perf_counter() - start
+
+    process.stdin.write(b'quit\n')
+    process.stdin.close()
+    process.stdout.read()
+    process.wait()
+    exited = time.perf_counter() - start
+
+    return first_prompt, exited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--command', default=None, help="Command to start the tool (default: this checkout's app.py).")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command:
+        # The tool runs in a scratch directory, so resolve relative paths now
+        command = [os.path.abspath(part) if os.path.exists(part) else part for part in shlex.split(args.command)]
+    else:
+        command = [sys.executable, os.path.join(PROJECT_DIR, 'app.py')]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        shutil.copy(os.path.join(PROJECT_DIR, 'eks-deployment.yaml'), work_dir)
+
+        prompts, exits = [], []
+        for _ in range(args.repeat):
+            first_prompt, exited = run_once(command, work_dir)
+            prompts.append(first_prompt)
+            exits.append(exited)
+
+    print(f"command: {' '.join(command)}")
+    print(f"time to first prompt: min {min(prompts):.3f}s  avg {sum(prompts) / len(prompts):.3f}s")
+    print(f"time to exit:         min {min(exits):.3f}s  avg {sum(exits) / len(exits):.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Time the public configurator functions and handle_eks_yaml on a generated repo.
+
+Every run starts from a fresh copy of the generated files. Results can be saved as
+JSON and compared with an earlier run to spot regressions.
+
+Usage:
+    python benchmarks/bench_suite.py --documents 50 --env-vars 40 --placeholders 200 --stages 12
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from generator import PROJECT_DIR, SERVICE_NAME, measure, write_repo
+
+from utils.configmaps_utils import add_configmap_entries, add_configmap_to_eks_deployment, update_azure_pipeline_configmap
+from utils.eks_handler import (
+    get_microservice_name,
+    handle_eks_yaml,
+    load_template,
+    update_azure_pipeline_ingress,
+    update_azure_pipeline_serviceaccount,
+)
+from utils.secretmap_utils import add_secretmap_entries, add_secretmap_to_eks_deployment, update_azure_pipeline_secret
+
+ALL_OPTIONS = ['Service Account', 'Ingress', 'Config-map', 'Secret']
+
+
+def build_cases(configmap_options, secretmap_options):
+    """
+    Return (name, func, file_name) cases. func takes the repo directory and the path
+    of file_name inside it, and is called on a fresh copy of the repo.
+    """
+    def read_lines(path):
+        with open(path, 'r') as file:
+            return file.readlines()
+
+    return [
+        ('get_microservice_name', lambda repo, path: get_microservice_name(path), 'eks-deployment.yaml'),
+        ('load_template', lambda repo, path: load_template('templates/ingress.yaml'), 'eks-deployment.yaml'),
+        ('add_configmap_to_eks_deployment', lambda repo, path: add_configmap_to_eks_deployment(
+            path, SERVICE_NAME, configmap_options, base_dir=repo), 'eks-deployment.yaml'),
+        ('add_secretmap_to_eks_deployment', lambda repo, path: add_secretmap_to_eks_deployment(
+            path, SERVICE_NAME, secretmap_options, base_dir=repo), 'eks-deployment.yaml'),
+        ('add_configmap_entries', lambda repo, path: add_configmap_entries(read_lines(path), configmap_options), 'eks-config-maps.yaml'),
+        ('add_secretmap_entries', lambda repo, path: add_secretmap_entries(read_lines(path), secretmap_options), 'eks-config-secrets.yaml'),
+        ('update_azure_pipeline_serviceaccount', lambda repo, path: update_azure_pipeline_serviceaccount(path, True), 'azure-pipeline-CD.yaml'),
+        ('update_azure_pipeline_ingress', lambda repo, path: update_azure_pipeline_ingress(path, True), 'azure-pipeline-CD.yaml'),
+        ('update_azure_pipeline_configmap', lambda repo, path: update_azure_pipeline_configmap(path, configmap_options), 'azure-pipeline-CD.yaml'),
+        ('update_azure_pipeline_secret', lambda repo, path: update_azure_pipeline_secret(path, secretmap_options), 'azure-pipeline-CD.yaml'),
+        ('handle_eks_yaml', lambda repo, path: handle_eks_yaml(
+            path, ALL_OPTIONS, '/bench/api', configmap_options, secretmap_options, base_dir=repo), 'eks-deployment.yaml'),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(parameters, repeat, work_dir):
+    source_dir = write_repo(
+        os.path.join(work_dir, 'source'),
+        documents=parameters['documents'],
+        env_vars=parameters['env_vars'],
+        placeholders=parameters['placeholders'],
+        config_keys=parameters['config_keys'],
+        stages=parameters['stages'],
+    )
+    new_keys = [f'NEW_KEY_{i}' for i in range(parameters['new_keys'])]
+    configmap_options = {key: '{{' + key + '}}' for key in new_keys}
+    secretmap_options = {key + '_SECRET': '{{' + key + '_SECRET}}' for key in new_keys}
+
+    results = {}
+    for index, (name, func, file_name) in enumerate(build_cases(configmap_options, secretmap_options)):
+        def setup(index=index, file_name=file_name):
+            # A new directory per run, so cached manifest indexes of earlier runs never apply
+            repo_dir = os.path.join(work_dir, f'run-{index}-{len(os.listdir(work_dir))}')
+            shutil.copytree(source_dir, repo_dir, copy_function=shutil.copy)
+            return repo_dir, os.path.join(repo_dir, file_name)
+
+        # The handlers print progress for the interactive mode
+        with contextlib.redirect_stdout(io.StringIO()):
+            timings = measure(func, repeat, setup)
+        results[name] = {'min': min(timings), 'mean': sum(timings) / len(timings), 'max': max(timings), 'runs': len(timings)}
+    return results
+
+
+def print_results(results, baseline=None):
+    header = f"{'function':<38} {'min (ms)':>10} {'mean (ms)':>10}"
+    if baseline:
+        header += f" {'baseline':>10} {'change':>8}"
+    print(header)
+
+    for name, result in results.items():
+        line = f"{name:<38} {result['min'] * 1000:>10.2f} {result['mean'] * 1000:>10.2f}"
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += f" {previous['min'] * 1000:>10.2f} {(result['min'] / previous['min'] - 1) * 100:>+7.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=20, help="Documents in eks-deployment.yaml.")
+    parser.add_argument('--env-vars', type=int, default=40, help="configMapKeyRef env vars per Deployment container.")
+    parser.add_argument('--placeholders', type=int, default=100, help="{{placeholder}} env values in the first Deployment.")
+    parser.add_argument('--config-keys', type=int, default=50, help="Existing keys in the ConfigMap and Secret files.")
+    parser.add_argument('--stages', type=int, default=4, help="Deployment stages in azure-pipeline-CD.yaml.")
+    parser.add_argument('--new-keys', type=int, default=10, help="ConfigMap and Secret keys added by each run.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    parser.add_argument('--compare', help="JSON file of an earlier run to compare with.")
+    args = parser.parse_args()
+
+    parameters = {
+        'documents': args.documents,
+        'env_vars': args.env_vars,
+        'placeholders': args.placeholders,
+        'config_keys': args.config_keys,
+        'stages': args.stages,
+        'new_keys': args.new_keys,
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Keep the manifest index cache of the benchmark runs out of the user's cache
+        os.environ['EKS_CONFIGURATOR_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+        results = run_suite(parameters, args.repeat, work_dir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            previous = json.load(baseline_file)
+        if previous['parameters'] != parameters:
+            print(f"Warning: {args.compare} was recorded with different parameters: {previous['parameters']}")
+        baseline = previous['results']
+
+    print(f"parameters: {', '.join(f'{key}={value}' for key, value in parameters.items())}")
+    print_results(results, baseline)
+
+    if args.output:
+        record = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': parameters,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.output, 'w') as output_file:
+            json.dump(record, output_file, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
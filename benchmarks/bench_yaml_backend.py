@@ -0,0 +1,48 @@
+"""
+Measure parse throughput of the read-only YAML backends against the round-trip processor.
+
+Usage:
+    python benchmarks/bench_yaml_backend.py --documents 50 500 --env-vars 40
+"""
+import argparse
+import sys
+
+from generator import best_of, generate_deployment
+from utils.yaml_backend import READONLY_BACKENDS, get_readonly_loader, round_trip_yaml, safe_load_all
+
+
+def round_trip_load(text):
+    return list(round_trip_yaml().load_all(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--env-vars', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    backends = []
+    for backend in READONLY_BACKENDS:
+        try:
+            get_readonly_loader(backend)
+            backends.append(backend)
+        except RuntimeError:
+            print(f"Skipping unavailable backend: {backend}")
+
+    print(f"{'documents':>10} {'size (KB)':>10} {'backend':>12} {'time (s)':>10} {'MB/s':>8}")
+    for count in args.documents:
+        text = generate_deployment(count, args.env_vars)
+        size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+
+        runs = [(backend, lambda backend=backend: safe_load_all(text, backend)) for backend in backends]
+        runs.append(('round-trip', lambda: round_trip_load(text)))
+
+        for name, func in runs:
+            elapsed = best_of(func, args.repeat)
+            print(f"{count:>10} {size_mb * 1024:>10.0f} {name:>12} {elapsed:>10.4f} {size_mb / elapsed:>8.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
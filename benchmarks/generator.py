@@ -0,0 +1,191 @@
+"""
+Synthetic repo generator shared by the benchmarks.
+
+Builds eks-deployment.yaml, eks-config-maps.yaml, eks-config-secrets.yaml and
+azure-pipeline-CD.yaml files shaped like the real ones, scaled by document count,
+env var count, placeholder count, existing ConfigMap/Secret keys and pipeline stages.
+"""
+import os
+import shutil
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+SERVICE_NAME = 'bench-service'
+
+# The four stages update_azure_pipeline_ingress knows, extra stages reuse their shape
+BASE_STAGES = (
+    ('dev', 'itaap-non-prod', 'itaap-non-prod-hyperautomation-dev', 'dev'),
+    ('test', 'itaap-non-prod', 'itaap-non-prod-hyperautomation-test', 'tst'),
+    ('acc', 'itaap-acc', 'itaap-acc-hyperautomation', 'acc'),
+    ('prod', 'itaap-prod', 'itaap-prod-hyperautomation', 'prod'),
+)
+
+
+def generate_deployment(document_count=1, env_var_count=0, placeholder_count=0, name=SERVICE_NAME):
+    """
+    Build a multi-document eks-deployment.yaml alternating Deployments and Services.
+
+    Every Deployment container gets env_var_count configMapKeyRef entries. The first
+    Deployment also gets placeholder_count entries with a {{placeholder}} value.
+    """
+    documents = []
+    for i in range(document_count):
+        document_name = name if i == 0 else f'{name}-{i}'
+        if i % 2 == 0:
+            lines = [
+                'apiVersion: apps/v1',
+                'kind: Deployment',
+                'metadata:',
+                f'  name: {document_name}-deployment',
+                '  namespace: {{deployNamespace}}',
+                '  labels:',
+                f'    app: {document_name}',
+                'spec:',
+                '  replicas: 1',
+                '  template:',
+                '    spec:',
+                '      containers:',
+                f'        - name: {document_name}-container',
+                '          image: registry/service:{{imageTagName}}',
+                '          env:',
+            ]
+            for j in range(env_var_count):
+                lines.extend([
+                    f'            - name: VAR_{j}',
+                    '              valueFrom:',
+                    '                configMapKeyRef:',
+                    f'                  name: {document_name}',
+                    f'                  key: VAR_{j}',
+                ])
+            if i == 0:
+                for j in range(placeholder_count):
+                    lines.append(f'            - name: PLACEHOLDER_{j}')
+                    lines.append(f'              value: {{{{placeholder{j}}}}}')
+            if lines[-1] == '          env:':
+                lines[-1] = '          env: []'
+        else:
+            lines = [
+                'apiVersion: v1',
+                'kind: Service',
+                'metadata:',
+                f'  name: {document_name}-service',
+                '  namespace: {{deployNamespace}}',
+                'spec:',
+                '  ports:',
+                '    - port: 80',
+                '      targetPort: 8085',
+            ]
+        documents.append('\n'.join(lines) + '\n')
+    return '---\n'.join(documents)
+
+
+def _generate_data_file(kind, key_count, name):
+    lines = [
+        'apiVersion: v1',
+        f'kind: {kind}',
+        'metadata:',
+        f'  name: {name}',
+        '  namespace: {{deployNamespace}}',
+        'data:',
+    ]
+    lines.extend(f'  EXISTING_KEY_{i}: "{{{{existingKey{i}}}}}"' for i in range(key_count))
+    return '\n'.join(lines) + '\n'
+
+
+def generate_config_maps(key_count=0, name=SERVICE_NAME):
+    """Build an eks-config-maps.yaml holding key_count existing keys."""
+    return _generate_data_file('ConfigMap', key_count, name)
+
+
+def generate_config_secrets(key_count=0, name=SERVICE_NAME):
+    """Build an eks-config-secrets.yaml holding key_count existing keys."""
+    return _generate_data_file('Secret', key_count, name)
+
+
+def generate_pipeline(stage_count=4, name=SERVICE_NAME):
+    """Build an azure-pipeline-CD.yaml with stage_count deployment stages."""
+    lines = [
+        'variables:',
+        '  - group: AWS_Credentials',
+        '',
+        'trigger: none',
+        'pr: none',
+        '',
+        'pool:',
+        '  vmImage: ubuntu-latest',
+        '',
+        'stages:',
+    ]
+    for i in range(stage_count):
+        stage, cluster, namespace, app_env = BASE_STAGES[i % len(BASE_STAGES)]
+        if i >= len(BASE_STAGES):
+            stage = f'{stage}{i // len(BASE_STAGES)}'
+            namespace = f'{namespace}-{i // len(BASE_STAGES)}'
+        lines.extend([
+            f'  - stage: {stage}',
+            f'    displayName: {name} MicroService {stage} deployment',
+            '    jobs:',
+            f'      - deployment: {stage}',
+            '        strategy:',
+            '          runOnce:',
+            '            deploy:',
+            '              steps:',
+            '                - checkout: self',
+            '                - task: Bash@3',
+            '                  inputs:',
+            "                    targetType: 'inline'",
+            '                    script: |',
+            f'                      aws eks --region eu-west-1 update-kubeconfig --name {cluster}',
+            f'                      imageTagName=$(resources.pipeline.{name}-pipeline.runName)',
+            f'                      template=`cat eks-deployment.yaml | sed "s/{{{{imageTagName}}}}/$imageTagName/g" | sed "s/{{{{deployNamespace}}}}/{namespace}/g" | sed "s/{{{{appEnv}}}}/{app_env}/g" | sed "s/{{{{appVersion}}}}/$imageTagName/g"`',
+            f'                      configMapTemplate=`cat eks-config-maps.yaml | sed "s/{{{{deployNamespace}}}}/{namespace}/g"`',
+            f'                      secretMapTemplate=`cat eks-config-secrets.yaml | sed "s/{{{{deployNamespace}}}}/{namespace}/g"`',
+            '                      echo "$secretMapTemplate" | kubectl apply -f -',
+            '                      echo "$configMapTemplate" | kubectl apply -f -',
+            '                      echo "$template" | kubectl apply -f -',
+            '',
+        ])
+    return '\n'.join(lines)
+
+
+def write_repo(repo_dir, documents=1, env_vars=0, placeholders=0, config_keys=0, stages=4):
+    """Write the four generated files into repo_dir and return it."""
+    os.makedirs(repo_dir, exist_ok=True)
+    files = {
+        'eks-deployment.yaml': generate_deployment(documents, env_vars, placeholders),
+        'eks-config-maps.yaml': generate_config_maps(config_keys),
+        'eks-config-secrets.yaml': generate_config_secrets(config_keys),
+        'azure-pipeline-CD.yaml': generate_pipeline(stages),
+    }
+    for file_name, content in files.items():
+        with open(os.path.join(repo_dir, file_name), 'w') as file:
+            file.write(content)
+    return repo_dir
+
+
+def copy_repo(source_dir, target_dir):
+    """Copy a generated repo, so a benchmark that edits files starts from the same input."""
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    shutil.copytree(source_dir, target_dir)
+    return target_dir
+
+
+def measure(func, repeat, setup=None):
+    """Time repeat calls of func. setup() runs before each call, untimed, and returns its arguments."""
+    timings = []
+    for _ in range(repeat):
+        arguments = setup() if setup else ()
+        start = time.perf_counter()
+        func(*arguments)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def best_of(func, repeat, setup=None):
+    """Return the fastest of repeat timed calls."""
+    return min(measure(func, repeat, setup))
@@ -0,0 +1,70 @@
+"""
+Build an EKS Configurator distribution.
+
+Modes:
+    onefile  Single self-extracting binary (the original distribution). Every start
+             unpacks the bundle to a temporary _MEIPASS directory first.
+    onedir   Binary plus a folder of libraries. Nothing is unpacked at start-up, so
+             scripted and repeated invocations start noticeably faster.
+    zipapp   dist/EKS_Configurator.pyz, run with a local Python that has the packages
+             from requirements.txt installed. Smallest and fastest to start.
+
+Usage:
+    python build.py --mode onedir
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipapp
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(PROJECT_DIR, 'dist')
+APP_NAME = 'EKS_Configurator'
+
+
+def build_pyinstaller(mode):
+    command = [
+        sys.executable, '-m', 'PyInstaller',
+        f'--{mode}',
+        '--add-data', f'templates{os.pathsep}templates',
+        '--name', APP_NAME,
+        '--noconfirm',
+        'app.py',
+    ]
+    print(' '.join(command))
+    return subprocess.call(command, cwd=PROJECT_DIR)
+
+
+def build_zipapp():
+    target = os.path.join(DIST_DIR, f'{APP_NAME}.pyz')
+    os.makedirs(DIST_DIR, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        shutil.copy(os.path.join(PROJECT_DIR, 'app.py'), staging_dir)
+        for directory in ('utils', 'templates'):
+            shutil.copytree(
+                os.path.join(PROJECT_DIR, directory),
+                os.path.join(staging_dir, directory),
+                ignore=shutil.ignore_patterns('__pycache__', '*.pyc')
+            )
+        zipapp.create_archive(staging_dir, target, interpreter='/usr/bin/env python3', main='app:cli', compressed=True)
+
+    print(f"Created {target}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('onefile', 'onedir', 'zipapp'), default='onefile')
+    args = parser.parse_args()
+
+    if args.mode == 'zipapp':
+        return build_zipapp()
+    return build_pyinstaller(args.mode)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.generator import write_repo  # noqa: E402
+
+
+@pytest.fixture
+def generated_repo(tmp_path, monkeypatch):
+    """A repo shaped like a real service, generated as for the benchmarks, with its own index cache."""
+    monkeypatch.setenv('EKS_CONFIGURATOR_CACHE_DIR', str(tmp_path / 'cache'))
+    return write_repo(str(tmp_path / 'repo'))
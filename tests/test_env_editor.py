@@ -0,0 +1,146 @@
+import io
+
+import pytest
+
+from utils.env_editor import find_insert_index, remove_env_vars, select_containers, upsert_env_vars
+from utils.yaml_backend import round_trip_dump, round_trip_load
+
+DEPLOYMENT = """apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: pricing-upload
+spec:
+  template:
+    spec:
+      initContainers:
+        - name: migrate
+          image: registry/migrate:1.0
+      containers:
+        - name: app
+          image: registry/pricing-upload:{{imageTagName}}
+          env:
+            - name: SPRING_PROFILES_ACTIVE
+              value: cloud
+            # ConfigMap entries
+            - # the database
+              name: DB_URL
+              valueFrom:
+                configMapKeyRef:
+                  name: pricing-upload
+                  key: DB_URL
+            # Secret entries
+            - name: DB_PASSWORD
+              valueFrom:
+                secretKeyRef:
+                  name: pricing-upload
+                  key: DB_PASSWORD
+        - name: sidecar
+          image: registry/proxy:1.0
+"""
+
+
+def configmap_entry(name):
+    return {'name': name, 'valueFrom': {'configMapKeyRef': {'name': 'pricing-upload', 'key': name}}}
+
+
+def secret_entry(name):
+    return {'name': name, 'valueFrom': {'secretKeyRef': {'name': 'pricing-upload', 'key': name}}}
+
+
+def dump(data):
+    stream = io.StringIO()
+    round_trip_dump(data, stream)
+    return stream.getvalue()
+
+
+@pytest.fixture
+def deployment():
+    return round_trip_load(DEPLOYMENT)
+
+
+def env_names(container):
+    return [env['name'] for env in container['env']]
+
+
+def test_find_insert_index():
+    env_vars = [{'name': 'PLAIN'}, configmap_entry('A'), configmap_entry('B'), secret_entry('C')]
+
+    assert find_insert_index(env_vars, 'configMapKeyRef', 'secretKeyRef') == 3
+    assert find_insert_index(env_vars, 'secretKeyRef') == 4
+    assert find_insert_index(env_vars[:1] + env_vars[3:], 'configMapKeyRef', 'secretKeyRef') == 1
+    assert find_insert_index(env_vars[:1], 'configMapKeyRef', 'secretKeyRef') == 1
+
+
+def test_insert_after_the_last_entry_of_the_same_ref(deployment):
+    container = select_containers(deployment)[0]
+
+    assert upsert_env_vars(container, [configmap_entry('DB_NAME')], after_ref='configMapKeyRef', before_ref='secretKeyRef') == (1, 0)
+    assert env_names(container) == ['SPRING_PROFILES_ACTIVE', 'DB_URL', 'DB_NAME', 'DB_PASSWORD']
+
+
+def test_insert_before_the_first_entry_of_the_before_ref(deployment):
+    container = select_containers(deployment)[0]
+    remove_env_vars(container, ['DB_URL'], 'configMapKeyRef')
+
+    upsert_env_vars(container, [configmap_entry('DB_NAME')], after_ref='configMapKeyRef', before_ref='secretKeyRef')
+
+    assert env_names(container) == ['SPRING_PROFILES_ACTIVE', 'DB_NAME', 'DB_PASSWORD']
+
+
+def test_existing_names_are_skipped_or_updated(deployment):
+    container = select_containers(deployment)[0]
+
+    assert upsert_env_vars(container, [configmap_entry('DB_URL'), configmap_entry('DB_URL')], after_ref='configMapKeyRef') == (0, 0)
+    assert upsert_env_vars(container, [{'name': 'DB_URL', 'value': 'jdbc:h2:mem'}], after_ref=None, update_existing=True) == (0, 1)
+    assert dict(container['env'][1]) == {'name': 'DB_URL', 'value': 'jdbc:h2:mem'}
+
+
+def test_comments_move_with_their_entries(deployment):
+    container = select_containers(deployment)[0]
+
+    upsert_env_vars(container, [{'name': 'JAVA_TOOL_OPTIONS', 'value': '-Xss512k'}], after_ref=None, before_ref='configMapKeyRef')
+    output = dump(deployment)
+
+    assert env_names(container) == ['SPRING_PROFILES_ACTIVE', 'JAVA_TOOL_OPTIONS', 'DB_URL', 'DB_PASSWORD']
+    assert '# the database\n            - name: DB_URL' in output
+    assert '# Secret entries\n            - name: DB_PASSWORD' in output
+
+
+def test_comments_stay_with_their_entries_on_removal(deployment):
+    container = select_containers(deployment)[0]
+    container['env'][0]['valueFrom'] = {'configMapKeyRef': {'name': 'pricing-upload', 'key': 'SPRING_PROFILES_ACTIVE'}}
+
+    assert remove_env_vars(container, ['SPRING_PROFILES_ACTIVE'], 'configMapKeyRef') == 1
+    output = dump(deployment)
+
+    assert 'SPRING_PROFILES_ACTIVE' not in output
+    assert '# the database\n            - name: DB_URL' in output
+    assert '# Secret entries\n            - name: DB_PASSWORD' in output
+
+
+def test_removal_only_matches_the_ref_and_its_name(deployment):
+    container = select_containers(deployment)[0]
+
+    assert remove_env_vars(container, ['DB_PASSWORD'], 'configMapKeyRef') == 0
+    assert remove_env_vars(container, ['DB_PASSWORD'], 'secretKeyRef', ref_name='other') == 0
+    assert remove_env_vars(container, ['DB_PASSWORD'], 'secretKeyRef', ref_name='pricing-upload') == 1
+
+
+@pytest.mark.parametrize('target_containers, expected', [
+    (None, ['app']),
+    ('all', ['app', 'sidecar', 'migrate']),
+    (['sidecar', 'migrate'], ['sidecar', 'migrate']),
+    (['missing'], []),
+])
+def test_select_containers(deployment, target_containers, expected):
+    assert [container['name'] for container in select_containers(deployment, target_containers)] == expected
+
+
+def test_entries_go_to_every_selected_container(deployment):
+    for container in select_containers(deployment, 'all'):
+        upsert_env_vars(container, [configmap_entry('DB_NAME')], after_ref='configMapKeyRef', before_ref='secretKeyRef')
+
+    pod_spec = deployment['spec']['template']['spec']
+    assert env_names(pod_spec['containers'][1]) == ['DB_NAME']
+    assert env_names(pod_spec['initContainers'][0]) == ['DB_NAME']
+    assert env_names(pod_spec['containers'][0]).count('DB_NAME') == 1
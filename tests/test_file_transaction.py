@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from utils import file_transaction
+from utils.file_transaction import COMMITTING, JOURNAL_FILE_NAME, STAGING, FileTransaction, recover_transaction
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / 'eks-deployment.yaml').write_text('deployment: old\n')
+    (tmp_path / 'azure-pipeline-CD.yaml').write_text('pipeline: old\n')
+    return tmp_path
+
+
+def interrupted_commit(repo, state):
+    """Leave the journal and temp files of a commit interrupted in the given state."""
+    entries = []
+    for name in ('eks-deployment.yaml', 'azure-pipeline-CD.yaml'):
+        path = str(repo / name)
+        temp = str(repo / f'.{name}.123.tmp')
+        with open(temp, 'w') as temp_file:
+            temp_file.write(name.split('.')[0] + ': new\n')
+        entries.append({'path': path, 'temp': temp})
+    (repo / JOURNAL_FILE_NAME).write_text(json.dumps({'version': 1, 'state': state, 'files': entries}))
+    return entries
+
+
+def test_commit_replaces_changed_files_only(repo):
+    transaction = FileTransaction(str(repo))
+    transaction.write(str(repo / 'eks-deployment.yaml'), 'deployment: new\n')
+    transaction.write(str(repo / 'azure-pipeline-CD.yaml'), 'pipeline: old\n')
+
+    assert transaction.read(str(repo / 'eks-deployment.yaml')) == 'deployment: new\n'
+    assert (repo / 'eks-deployment.yaml').read_text() == 'deployment: old\n'
+    assert transaction.commit() == [str(repo / 'eks-deployment.yaml')]
+    assert (repo / 'eks-deployment.yaml').read_text() == 'deployment: new\n'
+    assert sorted(os.listdir(repo)) == ['azure-pipeline-CD.yaml', 'eks-deployment.yaml']
+
+
+def test_recover_without_journal(repo):
+    assert recover_transaction(str(repo)) is None
+
+
+def test_recover_rolls_back_a_staging_commit(repo):
+    interrupted_commit(repo, STAGING)
+
+    assert recover_transaction(str(repo)) == 'back'
+    assert (repo / 'eks-deployment.yaml').read_text() == 'deployment: old\n'
+    assert (repo / 'azure-pipeline-CD.yaml').read_text() == 'pipeline: old\n'
+    assert sorted(os.listdir(repo)) == ['azure-pipeline-CD.yaml', 'eks-deployment.yaml']
+
+
+def test_recover_rolls_forward_a_committing_commit(repo):
+    entries = interrupted_commit(repo, COMMITTING)
+    # The crash happened after the first rename
+    os.replace(entries[0]['temp'], entries[0]['path'])
+
+    assert recover_transaction(str(repo)) == 'forward'
+    assert (repo / 'eks-deployment.yaml').read_text() == 'eks-deployment: new\n'
+    assert (repo / 'azure-pipeline-CD.yaml').read_text() == 'azure-pipeline-CD: new\n'
+    assert sorted(os.listdir(repo)) == ['azure-pipeline-CD.yaml', 'eks-deployment.yaml']
+
+
+def test_recover_removes_a_journal_that_was_never_renamed(repo):
+    (repo / f'{JOURNAL_FILE_NAME}.tmp').write_text('{"version": 1, "sta')
+
+    assert recover_transaction(str(repo)) is None
+    assert sorted(os.listdir(repo)) == ['azure-pipeline-CD.yaml', 'eks-deployment.yaml']
+
+
+def test_failed_staging_rolls_back(repo, monkeypatch):
+    write_durable = file_transaction._write_durable
+
+    def fail_on_temp_files(file_path, content):
+        if JOURNAL_FILE_NAME not in file_path:
+            raise OSError('disk full')
+        write_durable(file_path, content)
+
+    monkeypatch.setattr(file_transaction, '_write_durable', fail_on_temp_files)
+    transaction = FileTransaction(str(repo))
+    transaction.write(str(repo / 'eks-deployment.yaml'), 'deployment: new\n')
+
+    with pytest.raises(OSError):
+        transaction.commit()
+    assert (repo / 'eks-deployment.yaml').read_text() == 'deployment: old\n'
+    assert sorted(os.listdir(repo)) == ['azure-pipeline-CD.yaml', 'eks-deployment.yaml']
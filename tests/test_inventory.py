@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from benchmarks.generator import write_repo
+from utils.inventory import QUERIES, query_inventory, scan_fleet
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    """Three generated repos: one with env refs, one without, and one without an eks-deployment.yaml."""
+    repos = {
+        'env': write_repo(str(tmp_path / 'env'), documents=2, env_vars=2),
+        'plain': write_repo(str(tmp_path / 'plain')),
+        'broken': write_repo(str(tmp_path / 'broken')),
+    }
+    os.remove(os.path.join(repos['broken'], 'eks-deployment.yaml'))
+    return repos
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / 'inventory.db')
+
+
+def query(database, name, value=None):
+    parameters = {'value': value} if value is not None else {}
+    return query_inventory(database, QUERIES[name][1], parameters)[1]
+
+
+def test_scan_fleet(fleet, database):
+    result = scan_fleet(fleet.values(), database, max_workers=2)
+
+    assert sorted(result['scanned']) == sorted(fleet.values())
+    assert result['skipped'] == []
+    assert result['failed'] == [fleet['broken']]
+
+
+def test_env_ref_query(fleet, database):
+    scan_fleet(fleet.values(), database, max_workers=2)
+
+    assert query(database, 'env-ref', 'VAR_1') == [
+        ('bench-service', fleet['env'], 'bench-service-container', 'VAR_1', 'configMapKeyRef', 'bench-service', 'VAR_1'),
+    ]
+    assert query(database, 'env-ref', 'VAR_2') == []
+
+
+def test_missing_kind_query(fleet, database):
+    scan_fleet(fleet.values(), database, max_workers=2)
+
+    # The repo that failed is not reported as missing anything
+    assert query(database, 'missing-kind', 'Service') == [('bench-service', fleet['plain'])]
+    assert sorted(query(database, 'missing-kind', 'Ingress')) == sorted([('bench-service', fleet['env']), ('bench-service', fleet['plain'])])
+
+
+def test_errors_query(fleet, database):
+    scan_fleet(fleet.values(), database, max_workers=2)
+
+    assert query(database, 'errors') == [(fleet['broken'], "'eks-deployment.yaml' not found")]
+
+
+def test_rescan_skips_unchanged_repos(fleet, database):
+    scan_fleet(fleet.values(), database, max_workers=2)
+    deployment_path = os.path.join(fleet['plain'], 'eks-deployment.yaml')
+    stat = os.stat(deployment_path)
+    os.utime(deployment_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    result = scan_fleet(fleet.values(), database, max_workers=2)
+
+    # A repo that failed is scanned again whatever its mtimes
+    assert sorted(result['scanned']) == sorted([fleet['plain'], fleet['broken']])
+    assert result['skipped'] == [fleet['env']]
+    assert query(database, 'env-ref', 'VAR_1') != []
+
+    assert sorted(scan_fleet(fleet.values(), database, full=True)['scanned']) == sorted(fleet.values())
+
+
+def test_query_without_database(tmp_path):
+    with pytest.raises(FileNotFoundError, match='run the scan command first'):
+        query_inventory(str(tmp_path / 'missing.db'), QUERIES['errors'][1])
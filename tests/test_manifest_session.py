@@ -0,0 +1,98 @@
+from utils.manifest_session import ManifestSession, split_documents
+
+SERVICE = """---
+# Service in front of the pods
+apiVersion: v1
+kind: Service
+metadata:
+  name: pricing-upload
+spec:
+  ports:
+    - port:   80      # odd spacing that a re-dump would normalise
+      targetPort: 8080
+"""
+
+DEPLOYMENT = """---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: pricing-upload
+  namespace: {{deployNamespace}}
+spec:
+  template:
+    spec:
+      containers:
+        - name: app
+          image: registry/pricing-upload:1.0
+"""
+
+CONFIG = """---
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: pricing-upload
+data:
+  KEY:    'value'
+"""
+
+MANIFEST = SERVICE + '\n' + DEPLOYMENT + '\n' + CONFIG
+
+
+def write_manifest(tmp_path, content):
+    file_path = tmp_path / 'eks-deployment.yaml'
+    file_path.write_bytes(content.encode('utf-8'))
+    return file_path
+
+
+def test_split_documents_covers_the_buffer():
+    buffer = MANIFEST.encode('utf-8')
+    documents = split_documents(buffer)
+
+    assert [document.kind for document in documents] == ['Service', 'Deployment', 'ConfigMap']
+    assert b''.join(bytes(document.source) for document in documents) == buffer
+
+
+def test_commit_without_changes_leaves_the_file_alone(tmp_path):
+    file_path = write_manifest(tmp_path, MANIFEST)
+    session = ManifestSession(str(file_path))
+    session.read_documents('Deployment')
+
+    assert session.commit() is False
+    assert file_path.read_text() == MANIFEST
+
+
+def test_edit_only_rewrites_the_edited_range(tmp_path):
+    file_path = write_manifest(tmp_path, MANIFEST)
+    session = ManifestSession(str(file_path))
+    for deployment in session.deployments():
+        deployment['spec']['template']['spec']['containers'][0]['env'] = [{'name': 'DB_URL', 'value': '{{dbUrl}}'}]
+    session.commit()
+
+    content = file_path.read_text()
+    deployment_start = content.index('---', len(SERVICE))
+    assert content.startswith(SERVICE + '\n')
+    assert content.endswith('\n' + CONFIG)
+    assert '          env:\n            - name: DB_URL\n              value: {{dbUrl}}\n' in content[deployment_start:]
+    assert 'namespace: {{deployNamespace}}\n' in content
+
+
+def test_windows_line_endings_are_kept(tmp_path):
+    file_path = write_manifest(tmp_path, MANIFEST.replace('\n', '\r\n'))
+    session = ManifestSession(str(file_path))
+    for deployment in session.deployments():
+        deployment['metadata']['labels'] = {'app': 'pricing-upload'}
+    session.commit()
+
+    content = file_path.read_bytes()
+    assert b'\n' not in content.replace(b'\r\n', b'')
+    assert content.startswith(SERVICE.replace('\n', '\r\n').encode('utf-8'))
+
+
+def test_remove_documents_keeps_the_other_ranges(tmp_path):
+    file_path = write_manifest(tmp_path, MANIFEST)
+    session = ManifestSession(str(file_path))
+
+    assert session.remove_documents('ConfigMap', 'pricing-upload') == 1
+    session.commit()
+
+    assert file_path.read_text() == SERVICE + '\n' + DEPLOYMENT + '\n'
@@ -0,0 +1,99 @@
+import pytest
+
+from utils.pipeline_utils import PipelineModel, add_substitutions, format_render_line, parse_render_line, remove_substitutions
+
+INDENT = '                      '
+CHAIN = INDENT + 'template=`cat eks-deployment.yaml | sed "s/{{imageTagName}}/$imageTagName/g" | sed "s/{{deployNamespace}}/ns-dev/g"`\n'
+SINGLE = INDENT + 'template=`sed -e "s/{{imageTagName}}/$imageTagName/g" -e "s/{{deployNamespace}}/ns-dev/g" eks-deployment.yaml`\n'
+
+
+def test_chain_and_single_sed_parse_alike():
+    chain, single = parse_render_line(CHAIN), parse_render_line(SINGLE)
+
+    assert chain['source'] == single['source'] == 'eks-deployment.yaml'
+    assert chain['substitutions'] == single['substitutions'] == {
+        '{{imageTagName}}': ('/', '$imageTagName'),
+        '{{deployNamespace}}': ('/', 'ns-dev'),
+    }
+    assert chain['tail'] == single['tail'] == []
+
+
+def test_single_sed_round_trips():
+    assert format_render_line(parse_render_line(SINGLE)) == SINGLE
+
+
+def test_unchanged_line_is_not_rewritten():
+    assert add_substitutions(CHAIN, [('{{deployNamespace}}', 'ns-dev')], replace=True) == CHAIN
+    assert remove_substitutions(CHAIN, ['{{dbUrl}}']) == CHAIN
+
+
+def test_added_substitution_joins_the_single_sed():
+    line = add_substitutions(CHAIN, [('{{dbUrl}}', '$(DB_URL)')])
+
+    assert line == INDENT + ('template=`sed -e "s/{{imageTagName}}/$imageTagName/g" -e "s/{{deployNamespace}}/ns-dev/g" '
+                             '-e "s/{{dbUrl}}/$(DB_URL)/g" eks-deployment.yaml`\n')
+
+
+@pytest.mark.parametrize('tail', [
+    "envsubst",
+    "sed 's/{{appEnv}}/dev/g'",
+    'sed "s/{{appEnv}}/dev/"',
+    'sed -n "p"',
+])
+def test_segments_that_are_not_parsed_are_kept(tail):
+    line = CHAIN.replace('`\n', f' | {tail}`\n')
+
+    updated = add_substitutions(line, [('{{dbUrl}}', '$(DB_URL)')])
+
+    assert updated.endswith(f'eks-deployment.yaml | {tail}`\n')
+    assert parse_render_line(updated)['tail'] == [tail]
+    assert remove_substitutions(updated, ['{{dbUrl}}']).endswith(f' | {tail}`\n')
+
+
+def test_unparsed_expression_of_the_first_sed_runs_after_it():
+    line = INDENT + 'template=`sed -e "s/{{a}}/1/g" -e "s/{{b}}/2/" -e "s/{{c}}/3/g" eks-deployment.yaml | envsubst`\n'
+
+    render = parse_render_line(line)
+
+    assert render['substitutions'] == {'{{a}}': ('/', '1')}
+    assert format_render_line(render) == INDENT + (
+        'template=`sed -e "s/{{a}}/1/g" eks-deployment.yaml | sed -e "s/{{b}}/2/" -e "s/{{c}}/3/g" | envsubst`\n')
+
+
+@pytest.mark.parametrize('delimiter', ['/', '#', '|'])
+def test_special_characters_are_escaped(delimiter):
+    value = f'a{delimiter}b & "c" $(X)'
+
+    line = add_substitutions(SINGLE, [('{{value}}', value, delimiter)])
+
+    expression = f'"s{delimiter}{{{{value}}}}{delimiter}a\\{delimiter}b \\& \\"c\\" $(X){delimiter}g"'
+    assert expression in line
+    assert parse_render_line(line)['substitutions']['{{value}}'] == (delimiter, value)
+    assert format_render_line(parse_render_line(line)) == line
+
+
+def test_values_that_cannot_be_escaped_are_rejected():
+    with pytest.raises(ValueError, match='backslash'):
+        add_substitutions(SINGLE, [('{{value}}', 'a\\b')])
+
+
+def test_other_lines_are_not_render_steps():
+    assert parse_render_line(INDENT + 'template=`envsubst < eks-deployment.yaml`\n') is None
+    assert parse_render_line(INDENT + 'echo "$template" | kubectl apply -f -\n') is None
+
+
+def test_model_only_rewrites_changed_steps():
+    other = CHAIN.replace('template=', 'configMapTemplate=').replace('eks-deployment.yaml', 'eks-config-maps.yaml')
+    lines = ['stages:\n', '  - stage: dev\n', CHAIN.replace('`\n', ' | envsubst`\n'), other]
+    model = PipelineModel(lines)
+    deployment_step, configmap_step = model.steps
+
+    model.add_substitutions(configmap_step, [('{{deployNamespace}}', 'ns-dev')], replace=True)
+    model.remove_substitutions(configmap_step, ['{{dbUrl}}'])
+    assert not model.modified
+    assert model.lines == lines
+
+    model.add_substitutions(deployment_step, [('{{dbUrl}}', '$(DB_URL)')])
+    assert model.modified
+    assert model.lines[2].endswith('-e "s/{{dbUrl}}/$(DB_URL)/g" eks-deployment.yaml | envsubst`\n')
+    assert model.lines[3] == other
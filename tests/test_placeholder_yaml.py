@@ -0,0 +1,51 @@
+import io
+
+from utils.placeholder_yaml import create_yaml
+
+MANIFEST = """apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: pricing-upload
+  namespace: {{deployNamespace}}
+spec:
+  template:
+    spec:
+      containers:
+        - name: app
+          image: registry/pricing-upload:{{imageTag}}
+          env:
+            - name: DB_URL
+              value: "{{dbUrl}}"
+"""
+
+
+def dump(data):
+    stream = io.StringIO()
+    create_yaml().dump(data, stream)
+    return stream.getvalue()
+
+
+def test_placeholders_load_as_strings():
+    data = create_yaml().load(MANIFEST)
+
+    assert data['metadata']['namespace'] == '{{deployNamespace}}'
+    assert data['spec']['template']['spec']['containers'][0]['image'] == 'registry/pricing-upload:{{imageTag}}'
+
+
+def test_round_trip_is_byte_identical():
+    assert dump(create_yaml().load(MANIFEST)) == MANIFEST
+
+
+def test_edited_document_keeps_placeholders_unquoted():
+    data = create_yaml().load(MANIFEST)
+    data['metadata']['labels'] = {'app': '{{appName}}'}
+    data['spec']['template']['spec']['containers'][0]['env'].append({'name': 'DB_NAME', 'value': '{{dbName}}'})
+
+    output = dump(data)
+
+    assert 'namespace: {{deployNamespace}}\n' in output
+    assert 'app: {{appName}}\n' in output
+    assert 'value: {{dbName}}\n' in output
+    # Quoting of the source is preserved
+    assert 'value: "{{dbUrl}}"\n' in output
+    assert create_yaml().load(output)['metadata']['labels']['app'] == '{{appName}}'
@@ -0,0 +1,23 @@
+import pytest
+
+from utils.pool_sizing import read_service, replica_count, size_pools
+
+
+def test_replica_counts_from_yaml_strings_are_converted():
+    assert replica_count('4', 'reporting', 'max_replicas') == 4
+    assert replica_count(3, 'reporting', 'max_replicas') == 3
+
+
+@pytest.mark.parametrize('value', ['{{replicas}}', 0, -1, 2.5, True])
+def test_invalid_replica_counts_name_the_service_and_field(value):
+    with pytest.raises(ValueError, match="'max_replicas' of reporting"):
+        replica_count(value, 'reporting', 'max_replicas')
+
+
+def test_spec_values_are_sized_as_numbers():
+    service = read_service({'name': 'reporting', 'cpu': '1500m', 'min_replicas': '2', 'max_replicas': '4'})
+    plan = size_pools([service], budget=100)
+
+    assert service['max_replicas'] == 4
+    assert plan['services'][0]['pool'] == 5
+    assert plan['total'] == 20
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from utils import eks_handler
+from utils.eks_handler import handle_eks_yaml
+from utils.manifest_index import find_documents, index_buffer
+from utils.pipeline_utils import PipelineModel
+from utils.reconciler import normalize_desired_state, reconcile_repo
+
+DESIRED = {'service_account': False}
+
+
+@pytest.fixture
+def stage_overrides(tmp_path, monkeypatch):
+    """A stage table whose dev stage overrides an annotation of the Ingress profiles."""
+    table = eks_handler.load_template(eks_handler.PIPELINE_STAGES_PATH)
+    table = table.replace('    max_replicas: 2\n', "    max_replicas: 2\n    ingress:\n      limit-rps: '500'\n", 1)
+    stages_path = tmp_path / 'stages.yaml'
+    stages_path.write_text(table)
+    monkeypatch.setenv('EKS_CONFIGURATOR_STAGES', str(stages_path))
+    eks_handler.load_pipeline_stages.cache_clear()
+    yield
+    eks_handler.load_pipeline_stages.cache_clear()
+
+
+def render_substitutions(repo_dir):
+    with open(os.path.join(repo_dir, 'azure-pipeline-CD.yaml')) as pipeline_file:
+        model = PipelineModel(pipeline_file)
+    return [dict(step['render']['substitutions']) for step in model.steps]
+
+
+def documents(repo_dir):
+    with open(os.path.join(repo_dir, 'eks-deployment.yaml'), 'rb') as deployment_file:
+        return index_buffer(deployment_file.read())
+
+
+def test_reconcile_is_in_sync_with_an_unchanged_repo(generated_repo):
+    assert reconcile_repo(generated_repo, normalize_desired_state(DESIRED)) == []
+
+
+def test_removing_the_ingress_undoes_the_ingress_option(generated_repo, stage_overrides):
+    before = render_substitutions(generated_repo)
+    handle_eks_yaml(os.path.join(generated_repo, 'eks-deployment.yaml'), ['Ingress'], '/bench/api',
+                    base_dir=generated_repo, ingress_profile='low-latency-api')
+
+    applied = render_substitutions(generated_repo)
+    assert find_documents(documents(generated_repo), kind='Ingress')
+    assert applied[0]['{{ingress-limit-rps}}'] == ('|', '500')
+    assert '{{host}}' in applied[0]
+
+    changes = reconcile_repo(generated_repo, normalize_desired_state(DESIRED))
+
+    assert '- Ingress bench-service-ingress' in changes
+    assert not find_documents(documents(generated_repo), kind='Ingress')
+    assert render_substitutions(generated_repo) == before
+    assert reconcile_repo(generated_repo, normalize_desired_state(DESIRED)) == []
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from utils import eks_handler, run_cache
+from utils.run_cache import is_up_to_date, record_run
+
+SELECTION = {
+    'options': ['Config-map', 'Secret'],
+    'ingress_path': None,
+    'configmap_options': ['DB_URL'],
+    'secretmap_options': ['DB_PASSWORD'],
+}
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setenv('EKS_CONFIGURATOR_CACHE_DIR', str(tmp_path / 'cache'))
+    repo_dir = tmp_path / 'repo'
+    repo_dir.mkdir()
+    for name in run_cache.INPUT_FILES:
+        (repo_dir / name).write_text(f'# {name}\n')
+    return repo_dir
+
+
+@pytest.fixture
+def stage_table(tmp_path, monkeypatch):
+    """Point EKS_CONFIGURATOR_STAGES at a copy of the bundled stage table."""
+    stages_path = tmp_path / 'stages.yaml'
+    stages_path.write_text(eks_handler.load_template(eks_handler.PIPELINE_STAGES_PATH))
+    monkeypatch.setenv('EKS_CONFIGURATOR_STAGES', str(stages_path))
+    eks_handler.load_pipeline_stages.cache_clear()
+    yield stages_path
+    eks_handler.load_pipeline_stages.cache_clear()
+
+
+def test_recorded_run_is_up_to_date(repo):
+    assert not is_up_to_date(str(repo), SELECTION)
+    record_run(str(repo), SELECTION)
+    assert is_up_to_date(str(repo), SELECTION)
+
+
+def test_selection_key_order_does_not_matter(repo):
+    record_run(str(repo), SELECTION)
+    assert is_up_to_date(str(repo), dict(reversed(list(SELECTION.items()))))
+
+
+def test_changed_selection_is_not_up_to_date(repo):
+    record_run(str(repo), SELECTION)
+    assert not is_up_to_date(str(repo), dict(SELECTION, secretmap_options=[]))
+
+
+def test_changed_repo_file_is_not_up_to_date(repo):
+    record_run(str(repo), SELECTION)
+    (repo / 'eks-config-maps.yaml').write_text('# changed by hand\n')
+    assert not is_up_to_date(str(repo), SELECTION)
+
+
+def test_missing_repo_file_is_not_up_to_date(repo):
+    record_run(str(repo), SELECTION)
+    (repo / 'azure-pipeline-CD.yaml').unlink()
+    assert not is_up_to_date(str(repo), SELECTION)
+
+
+def test_changed_stage_table_is_not_up_to_date(repo, stage_table):
+    record_run(str(repo), SELECTION)
+    stage_table.write_text(stage_table.read_text().replace('max_replicas: ', 'max_replicas: 1', 1))
+    eks_handler.load_pipeline_stages.cache_clear()
+    assert not is_up_to_date(str(repo), SELECTION)
+
+
+def test_changed_ingress_profiles_are_not_up_to_date(repo, tmp_path, monkeypatch):
+    record_run(str(repo), SELECTION)
+    profiles_path = tmp_path / 'profiles.yaml'
+    profiles_path.write_text('profiles:\n  custom:\n    annotations:\n      limit-rps: "5"\n')
+    monkeypatch.setenv('EKS_CONFIGURATOR_INGRESS_PROFILES', str(profiles_path))
+    eks_handler.load_ingress_profiles.cache_clear()
+    try:
+        assert not is_up_to_date(str(repo), SELECTION)
+    finally:
+        eks_handler.load_ingress_profiles.cache_clear()
+
+
+def test_changed_template_is_not_up_to_date(repo, monkeypatch):
+    record_run(str(repo), SELECTION)
+    load_template = eks_handler.load_template
+
+    def edited_template(file_path):
+        template = load_template(file_path)
+        return template + '# edited\n' if file_path == 'templates/ingress.yaml' else template
+
+    monkeypatch.setattr(run_cache, 'load_template', edited_template)
+    assert not is_up_to_date(str(repo), SELECTION)
+
+
+def test_record_of_another_version_is_ignored(repo, monkeypatch):
+    record_run(str(repo), SELECTION)
+    monkeypatch.setattr(run_cache, 'RUN_CACHE_VERSION', run_cache.RUN_CACHE_VERSION + 1)
+    assert not is_up_to_date(str(repo), SELECTION)
+
+
+def test_corrupt_record_is_ignored(repo):
+    record_run(str(repo), SELECTION)
+    with open(run_cache._cache_file_path(str(repo)), 'w') as cache_file:
+        cache_file.write(json.dumps({'version': run_cache.RUN_CACHE_VERSION})[:-3])
+    assert not is_up_to_date(str(repo), SELECTION)
@@ -0,0 +1,102 @@
+import io
+
+import pytest
+
+from utils.stream_filter import filter_stream, iter_documents
+
+SERVICE = """---
+apiVersion: v1
+kind: Service
+metadata:
+  name: pricing-upload
+spec:
+  ports:
+    - port: 80 # http
+"""
+
+DEPLOYMENT = """---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {name}
+  labels:
+    app: {name}
+spec:
+  template:
+    spec:
+      containers:
+        - name: app
+          image: registry/{name}:1.0
+          env:
+            # Defaults
+            - name: SPRING_PROFILES_ACTIVE
+              value: cloud
+"""
+
+SELECTION = {
+    'options': ['Config-map', 'Secret'],
+    'configmap_options': ['db_url'],
+    'secretmap_options': ['db_password'],
+    'target_containers': None,
+}
+
+
+def crlf(text):
+    return text.replace('\n', '\r\n').encode()
+
+
+def run_filter(stream, selection=SELECTION, app=None):
+    output = io.BytesIO()
+    counts = filter_stream(io.BytesIO(stream), output, selection, app=app)
+    return counts, output.getvalue()
+
+
+@pytest.fixture
+def stream():
+    return b''.join([
+        crlf(SERVICE),
+        crlf(DEPLOYMENT.format(name='pricing-upload')),
+        crlf(DEPLOYMENT.format(name='reporting')),
+    ])
+
+
+def test_documents_are_split_at_separators(stream):
+    documents = list(iter_documents(io.BytesIO(stream)))
+
+    assert len(documents) == 3
+    assert b''.join(documents) == stream
+    assert documents[0] == crlf(SERVICE)
+
+
+def test_multi_document_crlf_stream(stream):
+    (documents, changed), output = run_filter(stream)
+
+    assert (documents, changed) == (3, 2)
+    assert output.startswith(crlf(SERVICE))
+    assert b'\n' not in output.replace(b'\r\n', b'')
+    for document in list(iter_documents(io.BytesIO(output)))[1:]:
+        assert b'# Defaults\r\n' in document
+        assert b'configMapKeyRef:\r\n' in document
+        assert document.index(b'- name: DB_URL') < document.index(b'- name: DB_PASSWORD')
+
+
+def test_only_deployments_of_the_app_are_changed(stream):
+    (documents, changed), output = run_filter(stream, app='reporting')
+
+    assert (documents, changed) == (3, 1)
+    assert output.startswith(crlf(SERVICE) + crlf(DEPLOYMENT.format(name='pricing-upload')))
+    assert b'name: reporting\r\n                  key: DB_URL' in output
+
+
+def test_filtered_stream_is_not_changed_again(stream):
+    _, output = run_filter(stream)
+
+    (documents, changed), again = run_filter(output)
+
+    assert (documents, changed) == (3, 0)
+    assert again == output
+
+
+def test_unsupported_options_are_rejected(stream):
+    with pytest.raises(ValueError, match='not Ingress'):
+        run_filter(stream, dict(SELECTION, options=['Config-map', 'Ingress']))
@@ -0,0 +1,298 @@
+import collections
+import difflib
+import json
+import logging
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import timing
+from utils.eks_handler import handle_eks_yaml, load_template, resource_path
+from utils.fleet_handler import DEPLOYMENT_FILE_NAME, normalize_selection
+from utils.manifest_index import forget_manifest_index, get_cache_stats
+from utils.reconciler import DESIRED_STATE_FILE_NAME, load_desired_state, normalize_desired_state, reconcile_repo
+from utils.run_cache import INPUT_FILES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 1024 * 1024
+LATENCY_SAMPLES = 1000
+
+_repo_locks = {}
+_repo_locks_guard = threading.Lock()
+
+
+class RequestError(Exception):
+    """A request the server rejects, with the HTTP status to answer with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyMetrics:
+    """Request count, errors and latency percentiles per endpoint, over the last LATENCY_SAMPLES requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_SAMPLES))
+        self._counts = collections.Counter()
+        self._errors = collections.Counter()
+
+    def record(self, endpoint, elapsed, failed=False):
+        with self._lock:
+            self._samples[endpoint].append(elapsed)
+            self._counts[endpoint] += 1
+            if failed:
+                self._errors[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = {endpoint: sorted(values) for endpoint, values in self._samples.items()}
+            counts, errors = dict(self._counts), dict(self._errors)
+
+        def percentile(values, fraction):
+            return values[min(len(values) - 1, int(fraction * len(values)))]
+
+        return {
+            endpoint: {
+                'requests': counts[endpoint],
+                'errors': errors.get(endpoint, 0),
+                'mean_ms': 1000 * sum(values) / len(values),
+                'p50_ms': 1000 * percentile(values, 0.50),
+                'p95_ms': 1000 * percentile(values, 0.95),
+                'p99_ms': 1000 * percentile(values, 0.99),
+                'max_ms': 1000 * values[-1],
+            }
+            for endpoint, values in samples.items()
+        }
+
+
+def repo_lock(repo_dir):
+    """The lock serializing requests against one repo. Requests for different repos run concurrently."""
+    with _repo_locks_guard:
+        return _repo_locks.setdefault(repo_dir, threading.Lock())
+
+
+def _snapshot(repo_dir):
+    """Content of the files a run touches, None for missing files."""
+    contents = {}
+    for file_name in INPUT_FILES:
+        try:
+            with open(os.path.join(repo_dir, file_name), 'rb') as file:
+                contents[file_name] = file.read()
+        except FileNotFoundError:
+            contents[file_name] = None
+    return contents
+
+
+def _changed_files(before, after):
+    return [file_name for file_name in INPUT_FILES if before[file_name] != after[file_name]]
+
+
+def _diff(before, after):
+    """Unified diffs of the files that differ, keyed by file name."""
+    diffs = {}
+    for file_name in _changed_files(before, after):
+        old = (before[file_name] or b'').decode('utf-8').splitlines(keepends=True)
+        new = (after[file_name] or b'').decode('utf-8').splitlines(keepends=True)
+        diffs[file_name] = ''.join(difflib.unified_diff(old, new, f'a/{file_name}', f'b/{file_name}'))
+    return diffs
+
+
+class ConfiguratorServer:
+    """
+    Request handling shared by the HTTP and Unix socket servers.
+
+    Everything that makes a run fast stays warm between requests: the imported
+    modules, the shared YAML processors, the loaded templates and the manifest index.
+    """
+
+    def __init__(self, repo_root=None):
+        self.repo_root = os.path.realpath(repo_root) if repo_root else None
+        self.metrics = LatencyMetrics()
+        self.started = time.time()
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/metrics'): self.get_metrics,
+            ('POST', '/configure'): self.configure,
+            ('POST', '/preview'): self.preview,
+            ('POST', '/reconcile'): self.reconcile,
+        }
+
+    def resolve_repo(self, body):
+        repo = body.get('repo')
+        if not isinstance(repo, str) or not repo:
+            raise RequestError(400, "'repo' must be the path of a repo directory.")
+
+        repo_dir = os.path.realpath(repo)
+        if self.repo_root and os.path.commonpath([self.repo_root, repo_dir]) != self.repo_root:
+            raise RequestError(403, f"'{repo}' is outside the allowed repo root.")
+        if not os.path.isfile(os.path.join(repo_dir, DEPLOYMENT_FILE_NAME)):
+            raise RequestError(404, f"'{DEPLOYMENT_FILE_NAME}' not found in {repo}")
+        return repo_dir
+
+    def health(self, body):
+        return {'status': 'ok', 'uptime': time.time() - self.started}
+
+    def get_metrics(self, body):
+        return {
+            'uptime': time.time() - self.started,
+            'endpoints': self.metrics.snapshot(),
+            'spans': timing.get_report(),
+            'caches': {
+                'manifest_index': get_cache_stats(),
+                'templates': load_template.__wrapped__.cache_info()._asdict(),
+            },
+        }
+
+    def _apply_selection(self, repo_dir, selection):
+        return handle_eks_yaml(
+            os.path.join(repo_dir, DEPLOYMENT_FILE_NAME),
+            selection['options'],
+            selection['ingress_path'],
+            selection['configmap_options'],
+            selection['secretmap_options'],
+            base_dir=repo_dir,
+            target_containers=selection.get('target_containers'),
+            server_side_apply=selection.get('server_side_apply', False),
+            hpa_custom_metric=selection.get('hpa_custom_metric'),
+            ingress_profile=selection.get('ingress_profile')
+        )
+
+    def configure(self, body):
+        """Apply a selection, the same fields as a fleet spec plus 'repo'."""
+        repo_dir = self.resolve_repo(body)
+        selection = normalize_selection(body)
+
+        with repo_lock(repo_dir):
+            before = _snapshot(repo_dir)
+            applied = self._apply_selection(repo_dir, selection)
+            after = _snapshot(repo_dir)
+
+        if not applied:
+            raise RequestError(422, "Microservice name could not be extracted")
+        return {'repo': repo_dir, 'changed_files': _changed_files(before, after)}
+
+    def preview(self, body):
+        """Apply a selection to a scratch copy of the repo files and return the diffs."""
+        repo_dir = self.resolve_repo(body)
+        selection = normalize_selection(body)
+
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            with repo_lock(repo_dir):
+                for file_name in INPUT_FILES:
+                    if os.path.exists(os.path.join(repo_dir, file_name)):
+                        shutil.copy(os.path.join(repo_dir, file_name), scratch_dir)
+            try:
+                before = _snapshot(scratch_dir)
+                applied = self._apply_selection(scratch_dir, selection)
+                after = _snapshot(scratch_dir)
+            finally:
+                forget_manifest_index(scratch_dir)
+
+        if not applied:
+            raise RequestError(422, "Microservice name could not be extracted")
+        return {'repo': repo_dir, 'diff': _diff(before, after)}
+
+    def reconcile(self, body):
+        """Reconcile against 'state' (a desired-state mapping) or the repo's desired-state file."""
+        repo_dir = self.resolve_repo(body)
+        if body.get('state') is not None:
+            desired = normalize_desired_state(body['state'])
+        else:
+            desired = load_desired_state(os.path.join(repo_dir, DESIRED_STATE_FILE_NAME))
+
+        with repo_lock(repo_dir):
+            changes = reconcile_repo(repo_dir, desired, dry_run=bool(body.get('dry_run')))
+        return {'repo': repo_dir, 'changes': changes, 'dry_run': bool(body.get('dry_run'))}
+
+    def dispatch(self, method, path, raw_body):
+        """Return (status, response) for a request."""
+        route = self.routes.get((method, path.split('?', 1)[0]))
+        if route is None:
+            return 404, {'error': f"No route for {method} {path}"}
+
+        try:
+            body = json.loads(raw_body or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("The request body must be a JSON object.")
+            return 200, route(body)
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, FileNotFoundError) as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            logger.exception(f"Error handling {method} {path}:")
+            return 500, {'error': str(e) or e.__class__.__name__}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'EKSConfigurator'
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        start = time.perf_counter()
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_SIZE:
+            status, response = 413, {'error': "Request body too large"}
+            self.close_connection = True
+        else:
+            raw_body = self.rfile.read(length) if length else b''
+            status, response = self.server.configurator.dispatch(method, self.path, raw_body)
+
+        payload = json.dumps(response, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+        endpoint = f"{method} {self.path.split('?', 1)[0]}"
+        self.server.configurator.metrics.record(endpoint, time.perf_counter() - start, failed=status >= 400)
+
+    def address_string(self):
+        # Unix socket peers have no host/port
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(host='127.0.0.1', port=DEFAULT_PORT, socket_path=None, repo_root=None):
+    """Create the server, on a Unix socket when socket_path is given, otherwise on host:port."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        server.daemon_threads = True
+
+    server.configurator = ConfiguratorServer(repo_root)
+    return server
+
+
+def warm_up():
+    """Import and build everything the first request would otherwise pay for."""
+    from utils.yaml_backend import get_readonly_loader, round_trip_yaml
+
+    round_trip_yaml()
+    get_readonly_loader()
+    for template_path in ('templates/service-account.yaml', 'templates/ingress.yaml', 'templates/hpa.yaml', 'templates/pdb.yaml'):
+        load_template(resource_path(template_path))
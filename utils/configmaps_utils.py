@@ -1,65 +1,50 @@
 import re
 import logging
 import os
-from ruamel.yaml import YAML
 
-# Configure the YAML processor
-yaml = YAML()
-yaml.preserve_quotes = True
-yaml.default_flow_style = False
-yaml.width = float('inf')
-yaml.indent(mapping=2, sequence=4, offset=2)
+from utils.env_editor import env_names_present, select_containers, upsert_env_vars
+from utils.file_utils import read_lines, write_file
+from utils.manifest_index import find_documents, get_manifest_index
+from utils.manifest_session import ManifestSession
+from utils.pipeline_utils import PipelineModel
+from utils.timing import timed
 
 logger = logging.getLogger(__name__)
 
-# Global dictionary to store placeholder values
-placeholder_map = {}
+@timed('configmap.deployment')
+def add_configmap_to_eks_deployment(file_path, microservice_name, configmap_options, base_dir=None, session=None, target_containers=None):
+    """
+    Add ConfigMap entries to the eks-deployment.yaml file.
 
-def add_configmap_to_eks_deployment(file_path, microservice_name, configmap_options):
-    """Add ConfigMap entries to the eks-deployment.yaml file."""
-    global placeholder_map
+    When a ManifestSession is given the Deployment is mutated in memory and the
+    caller is responsible for committing it, otherwise the file is written here.
+    Entries go to the first container unless target_containers is 'all' or a list
+    of container names. Names that already exist in a container are not added again.
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(file_path))
+
+    owns_session = session is None
+    if owns_session:
+        session = ManifestSession(file_path)
 
     try:
-        # Read the YAML file content
-        with open(file_path, 'r') as file:
-            content = file.read()
-
-            # Replace placeholders with unique identifiers to preserve them during YAML processing
-            placeholder_map = {}
-            def replace_placeholder(match):
-                placeholder = f'__PLACEHOLDER_{len(placeholder_map) + 1}__'
-                placeholder_map[placeholder] = match.group(0)
-                return placeholder
-
-            content = re.sub(r'\{\{.*?\}\}', replace_placeholder, content)
-
-        # Load the YAML data
-        yaml_data = list(yaml.load_all(content))
-
-        # Iterate through documents to find the Deployment kind
-        for doc in yaml_data:
-            if isinstance(doc, dict) and doc.get('kind') == 'Deployment':
-                container_spec = doc['spec']['template']['spec']['containers'][0]
-                env_vars = container_spec.get('env', [])
-
-                # Find the insertion point
-                insert_index = len(env_vars)
-                for i, env in reversed(list(enumerate(env_vars))):
-                    if 'configMapKeyRef' in env.get('valueFrom', {}):
-                        insert_index = i + 1
-                        break
-                    if 'secretKeyRef' in env.get('valueFrom', {}):
-                        insert_index = i
-                
-                try:
-                    configmap_name = get_configmap_name('eks-config-maps.yaml')
-                except ValueError as e:
-                    logger.warning(str(e))
-                    configmap_name = microservice_name  # Fallback to using microservice_name
-
-                # Append new ConfigMap entries to the env section at the insertion point
-                for config_key, config_value in configmap_options.items():
-                    new_env = {
+        try:
+            configmap_name = get_configmap_name(os.path.join(base_dir, 'eks-config-maps.yaml'))
+        except ValueError as e:
+            logger.warning(str(e))
+            configmap_name = microservice_name  # Fallback to using microservice_name
+
+        if env_names_present(session.index, [config_key.upper() for config_key in configmap_options], target_containers):
+            logger.info(f"All ConfigMap entries are already present in {file_path}")
+            return
+
+        # Iterate through the Deployment documents
+        for doc in session.deployments():
+            for container_spec in select_containers(doc, target_containers):
+                # Fresh entries per container, shared objects would be dumped as YAML aliases
+                new_envs = [
+                    {
                         'name': config_key.upper(),
                         'valueFrom': {
                             'configMapKeyRef': {
@@ -68,23 +53,16 @@ def add_configmap_to_eks_deployment(file_path, microservice_name, configmap_opti
                             }
                         }
                     }
-                    env_vars.insert(insert_index, new_env)
-                    insert_index += 1
-
-                container_spec['env'] = env_vars
+                    for config_key in configmap_options
+                ]
 
-        # Write the modified YAML back to the file
-        with open(file_path, 'w') as file:
-            yaml.dump_all(yaml_data, file)
+                # Insert after the existing ConfigMap entries, ahead of the Secret entries
+                inserted, _ = upsert_env_vars(container_spec, new_envs, after_ref='configMapKeyRef', before_ref='secretKeyRef')
+                if inserted < len(new_envs):
+                    logger.info(f"Skipped {len(new_envs) - inserted} ConfigMap entries already present in container {container_spec.get('name')}")
 
-        # Replace placeholders back to their original values
-        with open(file_path, 'r+') as file:
-            content = file.read()
-            for placeholder, original_value in placeholder_map.items():
-                content = content.replace(placeholder, original_value)
-            file.seek(0)
-            file.write(content)
-            file.truncate()
+        if owns_session:
+            session.commit()
 
         logger.info(f"ConfigMap entries added to the container specification in {file_path}")
 
@@ -155,25 +133,43 @@ def add_configmap_entries(uncommented_lines, configmap_options):
             key = line.split(':')[0].strip()
             existing_keys.add(key)
 
-    # If data section not found, add it
-    if not data_section_found:
-        new_lines.append('data:\n')
-
-    # Ensure the last line has a newline if it doesn't
-    if new_lines and new_lines[-1].strip() != '' and data_section_found:
-        new_lines[-1] += '\n'
-
-    # Second pass: add new entries
+    # Second pass: build the entries for keys that are not present yet
+    new_entries = []
     for config_key, config_value in configmap_options.items():
         uppercase_key = config_key.upper()
         if uppercase_key not in existing_keys:
             if config_value.startswith('{{') and config_value.endswith('}}'):
                 # This is a custom entry, use camel case for the value
                 camel_case_key = to_camel_case(config_key)
-                new_lines.append(f'  {uppercase_key}: "{{{{{camel_case_key}}}}}"\n')
+                new_entries.append(f'  {uppercase_key}: "{{{{{camel_case_key}}}}}"\n')
             else:
                 # This is a predefined entry, use the original value
-                new_lines.append(f'  {uppercase_key}: "{config_value}"\n')
+                new_entries.append(f'  {uppercase_key}: "{config_value}"\n')
+
+    # If data section not found, add it
+    if not data_section_found:
+        new_lines.append('data:\n')
+
+    # Ensure the last line has a newline if it doesn't. Skipped when every key is
+    # already present, so a repeated run leaves the file byte-identical.
+    if new_entries and new_lines and new_lines[-1].strip() != '' and data_section_found:
+        new_lines[-1] += '\n'
+
+    new_lines.extend(new_entries)
+    return new_lines
+
+def remove_configmap_entries(uncommented_lines, keys):
+    """Remove the data entries of keys, the counterpart of add_configmap_entries."""
+    keys = {key.upper() for key in keys}
+    new_lines = []
+    data_section_found = False
+
+    for line in uncommented_lines:
+        if line.strip() == 'data:':
+            data_section_found = True
+        elif data_section_found and ':' in line and line.split(':')[0].strip() in keys:
+            continue
+        new_lines.append(line)
 
     return new_lines
 
@@ -184,41 +180,30 @@ def to_camel_case(s):
     return words[0] + ''.join(word.capitalize() for word in words[1:])
 
 def get_configmap_name(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-        # Remove comments
-        uncommented = '\n'.join(line for line in content.split('\n') if not line.strip().startswith('#'))
-        if uncommented.strip():
-            # If uncommented content exists, parse it
-            data = yaml.load(uncommented)
-        else:
-            # If all content is commented, parse with comments
-            data = yaml.load(content)
-    
-    if data and isinstance(data, dict):
-        return data.get('metadata', {}).get('name')
+    # Commented-out lines are ignored by the index, so a fully commented file has no documents
+    documents = find_documents(get_manifest_index(file_path))
+
+    if documents:
+        return documents[0]['name']
     else:
         # If no valid data is found, return a default name or raise an exception
         raise ValueError(f"No valid ConfigMap name found in {file_path}")
 
-def update_azure_pipeline_configmap(file_path, configmap_options):
+@timed('pipeline.configmap')
+def update_azure_pipeline_configmap(file_path, configmap_options, transaction=None, pipeline=None):
     if not configmap_options:
         return
 
     try:
-        with open(file_path, 'r') as file:
-            content = file.readlines()
-
-        for i, line in enumerate(content):
-            if line.strip().startswith('configMapTemplate=`cat eks-config-maps.yaml'):
-                new_line = line.rstrip()[:-1]  # Remove the last backtick
-                for key in configmap_options:
-                    new_line += f' | sed "s/{{{{' + to_camel_case(key) + '}}/$(' + key.upper() + ')/g"'
-                new_line += '`\n'
-                content[i] = new_line
-
-        with open(file_path, 'w') as file:
-            file.writelines(content)
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        for step in model.render_steps('configMapTemplate', 'eks-config-maps.yaml'):
+            model.add_substitutions(step, [
+                ('{{' + to_camel_case(key) + '}}', '$(' + key.upper() + ')') for key in configmap_options
+            ])
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
         print(f"Updated Azure pipeline CD file with config map: {file_path}")
         logger.info(f"Updated Azure pipeline CD file with config map: {file_path}")
     except Exception as e:
@@ -1,11 +1,17 @@
-import yaml
+import functools
 import logging
-import re
 import os
-import tempfile
-import shutil
+import re
 import sys
 
+from utils.file_transaction import FileTransaction, recover_transaction
+from utils.file_utils import read_lines, write_file
+from utils.jvm_tuning import configure_jvm
+from utils.manifest_index import find_documents, get_manifest_index, index_buffer
+from utils.manifest_session import ManifestSession
+from utils.pipeline_utils import PipelineModel
+from utils.timing import span, timed
+from utils.yaml_backend import safe_load_all
 from utils.configmaps_utils import (
     add_configmap_to_eks_deployment,
     read_configmap_file,
@@ -33,64 +39,170 @@ def resource_path(relative_path):
         # PyInstaller creates a temp folder and stores path in _MEIPASS
         base_path = sys._MEIPASS
     except Exception:
-        base_path = os.path.abspath(".")
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
     return os.path.join(base_path, relative_path)
 
-def handle_eks_yaml(file_path, options, ingress_path=None, configmap_options=None, secretmap_options=None):
+@timed('handle_eks_yaml')
+def handle_eks_yaml(file_path, options, ingress_path=None, configmap_options=None, secretmap_options=None, base_dir=None, target_containers=None, server_side_apply=False, hpa_custom_metric=None, ingress_profile=None):
+    """
+    Apply the selected configurations to an EKS deployment and its sibling files.
+
+    Args:
+        file_path (str): Path to the eks-deployment.yaml file.
+        options (list): Selected configurations, e.g. ['Service Account', 'Ingress', 'HorizontalPodAutoscaler'].
+        ingress_path (str): Path to add to the Ingress rule.
+        configmap_options (dict): ConfigMap keys mapped to their placeholder values.
+        secretmap_options (dict): Secret keys mapped to their placeholder values.
+        base_dir (str): Directory holding the config-maps, secrets and pipeline files.
+            Defaults to the directory of file_path.
+        target_containers: Containers that receive ConfigMap/Secret env entries. None for the
+            first container, 'all' for every container and initContainer, or a list of names.
+        server_side_apply (bool): Also rewrite the pipeline's per-manifest kubectl applies
+            into one server-side apply per stage.
+        hpa_custom_metric (dict): Optional Pods metric the HorizontalPodAutoscaler also scales
+            on, with 'name' and 'target' (the average value per pod).
+        ingress_profile (str): Optional performance profile of templates/ingress-profiles.yaml
+            whose annotations are set on the Ingress.
+
+    Returns:
+        bool: True if the configurations were applied, False otherwise.
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(file_path))
+    pipeline_file_path = os.path.join(base_dir, 'azure-pipeline-CD.yaml')
+
     try:
-        microservice_name = get_microservice_name(file_path)
+        recover_transaction(base_dir)
+        # All four files are replaced together at the end, or not at all
+        transaction = FileTransaction(base_dir)
+
+        # Load eks-deployment.yaml once, every selected change is applied in memory
+        with span('session.load'):
+            session = ManifestSession(file_path)
+
+        with span('name.lookup'):
+            microservice_name = get_microservice_name(file_path, documents=session.index)
         if not microservice_name:
             logger.error("Microservice name could not be extracted.")
-            return
+            return False
+
+        if 'Service Account' in options:
+            add_configuration(file_path, microservice_name, template_path='templates/service-account.yaml', base_dir=base_dir, session=session, transaction=transaction)
+
+        if 'Ingress' in options:
+            add_configuration(file_path, microservice_name, template_path='templates/ingress.yaml', ingress_path=ingress_path, base_dir=base_dir, session=session, transaction=transaction)
+            if ingress_profile:
+                configure_ingress_profile(session, microservice_name, ingress_profile)
+
+        if 'HorizontalPodAutoscaler' in options:
+            add_configuration(file_path, microservice_name, template_path='templates/hpa.yaml', base_dir=base_dir, session=session, transaction=transaction)
+            configure_autoscaling(session, microservice_name, hpa_custom_metric)
+
+        if 'PodDisruptionBudget' in options:
+            add_configuration(file_path, microservice_name, template_path='templates/pdb.yaml', base_dir=base_dir, session=session, transaction=transaction)
+
+        if 'Config-map' in options and configmap_options:
+            add_configuration(file_path, microservice_name, configmap_options=configmap_options, base_dir=base_dir, session=session, target_containers=target_containers, transaction=transaction)
+
+        if 'Secret' in options and secretmap_options:
+            add_configuration(file_path, microservice_name, secretmap_options=secretmap_options, base_dir=base_dir, session=session, target_containers=target_containers, transaction=transaction)
+
+        if 'JVM Tuning' in options:
+            configure_jvm(session, target_containers)
+
+        # Render eks-deployment.yaml once, after all changes are applied
+        with span('session.commit'):
+            session.commit(transaction)
+
+        # The pipeline is scanned once and every updater edits the same model
+        pipeline = None
+        if os.path.exists(pipeline_file_path):
+            with span('pipeline.load'):
+                pipeline = PipelineModel(read_lines(pipeline_file_path, transaction))
 
         if 'Service Account' in options:
-            add_configuration(file_path, microservice_name, template_path='templates/service-account.yaml')
-            update_azure_pipeline_serviceaccount('azure-pipeline-CD.yaml', add_service_account=True)
+            update_azure_pipeline_serviceaccount(pipeline_file_path, add_service_account=True, transaction=transaction, pipeline=pipeline)
 
         if 'Ingress' in options:
-            add_configuration(file_path, microservice_name, template_path='templates/ingress.yaml', ingress_path=ingress_path)
-            update_azure_pipeline_ingress('azure-pipeline-CD.yaml', add_ingress=True)
+            update_azure_pipeline_ingress(pipeline_file_path, add_ingress=True, ingress_profile=ingress_profile, transaction=transaction, pipeline=pipeline)
+
+        if 'HorizontalPodAutoscaler' in options:
+            update_azure_pipeline_hpa(pipeline_file_path, add_hpa=True, transaction=transaction, pipeline=pipeline)
 
         if 'Config-map' in options and configmap_options:
-            add_configuration(file_path, microservice_name, configmap_options=configmap_options)
-            update_azure_pipeline_configmap('azure-pipeline-CD.yaml', configmap_options)
+            update_azure_pipeline_configmap(pipeline_file_path, configmap_options, transaction=transaction, pipeline=pipeline)
 
         if 'Secret' in options and secretmap_options:
-            add_configuration(file_path, microservice_name, secretmap_options=secretmap_options)
-            update_azure_pipeline_secret('azure-pipeline-CD.yaml', secretmap_options)
+            update_azure_pipeline_secret(pipeline_file_path, secretmap_options, transaction=transaction, pipeline=pipeline)
+
+        if server_side_apply:
+            update_azure_pipeline_apply(pipeline_file_path, transaction=transaction, pipeline=pipeline)
+
+        if pipeline is not None and pipeline.modified:
+            write_file(pipeline_file_path, pipeline.content, transaction)
+
+        with span('files.commit'):
+            transaction.commit()
+
+        return True
 
     except Exception as e:
         logger.exception("Error handling EKS YAML:")
         raise
 
-def get_microservice_name(file_path):
-    """Extract the microservice name from the EKS YAML file."""
+def get_microservice_name(file_path, documents=None):
+    """
+    Extract the microservice name from the EKS YAML file.
+
+    The name is looked up in the manifest index (documents, or the cached index of
+    file_path), which needs no YAML parsing. The file is only parsed as a fallback
+    when the index holds no app label, e.g. for flow-style labels.
+    """
+    if documents is None:
+        documents = get_manifest_index(file_path)
+    for document in documents:
+        if document['app']:
+            return document['app']
+
     microservice_name = None
     try:
         with open(file_path, 'r') as file:
             content = file.read()
 
-            # Replace placeholders with dummy values to avoid parsing errors
-            content = re.sub(r'\{\{.*?\}\}', 'dummy_value', content)
-
-            # Load YAML content
-            data = yaml.safe_load_all(content)
-            for document in data:
-                if isinstance(document, dict):
-                    metadata = document.get('metadata', {})
-                    labels = metadata.get('labels', {})
-                    if 'app' in labels:
-                        microservice_name = labels['app']
-                        break
-    except yaml.YAMLError as e:
-        logger.error(f"YAML Error: {e}")
+        # Read-only query, served by the fastest available safe loader
+        for document in safe_load_all(content):
+            if isinstance(document, dict):
+                metadata = document.get('metadata', {})
+                labels = metadata.get('labels', {})
+                if 'app' in labels:
+                    microservice_name = labels['app']
+                    break
     except Exception as e:
-        logger.error(f"Unexpected Error: {e}")
+        logger.error(f"Error reading the microservice name from {file_path}: {e}")
     return microservice_name
 
-def add_configuration(file_path, microservice_name, template_path=None, ingress_path=None, configmap_options=None, secretmap_options=None):
-    """Add the specified configuration to the YAML file"""
+def add_configuration(file_path, microservice_name, template_path=None, ingress_path=None, configmap_options=None, secretmap_options=None, base_dir=None, session=None, target_containers=None, transaction=None):
+    """
+    Add the specified configuration to the YAML file.
+
+    When a ManifestSession is given, eks-deployment.yaml changes are applied to it
+    in memory and the caller commits them. Otherwise the file is written directly.
+    The ConfigMap and Secret files are staged in transaction when one is given.
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(file_path))
+
+    if session is None:
+        session = ManifestSession(file_path)
+        add_configuration(file_path, microservice_name, template_path, ingress_path, configmap_options, secretmap_options, base_dir, session, target_containers, transaction)
+        try:
+            session.commit(transaction)
+        except IOError as e:
+            logger.error(f"Error writing to file '{file_path}': {e}")
+            logging.error("Error in adding configurations!")
+        return
+
     if template_path:
         # Use resource_path here as well
         template = load_template(resource_path(template_path))
@@ -102,147 +214,417 @@ def add_configuration(file_path, microservice_name, template_path=None, ingress_
         if 'ingress' in template_path.lower():
             configuration_yaml = configuration_yaml.replace('{{microservice_path}}', ingress_path)
 
-        try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
-                with open(file_path, 'r') as original_file:
-                    shutil.copyfileobj(original_file, temp_file)
-                
-                # Add two newline characters and the new configuration
-                temp_file.write('\n\n' + configuration_yaml)
-
-            # Replace the original file with the temporary file
-            shutil.move(temp_file.name, file_path)
+        # A template applied by an earlier run is not appended a second time
+        template_documents = find_documents(index_buffer(configuration_yaml.encode('utf-8')))
+        if template_documents and all(
+                find_documents(session.index, kind=document['kind'], name=document['name']) for document in template_documents):
+            logger.info(f"Configuration from {template_path} is already present in {file_path}")
+        else:
+            # Add two newline characters and the new configuration
+            session.append_configuration(configuration_yaml)
 
             logger.info(f"Added configuration from {template_path} to {file_path}")
             logging.info("Configurations added successfully!")
             print("Configurations added successfully!")
-        except IOError as e:
-            logger.error(f"Error writing to file '{file_path}': {e}")
-            logging.error("Error in adding configurations!")
-        finally:
-            if os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
 
     if configmap_options:
         """Add ConfigMap entries to eks-deployment."""
-        add_configmap_to_eks_deployment(file_path, microservice_name, configmap_options)
+        add_configmap_to_eks_deployment(file_path, microservice_name, configmap_options, base_dir=base_dir, session=session, target_containers=target_containers)
 
         """Add ConfigMap entries to eks-config-maps.yaml"""
-        configmap_file_path = os.path.join(os.getcwd(), 'eks-config-maps.yaml')
+        configmap_file_path = os.path.join(base_dir, 'eks-config-maps.yaml')
 
         if not os.path.exists(configmap_file_path):
-            logger.error("eks-config-maps.yaml file not found in the current directory.")
+            logger.error(f"eks-config-maps.yaml file not found in {base_dir}.")
             return
 
-        configmap_data = read_configmap_file(configmap_file_path)
-        uncommented_lines, full_file_commented = uncomment_configmap_lines(configmap_data)
-        uncommented_lines = ensure_config_data_section(uncommented_lines, microservice_name, full_file_commented)
-        uncommented_lines = add_configmap_entries(uncommented_lines, configmap_options)
+        with span('configmap.file'):
+            configmap_data = read_configmap_file(configmap_file_path)
+            uncommented_lines, full_file_commented = uncomment_configmap_lines(configmap_data)
+            uncommented_lines = ensure_config_data_section(uncommented_lines, microservice_name, full_file_commented)
+            updated_lines = add_configmap_entries(uncommented_lines, configmap_options)
 
-        with open(configmap_file_path, 'w') as configmap_file:
-            configmap_file.writelines(uncommented_lines)
-
-        logger.info(f"ConfigMap entries added successfully to {configmap_file_path}")
-        print("ConfigMap entries added successfully to the deployment.")
+            # Leave the file untouched when every key is already present
+            if updated_lines == uncommented_lines:
+                logger.info(f"All ConfigMap entries are already present in {configmap_file_path}")
+            else:
+                write_file(configmap_file_path, ''.join(updated_lines), transaction)
+                logger.info(f"ConfigMap entries added successfully to {configmap_file_path}")
+                print("ConfigMap entries added successfully to the deployment.")
 
     if secretmap_options:
-        add_secretmap_to_eks_deployment(file_path, microservice_name, secretmap_options)
+        add_secretmap_to_eks_deployment(file_path, microservice_name, secretmap_options, base_dir=base_dir, session=session, target_containers=target_containers)
 
-        secretmap_file_path = os.path.join(os.getcwd(), 'eks-config-secrets.yaml')
+        secretmap_file_path = os.path.join(base_dir, 'eks-config-secrets.yaml')
 
         if not os.path.exists(secretmap_file_path):
-            logger.error("eks-config-secrets.yaml file not found in the current directory.")
+            logger.error(f"eks-config-secrets.yaml file not found in {base_dir}.")
             return
 
-        secretmap_data = read_secretmap_file(secretmap_file_path)
-        uncommented_lines, full_file_commented = uncomment_secretmap_lines(secretmap_data)
-        uncommented_lines = ensure_secret_data_section(uncommented_lines, microservice_name, full_file_commented)
-        uncommented_lines = add_secretmap_entries(uncommented_lines, secretmap_options)
+        with span('secret.file'):
+            secretmap_data = read_secretmap_file(secretmap_file_path)
+            uncommented_lines, full_file_commented = uncomment_secretmap_lines(secretmap_data)
+            uncommented_lines = ensure_secret_data_section(uncommented_lines, microservice_name, full_file_commented)
+            updated_lines = add_secretmap_entries(uncommented_lines, secretmap_options)
+
+            # Leave the file untouched when every key is already present
+            if updated_lines == uncommented_lines:
+                logger.info(f"All Secret entries are already present in {secretmap_file_path}")
+            else:
+                write_file(secretmap_file_path, ''.join(updated_lines), transaction)
+                logger.info(f"Secret entries added successfully to {secretmap_file_path}")
+                print("Secret entries added successfully to the deployment.")
+
+
+def configure_autoscaling(session, microservice_name, custom_metric=None):
+    """
+    Hand the replica count over to the HorizontalPodAutoscaler: drop the fixed 'replicas'
+    of the Deployments, which every deploy would otherwise reset, and add the custom
+    metric if one is given. Documents are only parsed for editing when they change.
+    """
+    if any('replicas' in (deployment.get('spec') or {}) for deployment in session.read_documents('Deployment')):
+        for deployment in session.deployments():
+            if deployment['spec'].pop('replicas', None) is not None:
+                logger.info(f"Removed the fixed replica count of {deployment['metadata'].get('name')}, the HorizontalPodAutoscaler sets it")
+
+    if not custom_metric:
+        return
 
-        with open(secretmap_file_path, 'w') as secretmap_file:
-            secretmap_file.writelines(uncommented_lines)
+    hpa_name = f'{microservice_name}-hpa'
+    metric_names = {
+        (metric.get('pods') or {}).get('metric', {}).get('name')
+        for hpa in session.read_documents('HorizontalPodAutoscaler', hpa_name)
+        for metric in (hpa.get('spec') or {}).get('metrics') or []
+    }
+    if custom_metric['name'] in metric_names:
+        return
 
-        logger.info(f"Secret entries added successfully to {secretmap_file_path}")
-        print("Secret entries added successfully to the deployment.")
+    for hpa in session.edit_documents('HorizontalPodAutoscaler', hpa_name):
+        hpa['spec'].setdefault('metrics', []).append({
+            'type': 'Pods',
+            'pods': {
+                'metric': {'name': custom_metric['name']},
+                'target': {'type': 'AverageValue', 'averageValue': str(custom_metric['target'])},
+            },
+        })
 
 
+@timed('template.load')
+@functools.lru_cache(maxsize=None)
 def load_template(file_path):
-    """Load the YAML template from a file."""
+    """Load the YAML template from a file. Templates are bundled and read once per process."""
     try:
         # Use resource_path to get the correct path
         full_path = resource_path(file_path)
         with open(full_path, 'r') as file:
             return file.read()
-    except FileNotFoundError:
+    except (FileNotFoundError, NotADirectoryError):
+        template = read_archive_resource(full_path)
+        if template is not None:
+            return template
         logger.error(f"File '{full_path}' not found.")
         return None
 
-def update_azure_pipeline_serviceaccount(file_path, add_service_account=False):
+def read_archive_resource(full_path):
+    """Read a bundled file through the module loader, for when the tool runs from a zipapp."""
+    get_data = getattr(globals().get('__loader__'), 'get_data', None)
+    if get_data is None:
+        return None
+    try:
+        return get_data(full_path).decode('utf-8')
+    except OSError:
+        return None
+
+
+SERVICE_ACCOUNT_SUBSTITUTION = ('{{awsAccountRoleArn}}', '$(AWS_ACCOUNT_ROLE_ARN)', '#')
+
+
+@timed('pipeline.serviceaccount')
+def update_azure_pipeline_serviceaccount(file_path, add_service_account=False, transaction=None, pipeline=None):
+    """
+    Add the ServiceAccount substitution to the Deployment render steps. When a
+    PipelineModel is given it is edited in place and the caller writes it.
+    """
     if not add_service_account:
         return
     try:
-        with open(file_path, 'r') as file:
-            content = file.readlines()
-
-        for i, line in enumerate(content):
-            if line.strip().startswith('template=`cat eks-deployment.yaml'):
-                last_backtick_pos = line.rfind('`')
-                new_line = (
-                            line[:last_backtick_pos] +
-                            ' | sed "s#{{awsAccountRoleArn}}#$(AWS_ACCOUNT_ROLE_ARN)#g"' +
-                            line[last_backtick_pos:]
-                        )
-                content[i] = new_line
-
-        with open(file_path, 'w') as file:
-            file.writelines(content)
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        for step in model.render_steps('template', 'eks-deployment.yaml'):
+            model.add_substitutions(step, [SERVICE_ACCOUNT_SUBSTITUTION])
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
         print(f"Updated Azure pipeline CD file with awsAccountRoleArn for ServiceAccount")
         logger.info(f"Updated Azure pipeline CD file with awsAccountRoleArn for ServiceAccount")
     except Exception as e:
         logger.error(f"Error updating Azure pipeline CD file with awsAccountRoleArn for ServiceAccount: {e}")
 
 
-def update_azure_pipeline_ingress(file_path, add_ingress=False):
+FIELD_MANAGER = 'eks-configurator'
+
+
+@timed('pipeline.apply')
+def update_azure_pipeline_apply(file_path, field_manager=FIELD_MANAGER, transaction=None, pipeline=None):
+    """
+    Rewrite the separate 'echo "$manifest" | kubectl apply -f -' calls of each stage into
+    one multi-document server-side apply, keeping the order of the manifests. When a
+    PipelineModel is given it is edited in place and the caller writes it.
+    """
+    try:
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        rewritten = model.consolidate_applies(field_manager)
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
+        if rewritten:
+            print(f"Consolidated {rewritten} kubectl apply steps into server-side applies: {file_path}")
+            logger.info(f"Consolidated {rewritten} kubectl apply steps into server-side applies: {file_path}")
+    except Exception as e:
+        logger.error(f"Error consolidating the kubectl apply steps of the Azure pipeline CD file: {e}")
+
+
+PIPELINE_STAGES_PATH = 'templates/pipeline-stages.yaml'
+
+DEFAULT_MIN_REPLICAS = 1
+DEFAULT_MAX_REPLICAS = 3
+
+INGRESS_PLACEHOLDERS = ('{{env}}', '{{envIdentifier}}', '{{host}}')
+
+
+@functools.lru_cache(maxsize=None)
+def load_pipeline_stages(stages_path=None):
+    """
+    Load the stage table (stage -> namespace, env, host) from the EKS_CONFIGURATOR_STAGES
+    file, or from the bundled templates/pipeline-stages.yaml.
+
+    Returns:
+        dict: The stages by name, and 'by_namespace' mapping each namespace to its stage.
+    """
+    stages_path = stages_path or os.environ.get('EKS_CONFIGURATOR_STAGES')
+    if stages_path:
+        with open(stages_path, 'r') as stages_file:
+            text = stages_file.read()
+    else:
+        text = load_template(resource_path(PIPELINE_STAGES_PATH))
+
+    stages = (next(iter(safe_load_all(text or '')), None) or {}).get('stages') or {}
+    for name, stage in stages.items():
+        if not isinstance(stage, dict) or not all(stage.get(key) for key in ('namespace', 'env', 'host')):
+            raise ValueError(f"Stage '{name}' needs a namespace, env and host.")
+        if stage.get('min_replicas', DEFAULT_MIN_REPLICAS) > stage.get('max_replicas', DEFAULT_MAX_REPLICAS):
+            raise ValueError(f"Stage '{name}' has min_replicas above max_replicas.")
+        if not isinstance(stage.get('ingress') or {}, dict):
+            raise ValueError(f"Stage '{name}' has an 'ingress' override that is not a mapping of annotations.")
+        if any(character in str(value) for value in (stage.get('ingress') or {}).values() for character in '\\`\r\n'):
+            raise ValueError(f"Stage '{name}' has an 'ingress' override with a backslash, backquote or line break.")
+    return {'stages': stages, 'by_namespace': {stage['namespace']: stage for stage in stages.values()}}
+
+
+def get_step_stage(step):
+    """The stage table entry of a render step, looked up by the namespace it deploys to, or None."""
+    table = load_pipeline_stages()
+    namespace = step['render']['substitutions'].get('{{deployNamespace}}', (None, None))[1]
+    stage = table['by_namespace'].get(namespace)
+    if stage is None and namespace:
+        # Namespaces derived from a known one, e.g. itaap-non-prod-hyperautomation-dev-2
+        stage = next((stage for known, stage in table['by_namespace'].items() if known in namespace), None)
+    return stage
+
+
+def get_ingress_substitutions(step):
+    """Return the Ingress placeholder substitutions for the stage a render step deploys to, or None."""
+    stage = get_step_stage(step)
+    if stage is None:
+        return None
+    return [
+        ('{{env}}', stage['env']),
+        ('{{envIdentifier}}', '$(ENV_IDENTIFIER)'),
+        ('{{host}}', stage['host'])
+    ]
+
+
+INGRESS_PROFILES_PATH = 'templates/ingress-profiles.yaml'
+INGRESS_ANNOTATION_PREFIX = 'nginx.ingress.kubernetes.io/'
+INGRESS_ANNOTATION_PATTERN = re.compile(r'^\s+(nginx\.ingress\.kubernetes\.io/[\w-]+):\s*(.*?)\s*$')
+
+
+@functools.lru_cache(maxsize=None)
+def load_ingress_profiles(profiles_path=None):
+    """
+    Load the Ingress performance profiles (profile -> description, annotations) from the
+    EKS_CONFIGURATOR_INGRESS_PROFILES file, or from the bundled templates/ingress-profiles.yaml.
+    """
+    profiles_path = profiles_path or os.environ.get('EKS_CONFIGURATOR_INGRESS_PROFILES')
+    if profiles_path:
+        with open(profiles_path, 'r') as profiles_file:
+            text = profiles_file.read()
+    else:
+        text = load_template(resource_path(INGRESS_PROFILES_PATH))
+
+    profiles = (next(iter(safe_load_all(text or '')), None) or {}).get('profiles') or {}
+    for name, profile in profiles.items():
+        if not isinstance(profile, dict) or not isinstance(profile.get('annotations'), dict):
+            raise ValueError(f"Ingress profile '{name}' needs a mapping of annotations.")
+        for annotation, value in profile['annotations'].items():
+            # Stage values are written into the render lines as sed replacements
+            if any(character in str(value) for character in '\\`\r\n'):
+                raise ValueError(f"Ingress profile '{name}' annotation '{annotation}' contains a backslash, backquote or line break.")
+    return profiles
+
+
+INGRESS_PROFILE_PLACEHOLDER_PREFIX = '{{ingress-'
+
+
+def ingress_placeholder(annotation):
+    return INGRESS_PROFILE_PLACEHOLDER_PREFIX + annotation + '}}'
+
+
+def get_profile_overrides():
+    """Annotations that some stage overrides, and so are set per stage by the pipeline."""
+    return {annotation for stage in load_pipeline_stages()['stages'].values() for annotation in stage.get('ingress') or {}}
+
+
+def get_profile_annotations(profile_name):
+    """
+    The Ingress annotations of a profile, with placeholders for the ones a stage overrides.
+
+    Annotations of the other profiles that the selected one does not set are mapped to
+    None, so switching profiles does not leave them behind.
+    """
+    profiles = load_ingress_profiles()
+    if profile_name not in profiles:
+        raise ValueError(f"Unknown Ingress profile '{profile_name}', expected one of: {', '.join(profiles)}")
+
+    overridden = get_profile_overrides()
+    annotations = {
+        INGRESS_ANNOTATION_PREFIX + annotation: None
+        for profile in profiles.values() for annotation in profile['annotations']
+    }
+    for annotation, value in profiles[profile_name]['annotations'].items():
+        annotations[INGRESS_ANNOTATION_PREFIX + annotation] = ingress_placeholder(annotation) if annotation in overridden else str(value)
+    return annotations
+
+
+def get_template_annotations():
+    """The nginx annotations of the Ingress template, read from its lines without rendering it."""
+    template = load_template(resource_path('templates/ingress.yaml')) or ''
+    annotations = {}
+    for line in template.splitlines():
+        match = INGRESS_ANNOTATION_PATTERN.match(line)
+        if match:
+            annotations[match.group(1)] = match.group(2).strip('\'"')
+    return annotations
+
+
+def configure_ingress_profile(session, microservice_name, profile_name):
+    """
+    Set the annotations of an Ingress performance profile on the service's Ingress.
+
+    Annotations only set by another profile are removed, the ones the template also sets
+    go back to their template value. The Ingress is only parsed for editing when it changes.
+    """
+    # Imported here, ruamel is only loaded once a document is edited
+    from ruamel.yaml.scalarstring import SingleQuotedScalarString
+
+    ingress_name = f'{microservice_name}-ingress'
+    template_annotations = get_template_annotations()
+    wanted = {
+        annotation: value if value is not None else template_annotations.get(annotation)
+        for annotation, value in get_profile_annotations(profile_name).items()
+    }
+
+    def outdated(annotations):
+        return any(
+            annotations.get(annotation) != value if value is not None else annotation in annotations
+            for annotation, value in wanted.items()
+        )
+
+    if not any(outdated((ingress.get('metadata') or {}).get('annotations') or {}) for ingress in session.read_documents('Ingress', ingress_name)):
+        logger.info(f"Ingress {ingress_name} already has the {profile_name} profile")
+        return
+
+    for ingress in session.edit_documents('Ingress', ingress_name):
+        annotations = ingress['metadata'].get('annotations')
+        if annotations is None:
+            annotations = ingress['metadata']['annotations'] = {}
+        for annotation, value in wanted.items():
+            if value is None:
+                annotations.pop(annotation, None)
+            elif annotations.get(annotation) != value:
+                # Annotations are strings, unquoted values such as 'on' or 60 would not be
+                annotations[annotation] = SingleQuotedScalarString(value)
+    logger.info(f"Set the {profile_name} profile annotations on Ingress {ingress_name}")
+
+
+def get_profile_substitutions(step, profile_name):
+    """The per-stage values of the profile annotations that stages override, as render substitutions."""
+    stage = get_step_stage(step)
+    if stage is None:
+        return []
+    defaults = load_ingress_profiles()[profile_name]['annotations']
+    overrides = stage.get('ingress') or {}
+    return [
+        (ingress_placeholder(annotation), str(overrides.get(annotation, defaults[annotation])), '|')
+        for annotation in sorted(get_profile_overrides())
+        if annotation in defaults
+    ]
+
+
+@timed('pipeline.ingress')
+def update_azure_pipeline_ingress(file_path, add_ingress=False, ingress_profile=None, transaction=None, pipeline=None):
+    """
+    Add the Ingress substitutions of each stage to its Deployment render steps, and the
+    stage's values of the profile annotations it overrides. When a PipelineModel is given
+    it is edited in place and the caller writes it.
+    """
     if not add_ingress:
         return
 
     try:
-        with open(file_path, 'r') as file:
-            content = file.readlines()
-
-        stages = {
-            'dev': ('non-prod', 'dev.apps.api.it.philips.com'),
-            'test': ('non-prod', 'dev.apps.api.it.philips.com'),
-            'acc': ('acc', 'acc.apps.api.it.philips.com'),
-            'prod': ('prod', 'apps.api.it.philips.com')
-        }
-
-        for i, line in enumerate(content):
-            if line.strip().startswith('template=`cat eks-deployment.yaml'):
-                for stage, (env, host) in stages.items():
-                    if stage == 'prod':
-                        namespace = 'itaap-prod-hyperautomation'
-                    elif stage == 'acc': 
-                        namespace = 'itaap-acc-hyperautomation'
-                    else:
-                        namespace = f'itaap-non-prod-hyperautomation-{stage}'
-                    
-                    if namespace in line:
-                        # Find the position of the last backtick
-                        last_backtick_pos = line.rfind('`')
-                        # Insert the new sed commands just before the last backtick
-                        new_line = (
-                            line[:last_backtick_pos] +
-                            f' | sed "s/{{{{env}}}}/{env}/g" | sed "s/{{{{envIdentifier}}}}/$(ENV_IDENTIFIER)/g" | sed "s/{{{{host}}}}/{host}/g"' +
-                            line[last_backtick_pos:]
-                        )
-                        content[i] = new_line
-                        break
-
-        with open(file_path, 'w') as file:
-            file.writelines(content)
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        for step in model.render_steps('template', 'eks-deployment.yaml'):
+            substitutions = get_ingress_substitutions(step)
+            if substitutions:
+                # Add the ingress placeholders to the stage's single sed pass
+                model.add_substitutions(step, substitutions)
+            profile_substitutions = get_profile_substitutions(step, ingress_profile) if ingress_profile else None
+            if profile_substitutions:
+                # The stage table may have changed since the last run
+                model.add_substitutions(step, profile_substitutions, replace=True)
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
         print(f"Updated Azure pipeline CD file: {file_path}")
         logger.info(f"Updated Azure pipeline CD file: {file_path}")
     except Exception as e:
         logger.error(f"Error updating Azure pipeline CD file: {e}")
+
+
+@timed('pipeline.hpa')
+def update_azure_pipeline_hpa(file_path, add_hpa=False, transaction=None, pipeline=None):
+    """
+    Add each stage's replica bounds from the stage table to its Deployment render steps.
+    When a PipelineModel is given it is edited in place and the caller writes it.
+    """
+    if not add_hpa:
+        return
+
+    try:
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        for step in model.render_steps('template', 'eks-deployment.yaml'):
+            stage = get_step_stage(step) or {}
+            model.add_substitutions(step, [
+                ('{{minReplicas}}', str(stage.get('min_replicas', DEFAULT_MIN_REPLICAS))),
+                ('{{maxReplicas}}', str(stage.get('max_replicas', DEFAULT_MAX_REPLICAS)))
+            ])
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
+        print(f"Updated Azure pipeline CD file with HorizontalPodAutoscaler replica bounds: {file_path}")
+        logger.info(f"Updated Azure pipeline CD file with HorizontalPodAutoscaler replica bounds: {file_path}")
+    except Exception as e:
+        logger.error(f"Error updating Azure pipeline CD file with HorizontalPodAutoscaler replica bounds: {e}")
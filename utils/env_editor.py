@@ -0,0 +1,185 @@
+import logging
+
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+ALL_CONTAINERS = 'all'
+
+
+def select_containers(deployment, target_containers=None):
+    """
+    Select the containers of a Deployment whose env block should be edited.
+
+    Args:
+        deployment (dict): The Deployment document.
+        target_containers: None for the first container only, 'all' for every container
+            and initContainer, or a list of container names (sidecars and initContainers included).
+
+    Returns:
+        list: The selected container mappings.
+    """
+    pod_spec = deployment['spec']['template']['spec']
+    containers = list(pod_spec.get('containers') or [])
+    init_containers = list(pod_spec.get('initContainers') or [])
+
+    if not target_containers:
+        return containers[:1]
+    if target_containers == ALL_CONTAINERS:
+        return containers + init_containers
+
+    selected = [container for container in containers + init_containers if container.get('name') in target_containers]
+    missing = set(target_containers) - {container.get('name') for container in selected}
+    if missing:
+        logger.warning(f"Container(s) not found in {deployment['metadata'].get('name')}: {', '.join(sorted(missing))}")
+    return selected
+
+
+def select_indexed_containers(index_entry, target_containers=None):
+    """select_containers() for a manifest index entry, without parsing the document."""
+    containers = [container for container in index_entry['containers'] if container['section'] == 'containers']
+    init_containers = [container for container in index_entry['containers'] if container['section'] == 'initContainers']
+
+    if not target_containers:
+        return containers[:1]
+    if target_containers == ALL_CONTAINERS:
+        return containers + init_containers
+    return [container for container in containers + init_containers if container['name'] in target_containers]
+
+
+def env_names_present(index_entries, names, target_containers=None):
+    """
+    Check with the manifest index whether every selected container of every Deployment
+    already holds all env names, in which case there is nothing to insert and the
+    Deployments do not need to be parsed at all.
+    """
+    names = set(names)
+    for entry in index_entries:
+        if entry['kind'] != 'Deployment' or entry['empty']:
+            continue
+        containers = select_indexed_containers(entry, target_containers)
+        if not containers:
+            # Not indexed, e.g. flow style, let the parser decide
+            return False
+        for container in containers:
+            if not names.issubset(env['name'] for env in container['env']):
+                return False
+    return True
+
+
+def find_insert_index(env_vars, after_ref, before_ref=None):
+    """
+    Find where new entries go: after the last entry referencing after_ref, otherwise
+    before the first entry referencing before_ref, otherwise at the end.
+    """
+    first_before = None
+    for i in range(len(env_vars) - 1, -1, -1):
+        value_from = env_vars[i].get('valueFrom') or {}
+        if after_ref in value_from:
+            return i + 1
+        if before_ref and before_ref in value_from:
+            first_before = i
+    return len(env_vars) if first_before is None else first_before
+
+
+def _bulk_insert(sequence, index, items):
+    """Insert items at index in one list operation, shifting round-trip comments once."""
+    list.__setitem__(sequence, slice(index, index), items)
+
+    comments = getattr(sequence, 'ca', None)
+    if comments is not None and comments.items:
+        shifted = {}
+        for list_index, comment in comments.items.items():
+            shifted[list_index + len(items) if list_index >= index else list_index] = comment
+        comments.items.clear()
+        comments.items.update(shifted)
+
+
+def _bulk_remove(sequence, indexes):
+    """Remove the items at indexes in one list operation, keeping the comments of the others."""
+    removed = set(indexes)
+    list.__setitem__(sequence, slice(None), [item for i, item in enumerate(sequence) if i not in removed])
+
+    comments = getattr(sequence, 'ca', None)
+    if comments is not None and comments.items:
+        shifted = {}
+        for list_index, comment in comments.items.items():
+            if list_index not in removed:
+                shifted[list_index - sum(1 for i in removed if i < list_index)] = comment
+        comments.items.clear()
+        comments.items.update(shifted)
+
+
+@timed('env.mutate')
+def remove_env_vars(container, names, ref, ref_name=None):
+    """
+    Remove the env entries of a container whose name is in names and whose valueFrom
+    uses ref (e.g. 'configMapKeyRef'), optionally only when it references ref_name.
+
+    Returns:
+        int: The number of removed entries.
+    """
+    env_vars = container.get('env')
+    if not env_vars:
+        return 0
+
+    names = set(names)
+    removed = []
+    for i, env in enumerate(env_vars):
+        reference = (env.get('valueFrom') or {}).get(ref)
+        if env.get('name') in names and reference is not None and (ref_name is None or reference.get('name') == ref_name):
+            removed.append(i)
+
+    if removed:
+        _bulk_remove(env_vars, removed)
+    return len(removed)
+
+
+@timed('env.mutate')
+def upsert_env_vars(container, entries, after_ref, before_ref=None, update_existing=False):
+    """
+    Add env entries to a container, keyed by name.
+
+    A name -> position index is built once. New names are inserted in bulk at a
+    single insertion point. Names that already exist are skipped, or have their
+    value replaced in place when update_existing is set.
+
+    Args:
+        container (dict): The container mapping.
+        entries (list): The env entries to add, each with a 'name'.
+        after_ref (str): Insert after the last entry whose valueFrom uses this reference.
+        before_ref (str): Otherwise insert before the first entry whose valueFrom uses this reference.
+        update_existing (bool): Replace the value of entries whose name already exists.
+
+    Returns:
+        tuple: The number of inserted and updated entries.
+    """
+    env_vars = container.get('env')
+    if env_vars is None:
+        env_vars = []
+        container['env'] = env_vars
+
+    positions = {env.get('name'): i for i, env in enumerate(env_vars)}
+    new_entries = []
+    updated = 0
+
+    for entry in entries:
+        name = entry['name']
+        if name in positions:
+            if update_existing and positions[name] is not None:
+                existing = env_vars[positions[name]]
+                if dict(existing) != dict(entry):
+                    for key in [key for key in existing if key != 'name' and key not in entry]:
+                        del existing[key]
+                    for key, value in entry.items():
+                        existing[key] = value
+                    updated += 1
+            continue
+        # Also de-duplicates names repeated within entries
+        positions[name] = None
+        new_entries.append(entry)
+
+    if new_entries:
+        _bulk_insert(env_vars, find_insert_index(env_vars, after_ref, before_ref), new_entries)
+
+    return len(new_entries), updated
@@ -0,0 +1,174 @@
+import io
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE_NAME = '.eks-configurator-journal.json'
+JOURNAL_VERSION = 1
+
+# Journal states: temp files are being written (roll back), or all of them are
+# durable and being renamed into place (roll forward)
+STAGING = 'staging'
+COMMITTING = 'committing'
+
+
+def _read_current(file_path, binary):
+    try:
+        with open(file_path, 'rb' if binary else 'r') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _fsync_directories(paths):
+    """Make renames and removals in these directories durable. Not possible on Windows."""
+    if os.name != 'posix':
+        return
+    for directory in {os.path.dirname(path) for path in paths}:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _write_durable(file_path, content):
+    """Write content (str in text mode, bytes in binary mode) and fsync it."""
+    with open(file_path, 'wb' if isinstance(content, bytes) else 'w') as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _write_journal(journal_path, state, entries):
+    temp_path = f'{journal_path}.tmp'
+    _write_durable(temp_path, json.dumps({'version': JOURNAL_VERSION, 'state': state, 'files': entries}))
+    os.replace(temp_path, journal_path)
+    _fsync_directories([journal_path])
+
+
+def _remove_if_exists(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class FileTransaction:
+    """
+    Collects the new content of the files a run changes and replaces them together.
+
+    Nothing touches the repo until commit(). Reads through the transaction see the
+    staged content, so several edits of one file in a run build on each other.
+    """
+
+    def __init__(self, base_dir):
+        self.journal_path = os.path.join(os.path.abspath(base_dir), JOURNAL_FILE_NAME)
+        self._staged = {}
+
+    def read(self, file_path):
+        path = os.path.abspath(file_path)
+        if path in self._staged:
+            content = self._staged[path]
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        with open(path, 'r') as file:
+            return file.read()
+
+    def readlines(self, file_path):
+        return io.StringIO(self.read(file_path)).readlines()
+
+    def write(self, file_path, content):
+        """Stage content for file_path. Returns False if the file would not change."""
+        path = os.path.abspath(file_path)
+        staged = self._staged.get(path)
+        if staged is None:
+            staged = _read_current(path, isinstance(content, bytes))
+        self._staged[path] = content
+        return staged != content
+
+    def commit(self):
+        """
+        Replace every staged file that differs from the file on disk.
+
+        The new contents are written to temp files next to their targets concurrently
+        and fsynced, then renamed into place. The journal records which state the
+        commit is in, so recover_transaction() can finish or undo it after a crash.
+
+        Returns:
+            list: The paths of the files that were replaced.
+        """
+        pending = {
+            path: content for path, content in self._staged.items()
+            if _read_current(path, isinstance(content, bytes)) != content
+        }
+        self._staged = {}
+        if not pending:
+            return []
+
+        entries = [
+            {'path': path, 'temp': os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.tmp')}
+            for path in pending
+        ]
+
+        _write_journal(self.journal_path, STAGING, entries)
+        try:
+            with ThreadPoolExecutor(max_workers=len(entries)) as executor:
+                list(executor.map(lambda entry: self._stage_file(entry, pending[entry['path']]), entries))
+            _write_journal(self.journal_path, COMMITTING, entries)
+        except BaseException:
+            _roll_back(self.journal_path, entries)
+            raise
+
+        # From here on a failure leaves the journal behind, and the next run rolls forward
+        for entry in entries:
+            os.replace(entry['temp'], entry['path'])
+        _fsync_directories(list(pending))
+        os.remove(self.journal_path)
+        return list(pending)
+
+    @staticmethod
+    def _stage_file(entry, content):
+        _write_durable(entry['temp'], content)
+        if os.path.exists(entry['path']):
+            shutil.copymode(entry['path'], entry['temp'])
+
+
+def _roll_back(journal_path, entries):
+    for entry in entries:
+        _remove_if_exists(entry['temp'])
+    _remove_if_exists(journal_path)
+
+
+def recover_transaction(base_dir):
+    """
+    Finish or undo a commit that was interrupted in base_dir.
+
+    Returns:
+        str: 'forward' or 'back' when an interrupted commit was found, otherwise None.
+    """
+    journal_path = os.path.join(os.path.abspath(base_dir), JOURNAL_FILE_NAME)
+    # A journal that never got renamed into place belongs to a commit that wrote nothing yet
+    _remove_if_exists(f'{journal_path}.tmp')
+    try:
+        with open(journal_path, 'r') as journal_file:
+            journal = json.load(journal_file)
+    except FileNotFoundError:
+        return None
+
+    entries = journal['files']
+    if journal['state'] == COMMITTING:
+        for entry in entries:
+            if os.path.exists(entry['temp']):
+                os.replace(entry['temp'], entry['path'])
+        _fsync_directories([entry['path'] for entry in entries])
+        os.remove(journal_path)
+        logger.warning(f"Completed an interrupted commit of {len(entries)} files in {base_dir}")
+        return 'forward'
+
+    _roll_back(journal_path, entries)
+    logger.warning(f"Rolled back an interrupted commit in {base_dir}, no files had been replaced")
+    return 'back'
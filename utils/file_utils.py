@@ -0,0 +1,42 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def write_if_changed(file_path, content):
+    """
+    Write content to file_path unless the file already holds exactly that content.
+
+    str content is compared and written in text mode, bytes in binary mode. Skipping
+    no-op writes keeps file mtimes, and with them the manifest index cache, intact.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    binary = isinstance(content, bytes)
+    try:
+        with open(file_path, 'rb' if binary else 'r') as file:
+            if file.read() == content:
+                logger.debug(f"{file_path} is unchanged, not writing it")
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(file_path, 'wb' if binary else 'w') as file:
+        file.write(content)
+    return True
+
+
+def read_lines(file_path, transaction=None):
+    """The lines of file_path, as staged in transaction when one is given."""
+    if transaction is not None:
+        return transaction.readlines(file_path)
+    with open(file_path, 'r') as file:
+        return file.readlines()
+
+
+def write_file(file_path, content, transaction=None):
+    """Stage content in transaction, or write it right away when there is none."""
+    if transaction is not None:
+        return transaction.write(file_path, content)
+    return write_if_changed(file_path, content)
@@ -0,0 +1,216 @@
+import contextlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+
+from utils import timing
+from utils.eks_handler import handle_eks_yaml, load_ingress_profiles
+from utils.run_cache import is_up_to_date, record_run
+
+logger = logging.getLogger(__name__)
+
+DEPLOYMENT_FILE_NAME = 'eks-deployment.yaml'
+
+SUPPORTED_OPTIONS = ('Service Account', 'Ingress', 'Config-map', 'Secret', 'HorizontalPodAutoscaler', 'PodDisruptionBudget', 'JVM Tuning')
+
+
+def load_selection_spec(spec_path):
+    """
+    Load a selection spec describing the configurations to apply to every repo.
+
+    The spec holds the same choices the interactive prompts collect, e.g.:
+
+        options: [Service Account, Ingress, Config-map, Secret]
+        ingress_path: /your-microservice/api
+        configmap_options: [DB_URL, DB_NAME]
+        secretmap_options: [DB_PASSWORD]
+        containers: all            # optional: first container by default, or a list of names
+        server_side_apply: true    # optional: one server-side kubectl apply per pipeline stage
+        hpa_custom_metric: {name: http_requests_per_second, target: 100}   # optional, with HorizontalPodAutoscaler
+        ingress_profile: low-latency-api   # optional, with Ingress: see templates/ingress-profiles.yaml
+
+    Args:
+        spec_path (str): Path to the YAML or JSON spec file.
+
+    Returns:
+        dict: The normalized selection.
+    """
+    with open(spec_path, 'r') as spec_file:
+        spec = yaml.safe_load(spec_file) or {}
+
+    return normalize_selection(spec)
+
+
+def normalize_selection(spec):
+    """Validate a selection spec and convert it to handle_eks_yaml arguments."""
+    if not isinstance(spec, dict):
+        raise ValueError("Selection spec must be a mapping.")
+
+    options = spec.get('options') or []
+    invalid_options = [option for option in options if option not in SUPPORTED_OPTIONS]
+    if invalid_options:
+        raise ValueError(f"Invalid option(s) in selection spec: {', '.join(invalid_options)}")
+    if not options:
+        raise ValueError("Selection spec does not select any configuration.")
+
+    containers = spec.get('containers')
+    if containers is not None and containers != 'all' and not (
+            isinstance(containers, list) and all(isinstance(name, str) for name in containers)):
+        raise ValueError("'containers' must be 'all' or a list of container names.")
+
+    custom_metric = spec.get('hpa_custom_metric')
+    if custom_metric is not None and not (
+            isinstance(custom_metric, dict) and custom_metric.get('name') and custom_metric.get('target') is not None):
+        raise ValueError("'hpa_custom_metric' must have a name and a target.")
+
+    ingress_profile = spec.get('ingress_profile') or None
+    if ingress_profile is not None and ingress_profile not in load_ingress_profiles():
+        raise ValueError(f"Unknown 'ingress_profile' {ingress_profile}, expected one of: {', '.join(load_ingress_profiles())}")
+
+    return {
+        'options': list(options),
+        'ingress_path': spec.get('ingress_path') or '',
+        'configmap_options': normalize_keys(spec.get('configmap_options')),
+        'secretmap_options': normalize_keys(spec.get('secretmap_options')),
+        'target_containers': spec.get('containers'),
+        'server_side_apply': bool(spec.get('server_side_apply')),
+        'hpa_custom_metric': custom_metric,
+        'ingress_profile': ingress_profile,
+    }
+
+
+def normalize_keys(keys):
+    """Accept either a list of keys or a key -> value mapping, like get_options returns."""
+    if not keys:
+        return None
+    if isinstance(keys, dict):
+        return {key.strip().upper(): value for key, value in keys.items()}
+    return {key.strip().upper(): "{{" + key.strip().upper() + "}}" for key in keys}
+
+
+def configure_repo(repo_dir, selection, incremental=False):
+    """
+    Apply a selection to a single repo. Runs inside a worker process.
+
+    With incremental set, a successful run is recorded in the run cache so the next
+    incremental run can skip the repo while its files stay unchanged.
+
+    Returns:
+        dict: The repo directory, whether it succeeded, an error message, the elapsed time
+        and the timing spans recorded for this repo.
+    """
+    start = time.perf_counter()
+    result = {'repo': repo_dir, 'success': False, 'error': None, 'elapsed': 0.0, 'spans': []}
+    # Worker processes are reused, only report the spans of this repo
+    timing.reset()
+
+    file_path = os.path.join(repo_dir, DEPLOYMENT_FILE_NAME)
+    try:
+        if not os.path.exists(file_path):
+            result['error'] = f"'{DEPLOYMENT_FILE_NAME}' not found"
+        else:
+            # The handlers print progress for the interactive mode, keep it out of the fleet report
+            with contextlib.redirect_stdout(io.StringIO()):
+                applied = handle_eks_yaml(
+                    file_path,
+                    selection['options'],
+                    selection['ingress_path'],
+                    selection['configmap_options'],
+                    selection['secretmap_options'],
+                    base_dir=repo_dir,
+                    target_containers=selection.get('target_containers'),
+                    server_side_apply=selection.get('server_side_apply', False),
+                    hpa_custom_metric=selection.get('hpa_custom_metric'),
+                    ingress_profile=selection.get('ingress_profile')
+                )
+            if applied:
+                result['success'] = True
+                if incremental:
+                    record_run(repo_dir, selection)
+            else:
+                result['error'] = "Microservice name could not be extracted"
+    except Exception as e:
+        logger.exception(f"Failed to configure {repo_dir}:")
+        result['error'] = str(e) or e.__class__.__name__
+
+    result['elapsed'] = time.perf_counter() - start
+    result['spans'] = timing.get_report()
+    return result
+
+
+def run_fleet(repo_dirs, selection, max_workers=None, incremental=False):
+    """
+    Apply a selection to many repos in parallel.
+
+    Args:
+        repo_dirs (list): Repo directories, each holding an eks-deployment.yaml.
+        selection (dict): Normalized selection, see normalize_selection.
+        max_workers (int): Size of the process pool. Defaults to the CPU count.
+        incremental (bool): Skip repos whose files and selection are unchanged since
+            their last incremental run. They are checked before any worker is started.
+
+    Returns:
+        tuple: The per-repo results in input order and the total elapsed time.
+    """
+    repo_dirs = [os.path.abspath(repo_dir) for repo_dir in repo_dirs]
+    results = {}
+    start = time.perf_counter()
+
+    pending = []
+    for repo_dir in repo_dirs:
+        if incremental and is_up_to_date(repo_dir, selection):
+            results[repo_dir] = {'repo': repo_dir, 'success': True, 'skipped': True, 'error': None, 'elapsed': 0.0, 'spans': []}
+            logger.info(f"Skipped {repo_dir}, unchanged since the last run")
+        else:
+            pending.append(repo_dir)
+
+    if not pending:
+        return [results[repo_dir] for repo_dir in repo_dirs], time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(configure_repo, repo_dir, selection, incremental): repo_dir for repo_dir in pending}
+        for future in as_completed(futures):
+            repo_dir = futures[future]
+            try:
+                results[repo_dir] = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. the process was killed
+                results[repo_dir] = {'repo': repo_dir, 'success': False, 'error': str(e), 'elapsed': 0.0, 'spans': []}
+
+            result = results[repo_dir]
+            timing.merge_report(result['spans'])
+            if result['success']:
+                logger.info(f"Configured {repo_dir} in {result['elapsed']:.2f}s")
+            else:
+                logger.error(f"Failed to configure {repo_dir}: {result['error']}")
+
+    elapsed = time.perf_counter() - start
+    return [results[repo_dir] for repo_dir in repo_dirs], elapsed
+
+
+def print_fleet_report(results, elapsed):
+    """Print per-repo status and throughput for a fleet run."""
+    succeeded = sum(1 for result in results if result['success'])
+    failed = len(results) - succeeded
+    skipped = sum(1 for result in results if result.get('skipped'))
+
+    for result in results:
+        if result.get('skipped'):
+            status = "SKIP"
+        else:
+            status = "OK  " if result['success'] else "FAIL"
+        line = f"{status} {result['repo']} ({result['elapsed']:.2f}s)"
+        if result['error']:
+            line += f" - {result['error']}"
+        print(line)
+
+    throughput = len(results) / elapsed if elapsed > 0 else 0.0
+    print("------------------------------------")
+    summary = f"{succeeded} succeeded, {failed} failed"
+    if skipped:
+        summary += f" ({skipped} unchanged, skipped)"
+    print(f"{summary}, {len(results)} repos in {elapsed:.2f}s ({throughput:.1f} repos/s)")
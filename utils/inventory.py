@@ -0,0 +1,315 @@
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.eks_handler import get_microservice_name, get_step_stage
+from utils.jvm_tuning import parse_cpu, parse_memory
+from utils.manifest_index import index_buffer
+from utils.pipeline_utils import PipelineModel
+from utils.run_cache import INPUT_FILES
+from utils.timing import span, timed
+from utils.yaml_backend import safe_load_all
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = 'fleet-inventory.db'
+
+# Bump when the schema or what is extracted changes, every repo is then scanned again
+INVENTORY_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, service TEXT, scanned_at REAL, error TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, name TEXT NOT NULL,
+    mtime_ns INTEGER, size INTEGER, PRIMARY KEY (repo_id, name));
+CREATE TABLE IF NOT EXISTS documents (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, kind TEXT, name TEXT);
+CREATE TABLE IF NOT EXISTS deployments (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, name TEXT, replicas INTEGER);
+CREATE TABLE IF NOT EXISTS containers (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, deployment TEXT, name TEXT, section TEXT,
+    image TEXT, cpu_request REAL, cpu_limit REAL, memory_request INTEGER, memory_limit INTEGER);
+CREATE TABLE IF NOT EXISTS env_refs (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, deployment TEXT, container TEXT,
+    env_name TEXT, ref_kind TEXT, ref_name TEXT, ref_key TEXT);
+CREATE TABLE IF NOT EXISTS data_keys (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, kind TEXT, name TEXT, key TEXT);
+CREATE TABLE IF NOT EXISTS pipeline_steps (
+    repo_id INTEGER NOT NULL REFERENCES repos(id) ON DELETE CASCADE, stage TEXT, job TEXT,
+    variable TEXT, source TEXT, namespace TEXT, env TEXT);
+CREATE INDEX IF NOT EXISTS repos_service ON repos(service);
+CREATE INDEX IF NOT EXISTS documents_repo ON documents(repo_id);
+CREATE INDEX IF NOT EXISTS documents_kind ON documents(kind, repo_id);
+CREATE INDEX IF NOT EXISTS deployments_repo ON deployments(repo_id);
+CREATE INDEX IF NOT EXISTS containers_repo ON containers(repo_id);
+CREATE INDEX IF NOT EXISTS env_refs_repo ON env_refs(repo_id);
+CREATE INDEX IF NOT EXISTS env_refs_name ON env_refs(env_name);
+CREATE INDEX IF NOT EXISTS env_refs_key ON env_refs(ref_key);
+CREATE INDEX IF NOT EXISTS data_keys_repo ON data_keys(repo_id);
+CREATE INDEX IF NOT EXISTS data_keys_key ON data_keys(key);
+CREATE INDEX IF NOT EXISTS pipeline_steps_repo ON pipeline_steps(repo_id);
+CREATE INDEX IF NOT EXISTS pipeline_steps_stage ON pipeline_steps(stage);
+"""
+
+# Tables holding the rows of one scan of a repo, with their columns after repo_id
+ROW_TABLES = {
+    'documents': ('kind', 'name'),
+    'deployments': ('name', 'replicas'),
+    'containers': ('deployment', 'name', 'section', 'image', 'cpu_request', 'cpu_limit', 'memory_request', 'memory_limit'),
+    'env_refs': ('deployment', 'container', 'env_name', 'ref_kind', 'ref_name', 'ref_key'),
+    'data_keys': ('kind', 'name', 'key'),
+    'pipeline_steps': ('stage', 'job', 'variable', 'source', 'namespace', 'env'),
+}
+
+ENV_REF_KINDS = ('configMapKeyRef', 'secretKeyRef')
+ENV_FROM_KINDS = ('configMapRef', 'secretRef')
+
+QUERIES = {
+    'env-ref': (
+        "Services with an env entry named NAME or referencing the ConfigMap/Secret key NAME",
+        "SELECT DISTINCT r.service, r.path, e.container, e.env_name, e.ref_kind, e.ref_name, e.ref_key "
+        "FROM env_refs e JOIN repos r ON r.id = e.repo_id WHERE e.env_name = :value OR e.ref_key = :value "
+        "ORDER BY r.service"),
+    'missing-kind': (
+        "Services without a document of kind NAME, e.g. Ingress",
+        "SELECT r.service, r.path FROM repos r WHERE r.error IS NULL AND NOT EXISTS "
+        "(SELECT 1 FROM documents d WHERE d.repo_id = r.id AND d.kind = :value) ORDER BY r.service"),
+    'kind': (
+        "Services with a document of kind NAME",
+        "SELECT DISTINCT r.service, r.path, d.name FROM documents d JOIN repos r ON r.id = d.repo_id "
+        "WHERE d.kind = :value ORDER BY r.service"),
+    'data-key': (
+        "Services whose ConfigMap or Secret file holds the key NAME",
+        "SELECT r.service, r.path, k.kind, k.name FROM data_keys k JOIN repos r ON r.id = k.repo_id "
+        "WHERE k.key = :value ORDER BY r.service"),
+    'stage': (
+        "Services deployed by the pipeline stage NAME",
+        "SELECT DISTINCT r.service, r.path, s.namespace FROM pipeline_steps s JOIN repos r ON r.id = s.repo_id "
+        "WHERE s.stage = :value ORDER BY r.service"),
+    'errors': (
+        "Repos that could not be scanned",
+        "SELECT r.path, r.error FROM repos r WHERE r.error IS NOT NULL ORDER BY r.path"),
+}
+
+
+def file_stats(repo_dir):
+    """(name, mtime_ns, size) of the repo files, None for missing files."""
+    stats = []
+    for file_name in INPUT_FILES:
+        try:
+            stat = os.stat(os.path.join(repo_dir, file_name))
+            stats.append((file_name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stats.append((file_name, None, None))
+    return stats
+
+
+def _load_file(repo_dir, file_name):
+    try:
+        with open(os.path.join(repo_dir, file_name), 'r') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _container_rows(deployment_name, container, section):
+    resources = container.get('resources') or {}
+    requests, limits = resources.get('requests') or {}, resources.get('limits') or {}
+
+    def quantity(parse, value):
+        return parse(value) if value is not None else None
+
+    return (deployment_name, container.get('name'), section, container.get('image'),
+            quantity(parse_cpu, requests.get('cpu')), quantity(parse_cpu, limits.get('cpu')),
+            quantity(parse_memory, requests.get('memory')), quantity(parse_memory, limits.get('memory')))
+
+
+def _env_ref_rows(deployment_name, container):
+    rows = []
+    for env in container.get('env') or []:
+        value_from = env.get('valueFrom') or {}
+        for ref_kind in ENV_REF_KINDS:
+            reference = value_from.get(ref_kind)
+            if isinstance(reference, dict):
+                rows.append((deployment_name, container.get('name'), env.get('name'), ref_kind, reference.get('name'), reference.get('key')))
+    for env_from in container.get('envFrom') or []:
+        for ref_kind in ENV_FROM_KINDS:
+            reference = env_from.get(ref_kind)
+            if isinstance(reference, dict):
+                rows.append((deployment_name, container.get('name'), None, ref_kind, reference.get('name'), None))
+    return rows
+
+
+def scan_repo(repo_dir):
+    """
+    Extract the inventory rows of one repo. Runs inside a worker process.
+
+    The files are only read, with the read-only YAML loader. Commented-out ConfigMap
+    and Secret files hold no documents, and so no keys.
+
+    Returns:
+        dict: The repo, its service name, the file stats, an error message and the
+        rows for each of ROW_TABLES.
+    """
+    result = {'repo': repo_dir, 'service': None, 'files': file_stats(repo_dir), 'error': None,
+              'rows': {table: [] for table in ROW_TABLES}}
+    rows = result['rows']
+    try:
+        deployment_text = _load_file(repo_dir, 'eks-deployment.yaml')
+        if deployment_text is None:
+            result['error'] = "'eks-deployment.yaml' not found"
+            return result
+
+        index = index_buffer(deployment_text.encode('utf-8'))
+        result['service'] = get_microservice_name(os.path.join(repo_dir, 'eks-deployment.yaml'), documents=index)
+
+        for document in safe_load_all(deployment_text):
+            if not isinstance(document, dict):
+                continue
+            kind, name = document.get('kind'), (document.get('metadata') or {}).get('name')
+            rows['documents'].append((kind, name))
+            if kind != 'Deployment':
+                continue
+            spec = document.get('spec') or {}
+            rows['deployments'].append((name, spec.get('replicas')))
+            pod_spec = (spec.get('template') or {}).get('spec') or {}
+            for section in ('containers', 'initContainers'):
+                for container in pod_spec.get(section) or []:
+                    rows['containers'].append(_container_rows(name, container, section))
+                    rows['env_refs'].extend(_env_ref_rows(name, container))
+
+        for file_name in ('eks-config-maps.yaml', 'eks-config-secrets.yaml'):
+            for document in safe_load_all(_load_file(repo_dir, file_name) or ''):
+                if isinstance(document, dict) and isinstance(document.get('data'), dict):
+                    name = (document.get('metadata') or {}).get('name')
+                    rows['data_keys'].extend((document.get('kind'), name, str(key)) for key in document['data'])
+
+        pipeline_text = _load_file(repo_dir, 'azure-pipeline-CD.yaml')
+        if pipeline_text is not None:
+            for step in PipelineModel(pipeline_text.splitlines(keepends=True)).steps:
+                stage = get_step_stage(step) or {}
+                namespace = step['render']['substitutions'].get('{{deployNamespace}}', (None, None))[1]
+                rows['pipeline_steps'].append((step['stage'], step['job'], step['render']['variable'],
+                                               step['render']['source'], namespace, stage.get('env')))
+    except Exception as e:
+        logger.exception(f"Failed to scan {repo_dir}:")
+        result['error'] = str(e) or e.__class__.__name__
+    return result
+
+
+def connect(database_path):
+    """Open the inventory database, creating its schema. A database of an older version is emptied."""
+    connection = sqlite3.connect(database_path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('PRAGMA foreign_keys=ON')
+    connection.executescript(SCHEMA)
+
+    version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if version is None or int(version[0]) != INVENTORY_VERSION:
+        with connection:
+            connection.execute('DELETE FROM repos')
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INVENTORY_VERSION),))
+    return connection
+
+
+def is_current(connection, repo_dir, stats):
+    """True when the repo was scanned before and none of its files changed since."""
+    recorded = connection.execute(
+        'SELECT f.name, f.mtime_ns, f.size FROM files f JOIN repos r ON r.id = f.repo_id WHERE r.path = ?', (repo_dir,)
+    ).fetchall()
+    return bool(recorded) and sorted(recorded) == sorted(stats)
+
+
+def store_result(connection, result):
+    """Replace the rows of a repo by the rows of its latest scan."""
+    connection.execute('DELETE FROM repos WHERE path = ?', (result['repo'],))
+    repo_id = connection.execute(
+        'INSERT INTO repos (path, service, scanned_at, error) VALUES (?, ?, ?, ?)',
+        (result['repo'], result['service'], time.time(), result['error'])
+    ).lastrowid
+    # A repo that failed is scanned again next time, whatever its mtimes
+    if not result['error']:
+        connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?)', [(repo_id, *stat) for stat in result['files']])
+    for table, columns in ROW_TABLES.items():
+        if result['rows'][table]:
+            placeholders = ', '.join('?' * (len(columns) + 1))
+            connection.executemany(
+                f"INSERT INTO {table} (repo_id, {', '.join(columns)}) VALUES ({placeholders})",
+                [(repo_id, *row) for row in result['rows'][table]])
+
+
+@timed('inventory.scan')
+def scan_fleet(repo_dirs, database_path=DEFAULT_DATABASE, max_workers=None, full=False):
+    """
+    Scan many repos into the inventory database.
+
+    Repos whose files have the same mtime and size as at their last scan are skipped,
+    unless full is set. The others are scanned in a process pool and stored in one
+    transaction, so a query never sees a half-written scan.
+
+    Returns:
+        dict: The 'scanned', 'skipped' and 'failed' repo paths and the 'elapsed' time.
+    """
+    start = time.perf_counter()
+    repo_dirs = list(dict.fromkeys(os.path.abspath(repo_dir) for repo_dir in repo_dirs))
+    connection = connect(database_path)
+    try:
+        with span('inventory.stat'):
+            pending = [repo_dir for repo_dir in repo_dirs if full or not is_current(connection, repo_dir, file_stats(repo_dir))]
+        pending_dirs = set(pending)
+        skipped = [repo_dir for repo_dir in repo_dirs if repo_dir not in pending_dirs]
+
+        results = []
+        if len(pending) == 1:
+            # Not worth starting a worker process
+            results.append(scan_repo(pending[0]))
+        elif pending:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(scan_repo, repo_dir): repo_dir for repo_dir in pending}
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # The worker itself died, e.g. the process was killed
+                        results.append({'repo': futures[future], 'service': None, 'files': [], 'error': str(e),
+                                        'rows': {table: [] for table in ROW_TABLES}})
+
+        with span('inventory.store'), connection:
+            for result in results:
+                store_result(connection, result)
+    finally:
+        connection.close()
+
+    failed = [result['repo'] for result in results if result['error']]
+    for result in results:
+        if result['error']:
+            logger.error(f"Failed to scan {result['repo']}: {result['error']}")
+    return {
+        'scanned': [result['repo'] for result in results],
+        'skipped': skipped,
+        'failed': failed,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def query_inventory(database_path, sql, parameters=()):
+    """
+    Run a query against the inventory database, opened read-only.
+
+    Returns:
+        tuple: The column names and the result rows.
+    """
+    if not os.path.exists(database_path):
+        raise FileNotFoundError(f"Inventory database '{database_path}' not found, run the scan command first")
+    connection = sqlite3.connect(f'{pathlib.Path(database_path).resolve().as_uri()}?mode=ro', uri=True)
+    try:
+        cursor = connection.execute(sql, parameters)
+        return [column[0] for column in cursor.description or []], cursor.fetchall()
+    finally:
+        connection.close()
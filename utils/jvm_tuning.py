@@ -0,0 +1,188 @@
+import logging
+import math
+import re
+
+from utils.env_editor import select_containers, upsert_env_vars
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+JAVA_TOOL_OPTIONS = 'JAVA_TOOL_OPTIONS'
+
+# Metaspace, code cache, thread stacks and direct buffers live outside the heap
+NON_HEAP_MI = 192
+MIN_HEAP_PERCENTAGE = 50
+MAX_HEAP_PERCENTAGE = 75
+
+# Below these limits G1's background threads and region overhead cost more than they save
+G1_MIN_CORES = 2
+G1_MIN_MEMORY_MI = 1792
+SMALL_STACK_MEMORY_MI = 1024
+
+# Spring Boot actuator health groups, enabled automatically when running on Kubernetes
+LIVENESS_PATH = '/actuator/health/liveness'
+READINESS_PATH = '/actuator/health/readiness'
+PROBE_PERIOD_SECONDS = 10
+STARTUP_PERIOD_SECONDS = 5
+# Startup time allowed at one full core, scaled up for CPU-throttled containers
+STARTUP_SECONDS_PER_CORE = 60
+MAX_STARTUP_SECONDS = 300
+
+QUANTITY_PATTERN = re.compile(r'^\s*([0-9.]+)\s*([A-Za-z]*)\s*$')
+MEMORY_UNITS = {
+    '': 1, 'k': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3, 'T': 1000 ** 4,
+    'Ki': 1024, 'Mi': 1024 ** 2, 'Gi': 1024 ** 3, 'Ti': 1024 ** 4,
+}
+
+
+def parse_memory(quantity):
+    """Bytes of a Kubernetes memory quantity such as '512Mi' or '1G', None if it cannot be read."""
+    match = QUANTITY_PATTERN.match(str(quantity))
+    if not match or match.group(2) not in MEMORY_UNITS:
+        return None
+    return float(match.group(1)) * MEMORY_UNITS[match.group(2)]
+
+
+def parse_cpu(quantity):
+    """Cores of a Kubernetes CPU quantity such as '100m' or '2', None if it cannot be read."""
+    match = QUANTITY_PATTERN.match(str(quantity))
+    if not match or match.group(2) not in ('', 'm'):
+        return None
+    return float(match.group(1)) / (1000 if match.group(2) == 'm' else 1)
+
+
+def container_limits(container):
+    """The (memory bytes, cores) a container is limited to. Requests stand in for missing limits."""
+    resources = container.get('resources') or {}
+    limits, requests = resources.get('limits') or {}, resources.get('requests') or {}
+    memory = limits.get('memory') or requests.get('memory')
+    cpu = limits.get('cpu') or requests.get('cpu')
+    return (parse_memory(memory) if memory is not None else None,
+            parse_cpu(cpu) if cpu is not None else None)
+
+
+def java_tool_options(memory, cpu=None):
+    """
+    JVM options for a container with memory bytes and cpu cores.
+
+    The heap gets what is left after a fixed non-heap allowance, between 50% and 75%
+    of the limit. Small or single-core containers use SerialGC and smaller thread
+    stacks, larger ones G1.
+    """
+    memory_mi = memory / (1024 * 1024)
+    heap_percentage = 100 * (memory_mi - NON_HEAP_MI) / memory_mi
+    heap_percentage = min(MAX_HEAP_PERCENTAGE, max(MIN_HEAP_PERCENTAGE, math.floor(heap_percentage)))
+
+    options = [f'-XX:MaxRAMPercentage={heap_percentage}.0', f'-XX:InitialRAMPercentage={heap_percentage}.0']
+    if (cpu is not None and cpu < G1_MIN_CORES) or memory_mi < G1_MIN_MEMORY_MI:
+        options.append('-XX:+UseSerialGC')
+    else:
+        options.append('-XX:+UseG1GC')
+    if cpu is not None:
+        # The JVM rounds a CPU quota up to whole processors, at least one
+        options.append(f'-XX:ActiveProcessorCount={max(1, math.ceil(cpu))}')
+    if memory_mi < SMALL_STACK_MEMORY_MI:
+        options.append('-Xss512k')
+    options.append('-XX:+ExitOnOutOfMemoryError')
+    return ' '.join(options)
+
+
+def actuator_probes(port, cpu=None):
+    """Startup, readiness and liveness probes on the Spring Boot actuator health groups."""
+    startup_seconds = STARTUP_SECONDS_PER_CORE / min(1, cpu) if cpu else STARTUP_SECONDS_PER_CORE
+    startup_seconds = min(MAX_STARTUP_SECONDS, startup_seconds)
+
+    def http_get(path):
+        return {'path': path, 'port': port}
+
+    return {
+        'startupProbe': {
+            'httpGet': http_get(LIVENESS_PATH),
+            'periodSeconds': STARTUP_PERIOD_SECONDS,
+            'failureThreshold': math.ceil(startup_seconds / STARTUP_PERIOD_SECONDS),
+        },
+        'readinessProbe': {
+            'httpGet': http_get(READINESS_PATH),
+            'periodSeconds': PROBE_PERIOD_SECONDS,
+            'timeoutSeconds': 3,
+            'failureThreshold': 3,
+        },
+        'livenessProbe': {
+            'httpGet': http_get(LIVENESS_PATH),
+            'periodSeconds': PROBE_PERIOD_SECONDS,
+            'timeoutSeconds': 3,
+            'failureThreshold': 3,
+        },
+    }
+
+
+def container_port(container):
+    ports = container.get('ports') or []
+    return ports[0].get('containerPort') if ports else None
+
+
+def plan_container(container):
+    """
+    The JAVA_TOOL_OPTIONS value and the missing probes of a container, or None when
+    its memory limit is unknown.
+    """
+    memory, cpu = container_limits(container)
+    if not memory:
+        return None
+
+    port = container_port(container)
+    probes = {}
+    if port is not None:
+        probes = {key: probe for key, probe in actuator_probes(port, cpu).items() if key not in container}
+    return java_tool_options(memory, cpu), probes
+
+
+def _needs_tuning(container):
+    plan = plan_container(container)
+    if plan is None:
+        return False
+    options, probes = plan
+    current = {env.get('name'): env.get('value') for env in container.get('env') or []}
+    return bool(probes) or current.get(JAVA_TOOL_OPTIONS) != options
+
+
+@timed('jvm.tune')
+def configure_jvm(session, target_containers=None):
+    """
+    Set JAVA_TOOL_OPTIONS from the resources block of the selected containers of every
+    Deployment and add actuator probes the containers do not have yet.
+
+    JAVA_TOOL_OPTIONS is recomputed on every run, so it follows changed limits. Existing
+    probes are left alone. Deployments are only parsed for editing when something changes.
+
+    Returns:
+        int: The number of containers that were changed.
+    """
+    if not any(
+            _needs_tuning(container)
+            for deployment in session.read_documents('Deployment')
+            for container in select_containers(deployment, target_containers)):
+        logger.info("JVM options and probes are already up to date")
+        return 0
+
+    changed = 0
+    for deployment in session.deployments():
+        for container in select_containers(deployment, target_containers):
+            plan = plan_container(container)
+            if plan is None:
+                logger.warning(f"Container {container.get('name')} has no memory limit, JVM options not set")
+                continue
+            options, probes = plan
+            if container_port(container) is None:
+                logger.warning(f"Container {container.get('name')} has no containerPort, probes not added")
+
+            # Plain values go ahead of the ConfigMap and Secret references
+            inserted, updated = upsert_env_vars(
+                container, [{'name': JAVA_TOOL_OPTIONS, 'value': options}],
+                after_ref=None, before_ref='configMapKeyRef', update_existing=True)
+            for key, probe in probes.items():
+                container[key] = probe
+            if inserted or updated or probes:
+                changed += 1
+                logger.info(f"Set {JAVA_TOOL_OPTIONS}='{options}' and {len(probes)} probes on {container.get('name')}")
+    return changed
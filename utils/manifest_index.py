@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# A '---' document separator line, optionally followed by a comment
+DOCUMENT_SEPARATOR_PATTERN = re.compile(rb'^---[ \t]*(?:#[^\r\n]*)?\r?$', re.MULTILINE)
+LINE_PATTERN = re.compile(rb'[^\n]*\n|[^\n]+')
+
+CONTAINER_SECTIONS = ('containers', 'initContainers')
+
+# In-process cache: absolute path -> (mtime_ns, size, documents), least recently used first
+_memory_cache = OrderedDict()
+MEMORY_CACHE_SIZE = 1024
+# The API server looks up indexes from its request threads
+_memory_cache_lock = threading.Lock()
+
+
+def get_cache_dir():
+    """Directory for the persistent index cache, overridable with EKS_CONFIGURATOR_CACHE_DIR."""
+    return os.environ.get('EKS_CONFIGURATOR_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'eks-configurator')
+
+
+def document_ranges(buffer):
+    """Return the (start, end) byte range of each document, split on '---' separator lines."""
+    boundaries = [match.start() for match in DOCUMENT_SEPARATOR_PATTERN.finditer(buffer)]
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    boundaries.append(len(buffer))
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def _scalar(value):
+    """Turn the raw text after 'key:' into a plain string, dropping quotes and comments."""
+    value = value.strip()
+    if not value:
+        return None
+    if value[0] in '"\'':
+        closing = value.find(value[0], 1)
+        return value[1:closing] if closing > 0 else value[1:]
+    comment = value.find(' #')
+    if comment >= 0:
+        value = value[:comment].rstrip()
+    return value
+
+
+def index_document(buffer, start, end):
+    """
+    Extract the lookup fields of one document with a line scan, without parsing YAML.
+
+    Returns:
+        dict: kind, name, namespace, app label, byte offsets and, for pod templates,
+        the position of every container and of its env entries.
+    """
+    entry = {
+        'start': start,
+        'end': end,
+        'empty': True,
+        'kind': None,
+        'name': None,
+        'namespace': None,
+        'app': None,
+        'containers': [],
+    }
+
+    # Stack of (indent, key) for the mapping keys enclosing the current line.
+    # Sequence items are pushed with the key '-'.
+    path = []
+    container = None
+
+    for match in LINE_PATTERN.finditer(buffer, start, end):
+        raw = match.group(0).decode('utf-8').rstrip('\r\n')
+        content = raw.strip()
+        if not content or content.startswith('#') or content.startswith('---'):
+            continue
+        entry['empty'] = False
+
+        indent = len(raw) - len(raw.lstrip(' '))
+        offset = match.start()
+
+        if content == '-' or content.startswith('- '):
+            while path and (path[-1][0] > indent or (path[-1][0] == indent and path[-1][1] == '-')):
+                path.pop()
+            if path and path[-1][1] in CONTAINER_SECTIONS:
+                container = {
+                    'section': path[-1][1],
+                    'name': None,
+                    'offset': offset,
+                    'env_offset': None,
+                    'env': [],
+                }
+                entry['containers'].append(container)
+            path.append((indent, '-'))
+            item = content[1:].lstrip(' ')
+            indent = indent + (len(content) - len(item))
+            content = item
+            if not content:
+                continue
+        else:
+            while path and path[-1][0] >= indent:
+                path.pop()
+
+        key, separator, value = content.partition(':')
+        if not separator or (value and not value[0].isspace()):
+            # A scalar sequence item or a continuation line
+            continue
+        key = key.strip().strip('"\'')
+        value = _scalar(value)
+        keys = [path_key for _, path_key in path]
+
+        if not keys:
+            if key == 'kind':
+                entry['kind'] = value
+        elif keys == ['metadata']:
+            if key in ('name', 'namespace'):
+                entry[key] = value
+        elif keys == ['metadata', 'labels']:
+            if key == 'app':
+                entry['app'] = value
+        elif container is not None and keys[-1] == '-' and keys[-2] in CONTAINER_SECTIONS:
+            if key == 'name':
+                container['name'] = value
+            elif key == 'env':
+                container['env_offset'] = offset
+        elif container is not None and len(keys) >= 4 and keys[-4] in CONTAINER_SECTIONS and keys[-2:] == ['env', '-']:
+            if key == 'name':
+                container['env'].append({'name': value, 'offset': offset})
+
+        if value is None:
+            path.append((indent, key))
+
+    return entry
+
+
+def index_buffer(buffer):
+    """Index every document of a manifest held in memory."""
+    return [index_document(buffer, start, end) for start, end in document_ranges(buffer)]
+
+
+def _cache_file_path(file_path):
+    digest = hashlib.sha1(file_path.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), f'index-{digest}.json')
+
+
+def _load_cached_index(file_path, mtime_ns, size):
+    try:
+        with open(_cache_file_path(file_path), 'r') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    if (cached.get('version') == INDEX_VERSION and cached.get('path') == file_path
+            and cached.get('mtime_ns') == mtime_ns and cached.get('size') == size):
+        return cached['documents']
+    return None
+
+
+def _save_cached_index(file_path, mtime_ns, size, documents):
+    cache_file_path = _cache_file_path(file_path)
+    try:
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        temp_path = f'{cache_file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as cache_file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'path': file_path,
+                'mtime_ns': mtime_ns,
+                'size': size,
+                'documents': documents,
+            }, cache_file)
+        os.replace(temp_path, cache_file_path)
+    except OSError as e:
+        # The cache is an optimisation only
+        logger.debug(f"Could not write manifest index cache for {file_path}: {e}")
+
+
+def get_manifest_index(file_path):
+    """
+    Return the document index of a manifest file.
+
+    The index is cached in memory and on disk, keyed by path, mtime and size, so
+    repeated lookups on an unchanged file neither read nor parse it.
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    mtime_ns, size = stat.st_mtime_ns, stat.st_size
+
+    with _memory_cache_lock:
+        cached = _memory_cache.get(file_path)
+        if cached and cached[0] == mtime_ns and cached[1] == size:
+            _memory_cache.move_to_end(file_path)
+            return cached[2]
+
+    documents = _load_cached_index(file_path, mtime_ns, size)
+    if documents is None:
+        with open(file_path, 'rb') as file:
+            documents = index_buffer(file.read())
+        _save_cached_index(file_path, mtime_ns, size, documents)
+
+    with _memory_cache_lock:
+        _memory_cache[file_path] = (mtime_ns, size, documents)
+        _memory_cache.move_to_end(file_path)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return documents
+
+
+def forget_manifest_index(directory):
+    """
+    Drop the cached indexes of the files of a directory, in memory and on disk.
+    Used for scratch copies, whose paths are never looked up again.
+    """
+    directory = os.path.abspath(directory)
+    with _memory_cache_lock:
+        file_paths = {path for path in _memory_cache if os.path.dirname(path) == directory}
+        if os.path.isdir(directory):
+            file_paths.update(os.path.join(directory, name) for name in os.listdir(directory))
+        for file_path in file_paths:
+            _memory_cache.pop(file_path, None)
+
+    for file_path in file_paths:
+        try:
+            os.remove(_cache_file_path(file_path))
+        except OSError:
+            pass
+
+
+def get_cache_stats():
+    """Size of the in-process index cache."""
+    with _memory_cache_lock:
+        return {'entries': len(_memory_cache), 'max_entries': MEMORY_CACHE_SIZE}
+
+
+def find_documents(documents, kind=None, name=None):
+    """Filter index entries by kind and/or metadata.name."""
+    return [
+        document for document in documents
+        if not document['empty']
+        and (kind is None or document['kind'] == kind)
+        and (name is None or document['name'] == name)
+    ]
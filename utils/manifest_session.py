@@ -0,0 +1,193 @@
+import io
+import logging
+import re
+
+from utils.file_utils import write_file
+from utils.manifest_index import DOCUMENT_SEPARATOR_PATTERN, index_buffer
+from utils.timing import span
+from utils.yaml_backend import round_trip_dump, round_trip_load, safe_load_all
+
+logger = logging.getLogger(__name__)
+
+ENCODING = 'utf-8'
+
+
+class ManifestDocument:
+    """
+    One byte range of a multi-document manifest.
+
+    The range starts at its '---' separator line (if any) and runs up to the next
+    separator. Until the document is parsed for editing, its bytes are written
+    back verbatim from the original buffer.
+    """
+
+    def __init__(self, source, index_entry):
+        self.source = source
+        self.index_entry = index_entry
+        self.data = None
+        self._header = ''
+        self._leading = ''
+        self._trailing = ''
+
+    @property
+    def kind(self):
+        return self.index_entry['kind']
+
+    @property
+    def parsed(self):
+        return self.data is not None
+
+    def parse(self):
+        """Parse this document for editing, keeping its separator and surrounding blank lines."""
+        if self.data is None:
+            text = bytes(self.source).decode(ENCODING)
+
+            separator = DOCUMENT_SEPARATOR_PATTERN.match(self.source)
+            header_end = 0
+            if separator:
+                header_end = len(separator.group(0).decode(ENCODING))
+                if text[header_end:header_end + 1] == '\n':
+                    header_end += 1
+            self._header = text[:header_end]
+            body = text[header_end:]
+
+            core = body.rstrip()
+            self._trailing = body[len(core):]
+            leading_match = re.match(r'(?:[ \t]*\r?\n)*', core)
+            self._leading = leading_match.group(0)
+
+            # Comments keep the line breaks they were read with, so parse with '\n' only
+            # and let render() write the document's own line break
+            with span('yaml.parse'):
+                self.data = round_trip_load(core[len(self._leading):].replace('\r\n', '\n'))
+        return self.data
+
+    def render(self, newline):
+        """Return the bytes to write for this document."""
+        if self.data is None:
+            return self.source
+
+        stream = io.StringIO()
+        with span('yaml.dump'):
+            round_trip_dump(self.data, stream)
+        body = stream.getvalue().rstrip('\n')
+        if newline != '\n':
+            body = body.replace('\n', newline)
+
+        # The dumped body replaces the final line break of the original content,
+        # which is kept at the start of the trailing whitespace
+        trailing = self._trailing if self._trailing else newline
+        return (self._header + self._leading + body + trailing).encode(ENCODING)
+
+
+def split_documents(buffer):
+    """Split a manifest buffer into ManifestDocument byte ranges without parsing YAML."""
+    view = memoryview(buffer)
+    return [ManifestDocument(view[entry['start']:entry['end']], entry) for entry in index_buffer(buffer)]
+
+
+class ManifestSession:
+    """
+    In-memory editing session for an eks-deployment.yaml file.
+
+    The file is read once when the session is created. Template appends and
+    Deployment mutations are applied in memory, and commit() writes the result
+    back with a single write. Only the documents being edited are parsed and
+    re-emitted; every other document is copied byte for byte.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            buffer = file.read()
+
+        self.newline = '\r\n' if b'\r\n' in buffer else '\n'
+        self._documents = split_documents(buffer)
+        self.modified = False
+
+    @property
+    def index(self):
+        """Index entries (kind, name, app label, offsets) of the documents in the session."""
+        return [document.index_entry for document in self._documents]
+
+    @property
+    def content(self):
+        """The current manifest text, including uncommitted changes."""
+        return b''.join(bytes(document.render(self.newline)) for document in self._documents).decode(ENCODING)
+
+    def append_configuration(self, configuration_yaml):
+        """Append a rendered template as new YAML document(s)."""
+        text = '\n\n' + configuration_yaml
+        if self.newline != '\n':
+            text = text.replace('\n', self.newline)
+
+        self._documents.extend(split_documents(text.encode(ENCODING)))
+        self.modified = True
+
+    def deployments(self):
+        """Parse and return the Deployment documents for mutation."""
+        deployments = []
+        for document in self._documents:
+            if document.kind == 'Deployment':
+                data = document.parse()
+                if isinstance(data, dict) and data.get('kind') == 'Deployment':
+                    deployments.append(data)
+
+        self.modified = True
+        return deployments
+
+    def edit_documents(self, kind, name=None):
+        """Parse and return the documents of a kind (and metadata.name) for mutation."""
+        documents = []
+        for document in self._documents:
+            if document.kind == kind and (name is None or document.index_entry['name'] == name):
+                data = document.parse()
+                if isinstance(data, dict):
+                    documents.append(data)
+
+        if documents:
+            self.modified = True
+        return documents
+
+    def read_documents(self, kind, name=None):
+        """Load the documents of a kind read-only, leaving their bytes untouched."""
+        documents = []
+        for document in self._documents:
+            if document.kind == kind and (name is None or document.index_entry['name'] == name):
+                documents.extend(safe_load_all(bytes(document.source).decode(ENCODING)))
+        return [document for document in documents if isinstance(document, dict)]
+
+    def remove_documents(self, kind, name):
+        """
+        Remove the documents of a kind and metadata.name. A blank document left in front
+        of a removed one by append_configuration goes with it.
+
+        Returns:
+            int: The number of removed documents.
+        """
+        kept = []
+        removed = 0
+        for document in self._documents:
+            if document.kind == kind and document.index_entry['name'] == name:
+                if kept and kept[-1].index_entry['empty'] and not bytes(kept[-1].source).strip():
+                    kept.pop()
+                removed += 1
+            else:
+                kept.append(document)
+
+        if removed:
+            self._documents = kept
+            self.modified = True
+        return removed
+
+    def commit(self, transaction=None):
+        """
+        Write the session back to the file, or stage it in a FileTransaction.
+        Returns False if the file content did not change.
+        """
+        if not self.modified:
+            return False
+
+        content = b''.join(bytes(document.render(self.newline)) for document in self._documents)
+        self.modified = False
+        return write_file(self.file_path, content, transaction)
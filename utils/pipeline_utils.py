@@ -0,0 +1,332 @@
+import re
+
+# A render step in azure-pipeline-CD.yaml, e.g.
+#   template=`cat eks-deployment.yaml | sed "s/{{a}}/x/g" | sed "s/{{b}}/y/g"`
+#   template=`sed -e "s/{{a}}/x/g" -e "s/{{b}}/y/g" eks-deployment.yaml`
+RENDER_LINE_PATTERN = re.compile(
+    r'^(?P<indent>\s*)(?P<variable>template|configMapTemplate|secretMapTemplate)=`(?P<command>.*)`\s*$'
+)
+# A double-quoted "s<d>pattern<d>replacement<d>g" expression for each delimiter the
+# configurator writes. Escaped characters such as \& or \<d> are part of the fields.
+SUBSTITUTION_PATTERNS = {
+    delimiter: re.compile(
+        '^"s{d}(?P<pattern>(?:\\\\.|[^\\\\"{d}])*){d}(?P<replacement>(?:\\\\.|[^\\\\"{d}])*){d}g"$'.format(d=re.escape(delimiter))
+    )
+    for delimiter in '/#|'
+}
+# The words of a shell command: double-quoted, single-quoted or bare
+WORD_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"|\'[^\']*\'|[^\s"\']+')
+# A separate kubectl call per rendered manifest, e.g.
+#   echo "$configMapTemplate" | kubectl apply -f -
+APPLY_LINE_PATTERN = re.compile(r'^(?P<indent>\s*)echo\s+"\$(?P<variable>\w+)"\s*\|\s*kubectl\s+apply\s+-f\s+-\s*$')
+STAGE_PATTERN = re.compile(r'^\s*-\s*stage:\s*(?P<name>[^\s#]+)')
+JOB_PATTERN = re.compile(r'^\s*-\s*(?:deployment|job):\s*(?P<name>[^\s#]+)')
+
+
+def split_pipeline(command):
+    """Split a shell command on the '|' pipes outside quotes."""
+    segments, current = [], []
+    quote, escaped = None, False
+    for character in command:
+        if escaped:
+            escaped = False
+        elif character == '\\' and quote != "'":
+            escaped = True
+        elif quote:
+            if character == quote:
+                quote = None
+        elif character in '"\'':
+            quote = character
+        elif character == '|':
+            segments.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(character)
+    segments.append(''.join(current).strip())
+    return segments
+
+
+def _sed_expressions(words):
+    """The expressions of the arguments of a sed, without the '-e' flags, or None if it has other options."""
+    expressions = []
+    i = 0
+    while i < len(words):
+        if words[i] == '-e' and i + 1 < len(words):
+            expressions.append(words[i + 1])
+            i += 2
+        elif words[i].startswith('-'):
+            return None
+        else:
+            expressions.append(words[i])
+            i += 1
+    return expressions
+
+
+def _unescape(text, delimiter):
+    return re.sub('\\\\([&"\\\\' + re.escape(delimiter) + '])', r'\1', text)
+
+
+def _escape(text, delimiter, field):
+    """Escape text for a double-quoted sed expression inside the backquotes of a render line."""
+    if any(character in text for character in '\\`\r\n'):
+        raise ValueError(f"{field} '{text}' cannot be written to a render line, it contains a backslash, backquote or line break")
+    return re.sub('([&"' + re.escape(delimiter) + '])', r'\\\1', text)
+
+
+def parse_substitution(word):
+    """Parse a "s<d>pattern<d>replacement<d>g" word into (pattern, delimiter, replacement), or None."""
+    for delimiter, pattern in SUBSTITUTION_PATTERNS.items():
+        match = pattern.match(word)
+        if match:
+            return _unescape(match.group('pattern'), delimiter), delimiter, _unescape(match.group('replacement'), delimiter)
+    return None
+
+
+def format_substitution(placeholder, delimiter, replacement):
+    """The sed expression substituting placeholder, with the characters sed or the shell would interpret escaped."""
+    return (f'"s{delimiter}{_escape(placeholder, delimiter, "Placeholder")}'
+            f'{delimiter}{_escape(replacement, delimiter, "Replacement")}{delimiter}g"')
+
+
+def parse_render_line(line):
+    """
+    Parse a template render line from the CD pipeline.
+
+    Both the legacy 'cat file | sed ... | sed ...' chain and the single
+    'sed -e ... -e ... file' form are understood. From the first command or expression
+    that is not a double-quoted "s<d>...<d>...<d>g" on, e.g. '| envsubst' or a
+    single-quoted sed, the command is kept verbatim as the tail of the line.
+
+    Returns:
+        dict: indent, variable, source file, the ordered substitution table
+        ({placeholder: (delimiter, replacement)}, unescaped) and the tail, or None if
+        the line is not a render step.
+    """
+    match = RENDER_LINE_PATTERN.match(line.rstrip('\r\n'))
+    if not match:
+        return None
+
+    segments = split_pipeline(match.group('command').strip())
+    words = WORD_PATTERN.findall(segments[0])
+    if len(words) == 2 and words[0] == 'cat':
+        source, expressions = words[1], []
+    elif len(words) >= 3 and words[0] == 'sed' and not words[-1].startswith(('"', "'", '-')):
+        source, expressions = words[-1], _sed_expressions(words[1:-1])
+        if expressions is None:
+            return None
+    else:
+        return None
+
+    substitutions = {}
+    written = {}
+    tail = []
+    for i, segment in enumerate(segments):
+        if i > 0:
+            segment_words = WORD_PATTERN.findall(segment)
+            expressions = _sed_expressions(segment_words[1:]) if segment_words[:1] == ['sed'] else None
+            if not expressions:
+                tail = segments[i:]
+                break
+
+        parsed = [parse_substitution(expression) for expression in expressions]
+        if i > 0 and None in parsed:
+            tail = segments[i:]
+            break
+        for expression, substitution in zip(expressions, parsed):
+            if substitution is None:
+                break
+            placeholder, delimiter, replacement = substitution
+            # The first sed in a chain wins, later duplicates never matched anything
+            if placeholder not in substitutions:
+                substitutions[placeholder] = (delimiter, replacement)
+                written[placeholder] = ((delimiter, replacement), expression)
+        if None in parsed:
+            # sed applies its expressions in order, so the rest of the first sed can run on its own
+            rest = expressions[parsed.index(None):]
+            tail = ['sed ' + ' '.join(f'-e {expression}' for expression in rest)] + segments[1:]
+            break
+
+    return {
+        'indent': match.group('indent'),
+        'variable': match.group('variable'),
+        'source': source,
+        'substitutions': substitutions,
+        'tail': tail,
+        # Substitutions as parsed, and their expressions as written
+        'written': written,
+    }
+
+
+def format_render_line(render):
+    """
+    Format a parsed render step as a single sed invocation followed by its tail.
+    Substitutions that did not change are written as they were.
+    """
+    written = render.get('written') or {}
+    expressions = ' '.join(
+        '-e ' + (written[placeholder][1] if written.get(placeholder, (None,))[0] == substitution
+                 else format_substitution(placeholder, *substitution))
+        for placeholder, substitution in render['substitutions'].items()
+    )
+    command = f'sed {expressions} {render["source"]}' if expressions else f'cat {render["source"]}'
+    command = ' | '.join([command] + list(render.get('tail') or []))
+    return f'{render["indent"]}{render["variable"]}=`{command}`\n'
+
+
+def format_server_side_apply(indent, variables, field_manager):
+    """One kubectl server-side apply of the manifests in the given shell variables, in order."""
+    manifests = ' '.join(f'"${variable}"' for variable in variables)
+    return f"{indent}printf '%s\\n---\\n' {manifests} | kubectl apply --server-side --field-manager={field_manager} -f -\n"
+
+
+def merge_substitutions(table, substitutions, replace=False):
+    """
+    Merge (placeholder, replacement[, delimiter]) tuples into a substitution table.
+
+    Returns:
+        bool: Whether the table changed.
+    """
+    changed = False
+    for substitution in substitutions:
+        placeholder, replacement = substitution[0], substitution[1]
+        delimiter = substitution[2] if len(substitution) > 2 else '/'
+        if (placeholder not in table or replace) and table.get(placeholder) != (delimiter, replacement):
+            table[placeholder] = (delimiter, replacement)
+            changed = True
+    return changed
+
+
+def add_substitutions(line, substitutions, replace=False):
+    """
+    Add placeholder substitutions to a render line, rendering it as one sed pass.
+
+    Args:
+        line (str): The render line from the pipeline.
+        substitutions (list): (placeholder, replacement) or (placeholder, replacement, delimiter) tuples.
+        replace (bool): Overwrite the replacement of placeholders that are already substituted.
+
+    Returns:
+        str: The updated line, or the line unchanged if it is not a render step or
+        already has the substitutions.
+    """
+    render = parse_render_line(line)
+    if render is None or not merge_substitutions(render['substitutions'], substitutions, replace):
+        return line
+    return format_render_line(render)
+
+
+def remove_substitutions(line, placeholders):
+    """
+    Remove placeholder substitutions from a render line.
+
+    Returns:
+        str: The updated line, or the line unchanged if none of the placeholders is substituted.
+    """
+    render = parse_render_line(line)
+    if render is None or not any(placeholder in render['substitutions'] for placeholder in placeholders):
+        return line
+
+    for placeholder in placeholders:
+        render['substitutions'].pop(placeholder, None)
+
+    return format_render_line(render)
+
+
+def is_render_line(line, variable, source):
+    """Check whether a line renders the given file into the given shell variable."""
+    render = parse_render_line(line)
+    return render is not None and render['variable'] == variable and render['source'] == source
+
+
+class PipelineModel:
+    """
+    azure-pipeline-CD.yaml as lines, plus its render steps found in a single pass.
+
+    Each step records its line number, the stage and deployment job it belongs to and
+    the parsed render line. Runs of consecutive 'echo "$manifest" | kubectl apply -f -'
+    lines are recorded as apply groups. The updaters edit steps through the model,
+    and only the lines of steps whose substitutions change are re-formatted.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.steps = []
+        self.apply_groups = []
+        self.modified = False
+
+        stage = job = None
+        previous_apply = None
+        for i, line in enumerate(self.lines):
+            if '=`' in line:
+                render = parse_render_line(line)
+                if render is not None:
+                    self.steps.append({'line': i, 'stage': stage, 'job': job, 'render': render})
+                continue
+
+            if 'kubectl' in line:
+                match = APPLY_LINE_PATTERN.match(line.rstrip('\r\n'))
+                if match:
+                    if previous_apply != i - 1:
+                        self.apply_groups.append({'lines': [], 'variables': [], 'indent': match.group('indent'), 'stage': stage, 'job': job})
+                    self.apply_groups[-1]['lines'].append(i)
+                    self.apply_groups[-1]['variables'].append(match.group('variable'))
+                    previous_apply = i
+                continue
+
+            match = STAGE_PATTERN.match(line)
+            if match:
+                stage, job = match.group('name'), None
+                continue
+            match = JOB_PATTERN.match(line)
+            if match:
+                job = match.group('name')
+
+    @property
+    def content(self):
+        return ''.join(self.lines)
+
+    def render_steps(self, variable, source):
+        """The steps rendering the given file into the given shell variable."""
+        return [
+            step for step in self.steps
+            if step['render']['variable'] == variable and step['render']['source'] == source
+        ]
+
+    def _update(self, step):
+        self.lines[step['line']] = format_render_line(step['render'])
+        self.modified = True
+
+    def add_substitutions(self, step, substitutions, replace=False):
+        """add_substitutions() for a step of the model. The line is only rewritten when its substitutions change."""
+        if merge_substitutions(step['render']['substitutions'], substitutions, replace):
+            self._update(step)
+
+    def consolidate_applies(self, field_manager):
+        """
+        Replace each apply group by a single server-side apply of its manifests, in their
+        original order. Groups already consolidated no longer match, so this is idempotent.
+
+        Returns:
+            int: The number of groups rewritten.
+        """
+        for group in self.apply_groups:
+            first, *rest = group['lines']
+            line = format_server_side_apply(group['indent'], group['variables'], field_manager)
+            if not self.lines[group['lines'][-1]].endswith('\n'):
+                line = line.rstrip('\n')
+            self.lines[first] = line
+            for i in rest:
+                self.lines[i] = ''
+        rewritten = len(self.apply_groups)
+        self.apply_groups = []
+        if rewritten:
+            self.modified = True
+        return rewritten
+
+    def remove_substitutions(self, step, placeholders):
+        """remove_substitutions() for a step of the model."""
+        substitutions = step['render']['substitutions']
+        if any(placeholder in substitutions for placeholder in placeholders):
+            for placeholder in placeholders:
+                substitutions.pop(placeholder, None)
+            self._update(step)
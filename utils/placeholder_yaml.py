@@ -0,0 +1,49 @@
+from ruamel.yaml import YAML
+from ruamel.yaml.emitter import RoundTripEmitter
+from ruamel.yaml.scanner import RoundTripScanner
+
+PLACEHOLDER_START = '{{'
+
+
+class PlaceholderScanner(RoundTripScanner):
+    """
+    Round-trip scanner that reads '{{token}}' placeholders as plain scalars.
+
+    In block context a value such as {{deployNamespace}} would otherwise start a
+    nested flow mapping. Treating '{{' as the start of a plain scalar loads it as
+    the string '{{deployNamespace}}', so no pre-processing of the text is needed.
+    """
+
+    def fetch_flow_mapping_start(self):
+        if not self.flow_level and self.reader.peek(1) == '{':
+            return self.fetch_plain()
+        return super().fetch_flow_mapping_start()
+
+
+class PlaceholderEmitter(RoundTripEmitter):
+    """
+    Round-trip emitter that writes placeholder strings back unquoted.
+
+    A leading '{' normally forces a quoted style. Placeholders are analysed as if
+    they started with a regular character, so they are emitted plain whenever the
+    rest of the value allows it, exactly as they appeared in the source file.
+    """
+
+    def analyze_scalar(self, scalar):
+        if isinstance(scalar, str) and scalar.startswith(PLACEHOLDER_START):
+            analysis = super().analyze_scalar('_' + scalar[1:])
+            analysis.scalar = scalar
+            return analysis
+        return super().analyze_scalar(scalar)
+
+
+def create_yaml():
+    """Create a round-trip YAML processor that preserves '{{token}}' placeholders."""
+    yaml = YAML()
+    yaml.Scanner = PlaceholderScanner
+    yaml.Emitter = PlaceholderEmitter
+    yaml.preserve_quotes = True
+    yaml.default_flow_style = False
+    yaml.width = float('inf')
+    yaml.indent(mapping=2, sequence=4, offset=2)
+    return yaml
@@ -0,0 +1,331 @@
+import glob
+import logging
+import math
+import os
+
+import yaml
+
+from utils.configmaps_utils import (
+    add_configmap_entries,
+    add_configmap_to_eks_deployment,
+    ensure_config_data_section,
+    read_configmap_file,
+    uncomment_configmap_lines
+)
+from utils.eks_handler import DEFAULT_MAX_REPLICAS, DEFAULT_MIN_REPLICAS, get_microservice_name, load_pipeline_stages
+from utils.file_transaction import FileTransaction, recover_transaction
+from utils.file_utils import write_file
+from utils.jvm_tuning import parse_cpu
+from utils.manifest_session import ManifestSession
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+DEPLOYMENT_FILE_NAME = 'eks-deployment.yaml'
+CONFIGMAP_FILE_NAME = 'eks-config-maps.yaml'
+
+# HikariCP's rule of thumb: connections = cores * 2 + effective spindle count (1 for SSDs)
+CONNECTIONS_PER_CORE = 2
+SPINDLE_COUNT = 1
+MIN_POOL_SIZE = 1
+
+DEFAULT_CONNECTION_TIMEOUT_MS = 30000
+DEFAULT_IDLE_TIMEOUT_MS = 600000
+DEFAULT_MAX_LIFETIME_MS = 1800000
+
+# ConfigMap key naming the database a service connects to
+DATABASE_URL_KEY = 'DB_URL'
+
+
+def load_pool_spec(spec_path):
+    """
+    Load a pool sizing spec, e.g.:
+
+        budget: 300          # max_connections of the database
+        reserved: 10         # kept free for admin and migration connections (optional)
+        stage: prod          # stage table entry for replica ranges (optional, default the largest)
+        services:
+          - repo: ../pricing-upload                 # CPU request and replicas read from the repo
+          - name: reporting                         # a service sharing the database, not managed here
+            cpu: 2
+            max_replicas: 4
+        fleet: [../*]        # repos checked for the same DB_URL (optional)
+
+    Relative repo paths and fleet patterns are resolved against the directory of the spec file.
+    """
+    with open(spec_path, 'r') as spec_file:
+        spec = yaml.safe_load(spec_file) or {}
+
+    budget = spec.get('budget')
+    if not isinstance(budget, int) or budget <= 0:
+        raise ValueError("'budget' must be the positive number of connections the database accepts.")
+    reserved = spec.get('reserved') or 0
+    if not isinstance(reserved, int) or not 0 <= reserved < budget:
+        raise ValueError("'reserved' must be a number of connections below the budget.")
+
+    services = spec.get('services') or []
+    if not services or not all(isinstance(service, dict) and (service.get('repo') or service.get('name')) for service in services):
+        raise ValueError("'services' must list the services sharing the database, each with a repo or a name.")
+
+    stage = spec.get('stage')
+    if stage is not None and stage not in load_pipeline_stages()['stages']:
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    fleet = spec.get('fleet') or []
+    if isinstance(fleet, str):
+        fleet = [fleet]
+    if not all(isinstance(pattern, str) for pattern in fleet):
+        raise ValueError("'fleet' must be a list of repo paths or glob patterns.")
+
+    base_dir = os.path.dirname(os.path.abspath(spec_path))
+    for service in services:
+        if service.get('repo'):
+            service['repo'] = os.path.join(base_dir, service['repo'])
+
+    return {
+        'budget': budget,
+        'reserved': reserved,
+        'stage': stage,
+        'services': services,
+        'fleet': [os.path.join(base_dir, pattern) for pattern in fleet],
+        'connection_timeout_ms': spec.get('connection_timeout_ms', DEFAULT_CONNECTION_TIMEOUT_MS),
+        'idle_timeout_ms': spec.get('idle_timeout_ms', DEFAULT_IDLE_TIMEOUT_MS),
+        'max_lifetime_ms': spec.get('max_lifetime_ms', DEFAULT_MAX_LIFETIME_MS),
+    }
+
+
+def stage_replicas(stage=None):
+    """The (min, max) replicas of a stage of the stage table, or the largest of all stages."""
+    stages = load_pipeline_stages()['stages']
+    selected = [stages[stage]] if stage else list(stages.values()) or [{}]
+    return (max(entry.get('min_replicas', DEFAULT_MIN_REPLICAS) for entry in selected),
+            max(entry.get('max_replicas', DEFAULT_MAX_REPLICAS) for entry in selected))
+
+
+def replica_count(value, service_name, field):
+    """A replica count from the spec or a manifest as an int, e.g. 4 or '4'."""
+    try:
+        count = int(str(value).strip()) if not isinstance(value, (bool, float)) else None
+    except ValueError:
+        count = None
+    if count is None or count <= 0:
+        raise ValueError(f"'{field}' of {service_name} must be a positive integer, not {value!r}")
+    return count
+
+
+def read_service(service, stage=None):
+    """
+    Complete a service entry with what its repo says: the CPU request of the first
+    container, and the replica range of the HorizontalPodAutoscaler (from the stage
+    table) or the fixed replicas of the Deployment. Values in the spec take precedence.
+    """
+    profile = {'name': service.get('name'), 'repo': service.get('repo')}
+    cpu = service.get('cpu')
+    service_name = profile['name'] or profile['repo']
+    min_replicas, max_replicas = (
+        replica_count(service[field], service_name, field) if service.get(field) is not None else None
+        for field in ('min_replicas', 'max_replicas'))
+
+    if service.get('repo'):
+        session = ManifestSession(os.path.join(service['repo'], DEPLOYMENT_FILE_NAME))
+        profile['name'] = profile['name'] or get_microservice_name(session.file_path, documents=session.index)
+        deployment = next(iter(session.read_documents('Deployment')), None) or {}
+        pod_spec = ((deployment.get('spec') or {}).get('template') or {}).get('spec') or {}
+        containers = pod_spec.get('containers') or [{}]
+        if cpu is None:
+            cpu = ((containers[0].get('resources') or {}).get('requests') or {}).get('cpu')
+
+        if session.read_documents('HorizontalPodAutoscaler'):
+            replicas = tuple(
+                replica_count(value, profile['name'], f'stage table {field}')
+                for value, field in zip(stage_replicas(stage), ('min_replicas', 'max_replicas')))
+        else:
+            fixed = (deployment.get('spec') or {}).get('replicas')
+            fixed = replica_count(fixed, profile['name'], 'spec.replicas') if fixed is not None else 1
+            replicas = (fixed, fixed)
+        min_replicas = replicas[0] if min_replicas is None else min_replicas
+        max_replicas = replicas[1] if max_replicas is None else max_replicas
+
+    cores = parse_cpu(cpu) if cpu is not None else None
+    if cores is None:
+        raise ValueError(f"No CPU request for {profile['name']}, set 'cpu' in the spec")
+    max_replicas = max_replicas or 1
+    profile.update({'cpu': cores, 'min_replicas': min(min_replicas or 1, max_replicas), 'max_replicas': max_replicas})
+    return profile
+
+
+def size_pools(services, budget, reserved=0):
+    """
+    Size one pool per service so that every pod of every service at its maximum
+    replicas stays within the database budget.
+
+    Each service starts from cores * 2 + 1 connections per pod, the cores being its
+    CPU request rounded up. When the fleet-wide total exceeds the budget all pools are
+    scaled down by the same factor, so each service keeps its share.
+
+    Returns:
+        dict: 'services' with their 'pool' and 'connections' at max replicas, the
+        'total' and 'available' connections and the 'warnings'.
+    """
+    available = budget - reserved
+    for service in services:
+        service['desired'] = max(1, math.ceil(service['cpu'])) * CONNECTIONS_PER_CORE + SPINDLE_COUNT
+    desired_total = sum(service['desired'] * service['max_replicas'] for service in services)
+
+    warnings = []
+    scale = 1.0
+    if desired_total > available:
+        scale = available / desired_total
+        warnings.append(
+            f"At max replicas the services would open {desired_total} connections, over the "
+            f"{available} available. Pools are scaled down to {scale:.0%} of their size.")
+
+    for service in services:
+        service['pool'] = max(MIN_POOL_SIZE, math.floor(service['desired'] * scale))
+        service['connections'] = service['pool'] * service['max_replicas']
+
+    total = sum(service['connections'] for service in services)
+    if total > available:
+        warnings.append(
+            f"Even with {MIN_POOL_SIZE} connection per pod the services need {total} connections at max replicas, "
+            f"over the {available} available. Lower max_replicas or raise the database's max_connections.")
+
+    for warning in warnings:
+        logger.warning(warning)
+    return {'services': services, 'total': total, 'available': available, 'warnings': warnings, 'fits': total <= available}
+
+
+def pool_settings(pool, connection_timeout_ms=DEFAULT_CONNECTION_TIMEOUT_MS, idle_timeout_ms=DEFAULT_IDLE_TIMEOUT_MS, max_lifetime_ms=DEFAULT_MAX_LIFETIME_MS):
+    """
+    The HikariCP settings of a pool. The pool is fixed-size (minimum idle equals the
+    maximum), as HikariCP recommends, so the budget is what the database actually sees.
+    """
+    return {
+        'MINIMUM_IDLE': str(pool),
+        'MAXIMUM_POOL_SIZE': str(pool),
+        'IDLE_TIMEOUT': str(idle_timeout_ms),
+        'MAX_LIFETIME': str(max_lifetime_ms),
+        'CONNECTION_TIMEOUT': str(connection_timeout_ms),
+    }
+
+
+def read_database_url(repo_dir):
+    """
+    The DB_URL value of the repo's eks-config-maps.yaml, or None when the repo has none
+    or only a {{placeholder}} that the pipeline fills in per stage.
+    """
+    try:
+        lines = read_configmap_file(os.path.join(repo_dir, CONFIGMAP_FILE_NAME))
+    except OSError:
+        return None
+
+    data_section_found = False
+    for line in lines:
+        if line.strip() == 'data:':
+            data_section_found = True
+        elif data_section_found and ':' in line and not line.lstrip().startswith('#'):
+            key, value = line.split(':', 1)
+            value = value.strip().strip('"\'')
+            if key.strip() == DATABASE_URL_KEY and value and '{{' not in value:
+                return value
+    return None
+
+
+def check_shared_database(spec):
+    """
+    Compare the DB_URL of the repos in the spec with each other and with the repos of
+    the spec's fleet, since the budget only holds if the spec lists exactly the services
+    connecting to one database.
+
+    Returns:
+        list: Warnings about repos of the spec on different databases, and fleet repos
+        on the same database that the spec does not list.
+    """
+    listed = {os.path.realpath(service['repo']) for service in spec['services'] if service.get('repo')}
+    groups = {}
+    for repo_dir in sorted(listed):
+        url = read_database_url(repo_dir)
+        if url is not None:
+            groups.setdefault(url, []).append(repo_dir)
+
+    warnings = []
+    if len(groups) > 1:
+        names = '; '.join(', '.join(os.path.basename(repo_dir) for repo_dir in repo_dirs) for repo_dirs in groups.values())
+        warnings.append(
+            f"The repos of the spec use {len(groups)} different {DATABASE_URL_KEY} values ({names}). "
+            f"Size the pools of each database with its own spec and budget.")
+
+    fleet = {os.path.realpath(path) for pattern in spec['fleet'] for path in glob.glob(pattern)
+             if os.path.isfile(os.path.join(path, CONFIGMAP_FILE_NAME))}
+    unlisted = sorted(repo_dir for repo_dir in fleet - listed if read_database_url(repo_dir) in groups)
+    if unlisted:
+        warnings.append(
+            f"{', '.join(os.path.basename(repo_dir) for repo_dir in unlisted)} use the same {DATABASE_URL_KEY} "
+            f"as repos of the spec but are not listed. Their connections are not counted in the budget.")
+
+    for warning in warnings:
+        logger.warning(warning)
+    return warnings
+
+
+def set_configmap_values(lines, settings):
+    """
+    Set data entries of eks-config-maps.yaml lines. Entries that exist are rewritten in
+    place, keeping their position, the others are added by add_configmap_entries.
+    """
+    new_lines = []
+    present = set()
+    data_section_found = False
+    for line in lines:
+        if line.strip() == 'data:':
+            data_section_found = True
+        elif data_section_found and ':' in line and not line.lstrip().startswith('#'):
+            key, value = line.split(':', 1)
+            key = key.strip()
+            if key in settings:
+                present.add(key)
+                if value.strip().strip('"\'') != settings[key]:
+                    indent = line[:len(line) - len(line.lstrip())]
+                    line = f'{indent}{key}: "{settings[key]}"' + ('\n' if line.endswith('\n') else '')
+        new_lines.append(line)
+
+    missing = {key: value for key, value in settings.items() if key not in present}
+    return add_configmap_entries(new_lines, missing) if missing else new_lines
+
+
+@timed('pool.write')
+def write_pool_settings(repo_dir, settings):
+    """
+    Write pool settings into the repo's eks-config-maps.yaml through add_configmap_entries,
+    and reference them from the Deployment env like any other ConfigMap key. Keys with
+    another value are updated in place. Both files are replaced together.
+
+    Returns:
+        list: The files that were changed.
+    """
+    file_path = os.path.join(repo_dir, DEPLOYMENT_FILE_NAME)
+    configmap_file_path = os.path.join(repo_dir, CONFIGMAP_FILE_NAME)
+    if not os.path.exists(configmap_file_path):
+        raise FileNotFoundError(f"{CONFIGMAP_FILE_NAME} file not found in {repo_dir}.")
+
+    recover_transaction(repo_dir)
+    transaction = FileTransaction(repo_dir)
+    session = ManifestSession(file_path)
+    microservice_name = get_microservice_name(file_path, documents=session.index)
+
+    add_configmap_to_eks_deployment(file_path, microservice_name, list(settings), base_dir=repo_dir, session=session)
+    session.commit(transaction)
+
+    uncommented_lines, full_file_commented = uncomment_configmap_lines(read_configmap_file(configmap_file_path))
+    lines = ensure_config_data_section(uncommented_lines, microservice_name, full_file_commented)
+    write_file(configmap_file_path, ''.join(set_configmap_values(lines, settings)), transaction)
+
+    return transaction.commit()
+
+
+def plan_pools(spec):
+    """Read every service of a loaded spec, size their pools and check that they share one database."""
+    services = [read_service(service, spec['stage']) for service in spec['services']]
+    plan = size_pools(services, spec['budget'], spec['reserved'])
+    plan['warnings'].extend(check_shared_database(spec))
+    return plan
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import re
+
+from utils.eks_handler import get_step_stage, load_pipeline_stages
+from utils.file_utils import write_if_changed
+from utils.pipeline_utils import PipelineModel
+from utils.run_cache import INPUT_FILES
+from utils.timing import span, timed
+from utils.yaml_backend import safe_load_all
+
+logger = logging.getLogger(__name__)
+
+# Bump when a change to the renderer alters the artifacts for the same input
+RENDER_VERSION = 1
+
+RENDER_MANIFEST_NAME = 'render-manifest.json'
+PIPELINE_FILE_NAME = 'azure-pipeline-CD.yaml'
+
+# $(AZURE_VARIABLE) macros and $shellVariable / ${shellVariable} references in sed replacements
+VARIABLE_PATTERN = re.compile(r'\$\((?P<macro>[\w.-]+)\)|\$\{(?P<braced>\w+)\}|\$(?P<shell>[A-Za-z_]\w*)')
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*[\w.-]+\s*\}\}')
+
+
+def collect_environments(pipeline):
+    """
+    Group the render steps of a pipeline by the environment they deploy.
+
+    An environment is a pipeline stage, or stage-job when one stage has several
+    deployment jobs that render manifests.
+    """
+    jobs_per_stage = {}
+    for step in pipeline.steps:
+        jobs_per_stage.setdefault(step['stage'], set()).add(step['job'])
+
+    environments = {}
+    for step in pipeline.steps:
+        name = step['stage'] or 'default'
+        if len(jobs_per_stage[step['stage']]) > 1:
+            name = f"{name}-{step['job']}"
+        environments.setdefault(name, []).append(step)
+    return environments
+
+
+def resolve_variables(text, variables, unresolved):
+    """Replace pipeline variable references with their values. Unknown ones are kept and collected."""
+    def replace(match):
+        name = match.group('macro') or match.group('braced') or match.group('shell')
+        if name in variables:
+            return variables[name]
+        unresolved.add(name)
+        return match.group(0)
+
+    return VARIABLE_PATTERN.sub(replace, text)
+
+
+def render_step(source_text, render, variables, unresolved):
+    """
+    Apply the sed substitutions of a render step to its source file, as the pipeline
+    would. Placeholders are plain text, so they are replaced literally.
+    """
+    for placeholder, (_, replacement) in render['substitutions'].items():
+        source_text = source_text.replace(placeholder, resolve_variables(replacement, variables, unresolved))
+    return source_text
+
+
+def check_rendered(text):
+    """Return the problems of a rendered manifest: placeholders no stage substitutes, or invalid YAML."""
+    problems = [f"unrendered placeholder {placeholder}" for placeholder in sorted(set(PLACEHOLDER_PATTERN.findall(text)))]
+    try:
+        safe_load_all(text)
+    except Exception as e:
+        problems.append(f"invalid YAML: {' '.join(str(e).split())}")
+    return problems
+
+
+def input_digest(repo_dir, variables):
+    """Hash of everything the artifacts depend on: the repo files, the stage table and the variables."""
+    digest = hashlib.sha256()
+    digest.update(f'{RENDER_VERSION}\0'.encode('utf-8'))
+    for file_name in INPUT_FILES:
+        digest.update(file_name.encode('utf-8') + b'\0')
+        try:
+            with open(os.path.join(repo_dir, file_name), 'rb') as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        except FileNotFoundError:
+            digest.update(b'missing')
+    digest.update(json.dumps(load_pipeline_stages()['stages'], sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(variables, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _artifacts_intact(output_dir, manifest):
+    for environment in manifest['environments'].values():
+        for file_name, file_digest in environment['files'].items():
+            try:
+                with open(os.path.join(output_dir, environment['directory'], file_name), 'rb') as file:
+                    if hashlib.sha256(file.read()).hexdigest() != file_digest:
+                        return False
+            except FileNotFoundError:
+                return False
+    return True
+
+
+def load_render_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, RENDER_MANIFEST_NAME), 'r') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+@timed('prerender')
+def prerender_repo(repo_dir, output_dir, variables=None, force=False):
+    """
+    Render the manifests of every pipeline environment into output_dir/<environment>/.
+
+    The pipeline is modelled once and every source file is read once, whatever the
+    number of environments. Nothing is written when any environment fails to render.
+    Artifacts whose inputs are unchanged since the last render are reused.
+
+    Returns:
+        dict: 'cached', the render manifest ('digest', 'environments') and 'errors',
+        a list of problems by environment and file.
+    """
+    variables = dict(variables or {})
+    digest = input_digest(repo_dir, variables)
+
+    previous = load_render_manifest(output_dir)
+    if not force and previous and previous.get('digest') == digest and _artifacts_intact(output_dir, previous):
+        logger.info(f"Rendered manifests in {output_dir} are up to date")
+        return {'cached': True, 'manifest': previous, 'errors': []}
+
+    with open(os.path.join(repo_dir, PIPELINE_FILE_NAME), 'r') as file:
+        pipeline = PipelineModel(file)
+
+    sources = {}
+    artifacts = {}
+    environments = {}
+    errors = []
+    for name, steps in collect_environments(pipeline).items():
+        stage = get_step_stage(steps[0]) or {}
+        unresolved = set()
+        files = {}
+        for step in steps:
+            source = step['render']['source']
+            if source not in sources:
+                with open(os.path.join(repo_dir, source), 'r') as file:
+                    sources[source] = file.read()
+
+            with span('prerender.step'):
+                rendered = render_step(sources[source], step['render'], variables, unresolved)
+            errors.extend(f"{name}/{source}: {problem}" for problem in check_rendered(rendered))
+            artifacts[os.path.join(name, source)] = rendered
+            files[source] = hashlib.sha256(rendered.encode('utf-8')).hexdigest()
+
+        environments[name] = {
+            'directory': name,
+            'namespace': stage.get('namespace'),
+            'env': stage.get('env'),
+            'files': files,
+            'deploy_time_variables': sorted(unresolved),
+        }
+
+    manifest = {'version': RENDER_VERSION, 'digest': digest, 'environments': environments}
+    if errors:
+        return {'cached': False, 'manifest': manifest, 'errors': errors}
+
+    for relative_path, rendered in artifacts.items():
+        os.makedirs(os.path.join(output_dir, os.path.dirname(relative_path)), exist_ok=True)
+        write_if_changed(os.path.join(output_dir, relative_path), rendered.encode('utf-8'))
+    # The manifest goes last, a partial render never looks up to date
+    write_if_changed(os.path.join(output_dir, RENDER_MANIFEST_NAME), json.dumps(manifest, indent=2) + '\n')
+    return {'cached': False, 'manifest': manifest, 'errors': []}
@@ -0,0 +1,340 @@
+import logging
+import os
+
+import yaml
+
+from utils.configmaps_utils import (
+    add_configmap_entries,
+    ensure_config_data_section,
+    get_configmap_name,
+    read_configmap_file,
+    remove_configmap_entries,
+    to_camel_case,
+    uncomment_configmap_lines
+)
+from utils.eks_handler import (
+    INGRESS_PLACEHOLDERS,
+    INGRESS_PROFILE_PLACEHOLDER_PREFIX,
+    SERVICE_ACCOUNT_SUBSTITUTION,
+    add_configuration,
+    get_ingress_substitutions,
+    get_microservice_name
+)
+from utils.env_editor import ALL_CONTAINERS, env_names_present, remove_env_vars, select_containers, upsert_env_vars
+from utils.file_transaction import FileTransaction, recover_transaction
+from utils.fleet_handler import normalize_keys
+from utils.manifest_index import find_documents
+from utils.manifest_session import ManifestSession
+from utils.pipeline_utils import PipelineModel
+from utils.secretmap_utils import (
+    add_secretmap_entries,
+    ensure_secret_data_section,
+    get_secretmap_name,
+    read_secretmap_file,
+    remove_secretmap_entries,
+    uncomment_secretmap_lines
+)
+from utils.timing import span, timed
+
+logger = logging.getLogger(__name__)
+
+DESIRED_STATE_FILE_NAME = 'eks-desired-state.yaml'
+DEPLOYMENT_FILE_NAME = 'eks-deployment.yaml'
+PIPELINE_FILE_NAME = 'azure-pipeline-CD.yaml'
+
+# How the ConfigMap and the Secret of a service are wired into the repo files
+DATA_KINDS = {
+    'configmap': {
+        'label': 'ConfigMap',
+        'file_name': 'eks-config-maps.yaml',
+        'ref': 'configMapKeyRef',
+        'before_ref': 'secretKeyRef',
+        'variable': 'configMapTemplate',
+        'read': read_configmap_file,
+        'uncomment': uncomment_configmap_lines,
+        'ensure': ensure_config_data_section,
+        'add': add_configmap_entries,
+        'remove': remove_configmap_entries,
+    },
+    'secret': {
+        'label': 'Secret',
+        'file_name': 'eks-config-secrets.yaml',
+        'ref': 'secretKeyRef',
+        'before_ref': None,
+        'variable': 'secretMapTemplate',
+        'read': read_secretmap_file,
+        'uncomment': uncomment_secretmap_lines,
+        'ensure': ensure_secret_data_section,
+        'add': add_secretmap_entries,
+        'remove': remove_secretmap_entries,
+    },
+}
+
+
+def load_desired_state(state_path):
+    """
+    Load the desired state of a service, e.g.:
+
+        service_account: true
+        ingress_path: /your-microservice/api     # omit for no Ingress
+        configmap_keys: [DB_URL, DB_NAME]
+        secret_keys: [DB_PASSWORD]
+        containers: all                          # optional, as in the fleet spec
+
+    The file is the complete description: ConfigMap and Secret keys that are not
+    listed are removed, as are a ServiceAccount or Ingress that are not wanted.
+    """
+    with open(state_path, 'r') as state_file:
+        state = yaml.safe_load(state_file) or {}
+
+    return normalize_desired_state(state)
+
+
+def normalize_desired_state(state):
+    """Validate a desired state mapping and convert it to the form reconcile_repo takes."""
+    if not isinstance(state, dict):
+        raise ValueError("Desired state must be a mapping.")
+
+    containers = state.get('containers')
+    if containers is not None and containers != ALL_CONTAINERS and not (
+            isinstance(containers, list) and all(isinstance(name, str) for name in containers)):
+        raise ValueError("'containers' must be 'all' or a list of container names.")
+
+    return {
+        'service_account': bool(state.get('service_account', False)),
+        'ingress_path': state.get('ingress_path') or None,
+        'configmap': normalize_keys(state.get('configmap_keys')) or {},
+        'secret': normalize_keys(state.get('secret_keys')) or {},
+        'target_containers': containers,
+    }
+
+
+def _data_keys(lines):
+    """Keys of the data section, the way add_configmap_entries finds them."""
+    keys = set()
+    data_section_found = False
+    for line in lines:
+        if line.strip() == 'data:':
+            data_section_found = True
+        elif data_section_found and ':' in line and not line.lstrip().startswith('#'):
+            keys.add(line.split(':')[0].strip())
+    return keys
+
+
+def _managed_placeholders(render):
+    """Placeholders the configurator substitutes with a pipeline variable, {{dbUrl}} -> $(DB_URL)."""
+    managed = {}
+    for pattern, (_, replacement) in render['substitutions'].items():
+        if replacement.startswith('$(') and replacement.endswith(')'):
+            key = replacement[2:-1]
+            if key and pattern == '{{' + to_camel_case(key) + '}}':
+                managed[key] = pattern
+    return managed
+
+
+def _reconcile_data_file(repo_dir, kind, microservice_name, desired_keys, changes):
+    """Return the new lines of the ConfigMap/Secret file and the keys removed from it."""
+    spec = DATA_KINDS[kind]
+    file_path = os.path.join(repo_dir, spec['file_name'])
+    if not os.path.exists(file_path):
+        if desired_keys:
+            raise FileNotFoundError(f"{spec['file_name']} not found in {repo_dir}")
+        return None, set()
+
+    lines = spec['read'](file_path)
+    uncommented_lines, full_file_commented = spec['uncomment'](lines)
+    current_keys = _data_keys(uncommented_lines) if not full_file_commented else set()
+
+    to_add = {key: value for key, value in desired_keys.items() if key.upper() not in current_keys}
+    to_remove = current_keys - {key.upper() for key in desired_keys}
+    if not to_add and not to_remove:
+        return None, set()
+
+    uncommented_lines = spec['ensure'](uncommented_lines, microservice_name, full_file_commented)
+    updated_lines = spec['remove'](spec['add'](uncommented_lines, to_add), to_remove)
+    changes.extend(f"+ {spec['label']} key {key}" for key in to_add)
+    changes.extend(f"- {spec['label']} key {key}" for key in sorted(to_remove))
+    return updated_lines, to_remove
+
+
+def _reconcile_env(session, repo_dir, kind, microservice_name, desired_keys, removed_keys, target_containers, changes):
+    """Add missing env entries and drop removed ones. Deployments are only parsed when needed."""
+    spec = DATA_KINDS[kind]
+    names = [key.upper() for key in desired_keys]
+    needs_add = bool(names) and not env_names_present(session.index, names, target_containers)
+    needs_remove = bool(removed_keys) and any(
+        env['name'] in removed_keys
+        for document in find_documents(session.index, kind='Deployment')
+        for container in document['containers']
+        for env in container['env']
+    )
+    if not needs_add and not needs_remove:
+        return
+
+    file_path = os.path.join(repo_dir, spec['file_name'])
+    if kind == 'configmap':
+        try:
+            ref_name = get_configmap_name(file_path)
+        except (ValueError, FileNotFoundError):
+            ref_name = microservice_name
+    else:
+        ref_name = (get_secretmap_name(file_path) if os.path.exists(file_path) else None) or microservice_name
+
+    for deployment in session.deployments():
+        if needs_add:
+            for container in select_containers(deployment, target_containers):
+                entries = [
+                    {'name': name, 'valueFrom': {spec['ref']: {'name': ref_name, 'key': name}}}
+                    for name in names
+                ]
+                inserted, _ = upsert_env_vars(container, entries, after_ref=spec['ref'], before_ref=spec['before_ref'])
+                if inserted:
+                    changes.append(f"+ {inserted} {spec['label']} env entries in container {container.get('name')}")
+        if needs_remove:
+            # Removed keys go from every container, whichever the entries were added to
+            for container in select_containers(deployment, ALL_CONTAINERS):
+                removed = remove_env_vars(container, removed_keys, spec['ref'], ref_name=ref_name)
+                if removed:
+                    changes.append(f"- {removed} {spec['label']} env entries in container {container.get('name')}")
+
+
+def _reconcile_templates(session, repo_dir, microservice_name, desired, changes):
+    """Append or remove the ServiceAccount and Ingress documents, and update the Ingress path."""
+    file_path = os.path.join(repo_dir, DEPLOYMENT_FILE_NAME)
+    service_account_name = f'{microservice_name}-serviceaccount'
+    ingress_name = f'{microservice_name}-ingress'
+
+    has_service_account = bool(find_documents(session.index, kind='ServiceAccount', name=service_account_name))
+    if desired['service_account'] and not has_service_account:
+        add_configuration(file_path, microservice_name, template_path='templates/service-account.yaml', base_dir=repo_dir, session=session)
+        changes.append(f"+ ServiceAccount {service_account_name}")
+    elif not desired['service_account'] and has_service_account:
+        session.remove_documents('ServiceAccount', service_account_name)
+        changes.append(f"- ServiceAccount {service_account_name}")
+
+    ingress_path = desired['ingress_path']
+    if not find_documents(session.index, kind='Ingress', name=ingress_name):
+        if ingress_path:
+            add_configuration(file_path, microservice_name, template_path='templates/ingress.yaml', ingress_path=ingress_path, base_dir=repo_dir, session=session)
+            changes.append(f"+ Ingress {ingress_name} ({ingress_path})")
+        return
+
+    if not ingress_path:
+        session.remove_documents('Ingress', ingress_name)
+        changes.append(f"- Ingress {ingress_name}")
+        return
+
+    # Read the current path without parsing the Ingress for editing, it is usually unchanged
+    wanted = '{{envIdentifier}}' + ingress_path
+    current_paths = [
+        path['path']
+        for ingress in session.read_documents('Ingress', ingress_name)
+        for rule in (ingress.get('spec') or {}).get('rules') or []
+        for path in ((rule.get('http') or {}).get('paths') or [])
+        if str(path.get('path', '')).startswith('{{envIdentifier}}')
+    ]
+    if all(path == wanted for path in current_paths):
+        return
+
+    for ingress in session.edit_documents('Ingress', ingress_name):
+        for rule in ingress['spec'].get('rules') or []:
+            for path in (rule.get('http') or {}).get('paths') or []:
+                if str(path.get('path', '')).startswith('{{envIdentifier}}'):
+                    path['path'] = wanted
+    changes.append(f"~ Ingress {ingress_name} path {', '.join(sorted(set(current_paths)))} -> {wanted}")
+
+
+def _reconcile_pipeline(repo_dir, desired, changes):
+    """Return the new pipeline lines, or None when every render step is already in sync."""
+    file_path = os.path.join(repo_dir, PIPELINE_FILE_NAME)
+    if not os.path.exists(file_path):
+        return None
+
+    with open(file_path, 'r') as file:
+        pipeline = PipelineModel(file)
+
+    for step in pipeline.steps:
+        render = step['render']
+        present = render['substitutions']
+        add, remove = [], []
+
+        if render['variable'] == 'template' and render['source'] == DEPLOYMENT_FILE_NAME:
+            if desired['service_account']:
+                add.append(SERVICE_ACCOUNT_SUBSTITUTION)
+            else:
+                remove.append(SERVICE_ACCOUNT_SUBSTITUTION[0])
+            ingress_substitutions = get_ingress_substitutions(step)
+            if desired['ingress_path'] and ingress_substitutions:
+                add.extend(ingress_substitutions)
+            elif not desired['ingress_path']:
+                remove.extend(INGRESS_PLACEHOLDERS)
+                # The stage values of the Ingress profile go with the Ingress
+                remove.extend(placeholder for placeholder in present if placeholder.startswith(INGRESS_PROFILE_PLACEHOLDER_PREFIX))
+        else:
+            for kind, spec in DATA_KINDS.items():
+                if render['variable'] == spec['variable'] and render['source'] == spec['file_name']:
+                    wanted = {key.upper() for key in desired[kind]}
+                    add.extend(('{{' + to_camel_case(key) + '}}', '$(' + key.upper() + ')') for key in desired[kind])
+                    remove.extend(pattern for key, pattern in _managed_placeholders(render).items() if key not in wanted)
+
+        add = [substitution for substitution in add if substitution[0] not in present]
+        remove = [placeholder for placeholder in remove if placeholder in present]
+        if add or remove:
+            pipeline.add_substitutions(step, add)
+            pipeline.remove_substitutions(step, remove)
+
+    if pipeline.modified:
+        changes.append(f"~ {PIPELINE_FILE_NAME} render steps")
+    return pipeline.lines if pipeline.modified else None
+
+
+@timed('reconcile')
+def reconcile_repo(repo_dir, desired, dry_run=False):
+    """
+    Bring a repo in line with a desired state with the smallest set of edits.
+
+    The delta is worked out from the manifest index, the ConfigMap/Secret data keys
+    and the pipeline render lines first. Documents are only parsed, and files only
+    written, when they actually differ from the desired state.
+
+    Returns:
+        list: Human-readable descriptions of the changes, empty when already in sync.
+    """
+    file_path = os.path.join(repo_dir, DEPLOYMENT_FILE_NAME)
+    changes = []
+    recover_transaction(repo_dir)
+
+    with span('session.load'):
+        session = ManifestSession(file_path)
+
+    microservice_name = get_microservice_name(file_path, documents=session.index)
+    if not microservice_name:
+        raise ValueError("Microservice name could not be extracted")
+
+    _reconcile_templates(session, repo_dir, microservice_name, desired, changes)
+
+    data_files = {}
+    for kind in DATA_KINDS:
+        updated_lines, removed_keys = _reconcile_data_file(repo_dir, kind, microservice_name, desired[kind], changes)
+        data_files[kind] = updated_lines
+        _reconcile_env(session, repo_dir, kind, microservice_name, desired[kind], removed_keys, desired['target_containers'], changes)
+
+    pipeline_content = _reconcile_pipeline(repo_dir, desired, changes)
+
+    if dry_run:
+        return changes
+
+    transaction = FileTransaction(repo_dir)
+    with span('session.commit'):
+        session.commit(transaction)
+    for kind, updated_lines in data_files.items():
+        if updated_lines is not None:
+            transaction.write(os.path.join(repo_dir, DATA_KINDS[kind]['file_name']), ''.join(updated_lines))
+    if pipeline_content is not None:
+        transaction.write(os.path.join(repo_dir, PIPELINE_FILE_NAME), ''.join(pipeline_content))
+    with span('files.commit'):
+        transaction.commit()
+
+    for change in changes:
+        logger.info(f"{repo_dir}: {change}")
+    return changes
@@ -0,0 +1,241 @@
+import array
+import csv
+import logging
+import math
+import os
+import warnings
+
+from utils.env_editor import select_containers
+from utils.manifest_session import ManifestSession
+from utils.timing import span, timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_PERCENTILE = 90
+DEFAULT_LIMIT_PERCENTILE = 99
+DEFAULT_HEADROOM = 1.2
+
+MIN_CPU_MILLICORES = 10
+MIN_MEMORY_MI = 16
+
+# Samples without a container column apply to the containers selected in the manifest
+ANY_CONTAINER = None
+
+
+def _import_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def _group_columns(numpy, containers, cpu, memory):
+    """Split whole cpu and memory columns by the container column (None for no column)."""
+    if containers is None:
+        return {ANY_CONTAINER: (cpu, memory)}
+    names, groups = numpy.unique(containers, return_inverse=True)
+    return {str(name): (cpu[groups == index], memory[groups == index]) for index, name in enumerate(names)}
+
+
+def read_csv_samples(file_path):
+    """
+    Read usage samples from a CSV file with 'cpu' (cores) and 'memory' (bytes) columns
+    and an optional 'container' column. The columns are loaded whole with NumPy when it
+    is installed, otherwise row by row.
+
+    Returns:
+        dict: container name (or ANY_CONTAINER) -> (cpu, memory) arrays of doubles.
+    """
+    with open(file_path, 'r', newline='') as samples_file:
+        header = [column.strip().lower() for column in next(csv.reader(samples_file), [])]
+    missing = {'cpu', 'memory'} - set(header)
+    if missing:
+        raise ValueError(f"{file_path} has no {' or '.join(sorted(missing))} column")
+    cpu_column, memory_column = header.index('cpu'), header.index('memory')
+    container_column = header.index('container') if 'container' in header else None
+
+    numpy = _import_numpy()
+    if numpy is None:
+        return _read_csv_rows(file_path, cpu_column, memory_column, container_column)
+
+    columns = [cpu_column, memory_column] + ([container_column] if container_column is not None else [])
+    try:
+        with warnings.catch_warnings():
+            # An empty file is reported through the empty result, not as a warning
+            warnings.simplefilter('ignore', UserWarning)
+            data = numpy.loadtxt(file_path, delimiter=',', skiprows=1, usecols=columns, dtype=str, quotechar='"', ndmin=2)
+        cpu = numpy.char.strip(data[:, 0]).astype(numpy.float64)
+        memory = numpy.char.strip(data[:, 1]).astype(numpy.float64)
+    except ValueError as e:
+        raise ValueError(f"{file_path} has a row without a numeric cpu and memory value: {e}")
+    if numpy.isnan(cpu).any() or numpy.isnan(memory).any():
+        raise ValueError(f"{file_path} has a cpu or memory value that is not a number")
+    return _group_columns(numpy, data[:, 2] if container_column is not None else None, cpu, memory)
+
+
+def _read_csv_rows(file_path, cpu_column, memory_column, container_column):
+    samples = {}
+    with open(file_path, 'r', newline='') as samples_file:
+        reader = csv.reader(samples_file)
+        next(reader, None)
+        for line_number, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                container = row[container_column] if container_column is not None else ANY_CONTAINER
+                cpu_value, memory_value = float(row[cpu_column]), float(row[memory_column])
+            except (IndexError, ValueError):
+                raise ValueError(f"Line {line_number} of {file_path} has no numeric cpu and memory value")
+            if math.isnan(cpu_value) or math.isnan(memory_value):
+                raise ValueError(f"Line {line_number} of {file_path} has a cpu or memory value that is not a number")
+            cpu, memory = samples.setdefault(container, (array.array('d'), array.array('d')))
+            cpu.append(cpu_value)
+            memory.append(memory_value)
+    return samples
+
+
+def read_parquet_samples(file_path):
+    """
+    read_csv_samples() for Parquet files. Needs pyarrow. Rows with a null cpu or memory
+    value are dropped, and the columns are converted whole.
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute as compute
+        import pyarrow.parquet as parquet
+    except ImportError:
+        raise ValueError("Reading Parquet files needs pyarrow (pip install pyarrow)")
+
+    try:
+        table = parquet.read_table(file_path)
+        columns = {name.lower(): name for name in table.column_names}
+        missing = {'cpu', 'memory'} - set(columns)
+        if missing:
+            raise ValueError(f"{file_path} has no {' or '.join(sorted(missing))} column")
+
+        valid = compute.and_(compute.is_valid(table.column(columns['cpu'])), compute.is_valid(table.column(columns['memory'])))
+        if 'container' in columns:
+            valid = compute.and_(valid, compute.is_valid(table.column(columns['container'])))
+        kept = table.filter(valid)
+        if kept.num_rows < table.num_rows:
+            logger.warning(f"Dropped {table.num_rows - kept.num_rows} rows of {file_path} with null values")
+
+        cpu = compute.cast(kept.column(columns['cpu']), pyarrow.float64()).to_numpy()
+        memory = compute.cast(kept.column(columns['memory']), pyarrow.float64()).to_numpy()
+        containers = None
+        if 'container' in columns:
+            containers = compute.cast(kept.column(columns['container']), pyarrow.string()).to_numpy(zero_copy_only=False).astype(str)
+    except pyarrow.ArrowException as e:
+        raise ValueError(f"{file_path} could not be read as usage samples: {e}")
+
+    return _group_columns(_import_numpy(), containers, cpu, memory)
+
+
+def read_samples(file_path):
+    with span('resources.read'):
+        if os.path.splitext(file_path)[1].lower() in ('.parquet', '.pq'):
+            return read_parquet_samples(file_path)
+        return read_csv_samples(file_path)
+
+
+def percentiles(values, points):
+    """
+    Percentiles of values, rounded up to the next sample. Vectorized with NumPy when it
+    is installed, otherwise computed from one sort.
+    """
+    numpy = _import_numpy()
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float64)
+        return [float(value) for value in numpy.percentile(data, points, method='higher')]
+
+    ordered = sorted(values)
+    return [ordered[math.ceil((len(ordered) - 1) * point / 100)] for point in points]
+
+
+def format_cpu(cores):
+    return f"{max(MIN_CPU_MILLICORES, math.ceil(cores * 1000))}m"
+
+
+def format_memory(size):
+    return f"{max(MIN_MEMORY_MI, math.ceil(size / (1024 * 1024)))}Mi"
+
+
+def recommend(cpu, memory, request_percentile=DEFAULT_REQUEST_PERCENTILE, limit_percentile=DEFAULT_LIMIT_PERCENTILE, headroom=DEFAULT_HEADROOM):
+    """
+    Size requests at request_percentile of the usage and limits at limit_percentile
+    plus headroom, so a container is throttled or OOM killed only beyond its observed peaks.
+
+    Returns:
+        dict: The resources block, plus the observed usage under 'observed'.
+    """
+    cpu_request, cpu_limit, cpu_max = percentiles(cpu, [request_percentile, limit_percentile, 100])
+    memory_request, memory_limit, memory_max = percentiles(memory, [request_percentile, limit_percentile, 100])
+    return {
+        'requests': {'memory': format_memory(memory_request), 'cpu': format_cpu(cpu_request)},
+        'limits': {
+            'memory': format_memory(max(memory_limit * headroom, memory_request)),
+            'cpu': format_cpu(max(cpu_limit * headroom, cpu_request)),
+        },
+        'observed': {'samples': len(cpu), 'cpu_max': format_cpu(cpu_max), 'memory_max': format_memory(memory_max)},
+    }
+
+
+def _set_quantity(mapping, key, value):
+    # Keep the quoting style of the value being replaced
+    existing = mapping.get(key)
+    mapping[key] = type(existing)(value) if isinstance(existing, str) else value
+
+
+def apply_resources(container, resources):
+    """Set the requests and limits of a container, editing an existing resources block in place."""
+    block = container.get('resources')
+    if block is None:
+        block = container['resources'] = {}
+    for section in ('requests', 'limits'):
+        if block.get(section) is None:
+            block[section] = {}
+        for key, value in resources[section].items():
+            _set_quantity(block[section], key, value)
+
+
+@timed('resources.advise')
+def advise_resources(file_path, samples, target_containers=None, dry_run=False, **policy):
+    """
+    Recommend requests and limits from usage samples and write them into the Deployments
+    of eks-deployment.yaml, through the same round-trip session as the env editors.
+
+    Samples with a container name go to the containers of that name. Samples without
+    one go to the containers selected by target_containers (the first one by default).
+
+    Returns:
+        dict: container name -> recommendation, for every container that was sized.
+    """
+    recommendations = {}
+    with span('resources.percentiles'):
+        for container, (cpu, memory) in samples.items():
+            if len(cpu):
+                recommendations[container] = recommend(cpu, memory, **policy)
+
+    session = ManifestSession(file_path)
+    sized = {}
+    for deployment in session.deployments():
+        if ANY_CONTAINER in recommendations:
+            targets = [(container, recommendations[ANY_CONTAINER]) for container in select_containers(deployment, target_containers)]
+        else:
+            targets = [
+                (container, recommendations[container.get('name')])
+                for container in select_containers(deployment, 'all')
+                if container.get('name') in recommendations
+            ]
+        for container, recommendation in targets:
+            apply_resources(container, recommendation)
+            sized[container.get('name')] = recommendation
+
+    unmatched = set(recommendations) - set(sized) - {ANY_CONTAINER}
+    if unmatched:
+        logger.warning(f"No container named {', '.join(sorted(unmatched))} in {file_path}")
+
+    if not dry_run:
+        session.commit()
+    return sized
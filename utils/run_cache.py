@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+
+from utils.eks_handler import load_ingress_profiles, load_pipeline_stages, load_template
+from utils.manifest_index import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when a change to the tool or its templates alters the output for the same input
+RUN_CACHE_VERSION = 2
+
+INPUT_FILES = ('eks-deployment.yaml', 'eks-config-maps.yaml', 'eks-config-secrets.yaml', 'azure-pipeline-CD.yaml')
+
+# Templates whose content ends up in the repo files
+TEMPLATE_FILES = ('templates/service-account.yaml', 'templates/ingress.yaml', 'templates/hpa.yaml', 'templates/pdb.yaml')
+
+
+def selection_digest(selection):
+    """Hash of the requested options, independent of key order."""
+    encoded = json.dumps(selection, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def configuration_digest():
+    """Hash of what a run reads besides the repo: the templates, the stage table and the Ingress profiles."""
+    digest = hashlib.sha256()
+    for template_path in TEMPLATE_FILES:
+        digest.update(template_path.encode('utf-8') + b'\0')
+        digest.update((load_template(template_path) or '').encode('utf-8'))
+    digest.update(json.dumps(load_pipeline_stages()['stages'], sort_keys=True, default=str).encode('utf-8'))
+    digest.update(json.dumps(load_ingress_profiles(), sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def repo_digest(repo_dir):
+    """Hash of the content of the files a run reads and writes."""
+    digest = hashlib.sha256()
+    for file_name in INPUT_FILES:
+        digest.update(file_name.encode('utf-8') + b'\0')
+        try:
+            with open(os.path.join(repo_dir, file_name), 'rb') as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        except FileNotFoundError:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+
+def _cache_file_path(repo_dir):
+    digest = hashlib.sha1(os.path.abspath(repo_dir).encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), f'run-{digest}.json')
+
+
+def is_up_to_date(repo_dir, selection):
+    """
+    True when the repo files are exactly what the last run with this selection, templates,
+    stage table and Ingress profiles left behind, so running it again would add nothing.
+    """
+    try:
+        with open(_cache_file_path(repo_dir), 'r') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return False
+
+    return (cached.get('version') == RUN_CACHE_VERSION
+            and cached.get('repo') == os.path.abspath(repo_dir)
+            and cached.get('selection') == selection_digest(selection)
+            and cached.get('configuration') == configuration_digest()
+            and cached.get('files') == repo_digest(repo_dir))
+
+
+def record_run(repo_dir, selection):
+    """Remember the state a successful run left the repo in."""
+    cache_file_path = _cache_file_path(repo_dir)
+    try:
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        temp_path = f'{cache_file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as cache_file:
+            json.dump({
+                'version': RUN_CACHE_VERSION,
+                'repo': os.path.abspath(repo_dir),
+                'selection': selection_digest(selection),
+                'configuration': configuration_digest(),
+                'files': repo_digest(repo_dir),
+            }, cache_file)
+        os.replace(temp_path, cache_file_path)
+    except OSError as e:
+        # The cache is an optimisation only
+        logger.debug(f"Could not write run cache for {repo_dir}: {e}")
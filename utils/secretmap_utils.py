@@ -1,54 +1,42 @@
 import re
 import logging
 import os
-from ruamel.yaml import YAML
 
-yaml = YAML()
-yaml.preserve_quotes = True
-yaml.default_flow_style = False
-yaml.width = float('inf')
-yaml.indent(mapping=2, sequence=4, offset=2)
+from utils.env_editor import env_names_present, select_containers, upsert_env_vars
+from utils.file_utils import read_lines, write_file, write_if_changed
+from utils.manifest_index import find_documents, get_manifest_index
+from utils.manifest_session import ManifestSession
+from utils.pipeline_utils import PipelineModel
+from utils.timing import timed
 
 logger = logging.getLogger(__name__)
 
-placeholder_map = {}
+@timed('secret.deployment')
+def add_secretmap_to_eks_deployment(file_path, microservice_name, secretmap_options, base_dir=None, session=None, target_containers=None):
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(file_path))
 
-def add_secretmap_to_eks_deployment(file_path, microservice_name, secretmap_options):
-    try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-
-            placeholder_map.clear()
-            def replace_placeholder(match):
-                placeholder = f'__PLACEHOLDER_{len(placeholder_map) + 1}__'
-                placeholder_map[placeholder] = match.group(0)
-                return placeholder
-
-            content = re.sub(r'\{\{.*?\}\}', replace_placeholder, content)
-
-        yaml_data = list(yaml.load_all(content))
-
-        for doc in yaml_data:
-            if isinstance(doc, dict) and doc.get('kind') == 'Deployment':
-                container_spec = doc['spec']['template']['spec']['containers'][0]
-                env_vars = container_spec.get('env', [])
-
-                insert_index = len(env_vars)
-                for i, env in reversed(list(enumerate(env_vars))):
-                    if 'secretKeyRef' in env.get('valueFrom', {}):
-                        insert_index = i + 1
-                        break
-
-                try:
-                    secretmap_name = get_secretmap_name('eks-config-secrets.yaml')
-                except ValueError as e:
-                    logger.warning(str(e))
-                    secretmap_name = None
-
-                secretmap_name = secretmap_name or microservice_name
+    owns_session = session is None
+    if owns_session:
+        session = ManifestSession(file_path)
 
-                for secret_key, _ in secretmap_options.items():
-                    new_env = {
+    try:
+        try:
+            secretmap_name = get_secretmap_name(os.path.join(base_dir, 'eks-config-secrets.yaml'))
+        except ValueError as e:
+            logger.warning(str(e))
+            secretmap_name = None
+
+        secretmap_name = secretmap_name or microservice_name
+
+        if env_names_present(session.index, list(secretmap_options), target_containers):
+            logger.info(f"All Secret entries are already present in {file_path}")
+            return
+
+        for doc in session.deployments():
+            for container_spec in select_containers(doc, target_containers):
+                new_envs = [
+                    {
                         'name': secret_key,
                         'valueFrom': {
                             'secretKeyRef': {
@@ -57,21 +45,15 @@ def add_secretmap_to_eks_deployment(file_path, microservice_name, secretmap_opti
                             }
                         }
                     }
-                    env_vars.insert(insert_index, new_env)
-                    insert_index += 1
-
-                container_spec['env'] = env_vars
+                    for secret_key in secretmap_options
+                ]
 
-        with open(file_path, 'w') as file:
-            yaml.dump_all(yaml_data, file)
+                inserted, _ = upsert_env_vars(container_spec, new_envs, after_ref='secretKeyRef')
+                if inserted < len(new_envs):
+                    logger.info(f"Skipped {len(new_envs) - inserted} Secret entries already present in container {container_spec.get('name')}")
 
-        with open(file_path, 'r+') as file:
-            content = file.read()
-            for placeholder, original_value in placeholder_map.items():
-                content = content.replace(placeholder, original_value)
-            file.seek(0)
-            file.write(content)
-            file.truncate()
+        if owns_session:
+            session.commit()
 
         logger.info(f"Secret entries added to the container specification in {file_path}")
 
@@ -136,35 +118,47 @@ def add_secretmap_entries(uncommented_lines, secretmap_options):
             key = line.split(':')[0].strip()
             existing_keys.add(key)
 
+    # Second pass: build the entries for keys that are not present yet
+    new_entries = []
+    for secret_key, _ in secretmap_options.items():
+        uppercase_key = secret_key.upper()
+        if uppercase_key not in existing_keys:
+            camel_case_key = to_camel_case(secret_key)
+            new_entries.append(f'  {uppercase_key}: "{{{{{camel_case_key}}}}}"\n')
+
     # If data section not found, add it
     if not data_section_found:
         new_lines.append('data:\n')
 
-    # Ensure there's a newline before adding new entries if the last line isn't empty
-    if new_lines and new_lines[-1].strip() != '' and data_section_found:
+    # Ensure there's a newline before adding new entries if the last line isn't empty.
+    # Skipped when every key is already present, so a repeated run leaves the file byte-identical.
+    if new_entries and new_lines and new_lines[-1].strip() != '' and data_section_found:
         new_lines.append('\n')
 
-    # Second pass: add new entries
-    for secret_key, _ in secretmap_options.items():
-        uppercase_key = secret_key.upper()
-        if uppercase_key not in existing_keys:
-            camel_case_key = to_camel_case(secret_key)
-            new_lines.append(f'  {uppercase_key}: "{{{{{camel_case_key}}}}}"\n')
+    new_lines.extend(new_entries)
+    return new_lines
+
+def remove_secretmap_entries(uncommented_lines, keys):
+    """Remove the data entries of keys, the counterpart of add_secretmap_entries."""
+    keys = {key.upper() for key in keys}
+    new_lines = []
+    data_section_found = False
+
+    for line in uncommented_lines:
+        if line.strip() == 'data:':
+            data_section_found = True
+        elif data_section_found and ':' in line and line.split(':')[0].strip() in keys:
+            continue
+        new_lines.append(line)
 
     return new_lines
 
 def get_secretmap_name(file_path):
     try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            uncommented = '\n'.join(line for line in content.split('\n') if not line.strip().startswith('#'))
-            if uncommented.strip():
-                data = yaml.load(uncommented)
-            else:
-                data = yaml.load(content)
-        
-        if data and isinstance(data, dict):
-            return data.get('metadata', {}).get('name')
+        documents = find_documents(get_manifest_index(file_path))
+
+        if documents:
+            return documents[0]['name']
         else:
             logger.warning(f"No valid Secret name found in {file_path}")
             return None
@@ -185,8 +179,7 @@ def update_eks_secret_maps(file_path, microservice_name, secretmap_options):
     uncommented_lines = add_secretmap_entries(uncommented_lines, secretmap_options)
 
 
-    with open(secretmap_file_path, 'w') as secretmap_file:
-        secretmap_file.writelines(uncommented_lines)
+    write_if_changed(secretmap_file_path, ''.join(uncommented_lines))
 
     logger.info(f"Secret entries added successfully to {secretmap_file_path}")
     print("Secret entries added successfully to the deployment.")
@@ -197,24 +190,21 @@ def to_camel_case(s):
     # Capitalize all words except the first one
     return words[0] + ''.join(word.capitalize() for word in words[1:])
 
-def update_azure_pipeline_secret(file_path, secretmap_options):
+@timed('pipeline.secret')
+def update_azure_pipeline_secret(file_path, secretmap_options, transaction=None, pipeline=None):
     if not secretmap_options:
         return
 
     try:
-        with open(file_path, 'r') as file:
-            content = file.readlines()
-
-        for i, line in enumerate(content):
-            if line.strip().startswith('secretMapTemplate=`cat eks-config-secrets.yaml'):
-                new_line = line.rstrip()[:-1]  # Remove the last backtick
-                for key in secretmap_options:
-                    new_line += f' | sed "s/{{{{' + to_camel_case(key) + '}}/$(' + key.upper() + ')/g"'
-                new_line += '`\n'
-                content[i] = new_line
-
-        with open(file_path, 'w') as file:
-            file.writelines(content)
+        model = pipeline or PipelineModel(read_lines(file_path, transaction))
+
+        for step in model.render_steps('secretMapTemplate', 'eks-config-secrets.yaml'):
+            model.add_substitutions(step, [
+                ('{{' + to_camel_case(key) + '}}', '$(' + key.upper() + ')') for key in secretmap_options
+            ])
+
+        if pipeline is None:
+            write_file(file_path, model.content, transaction)
         print(f"Updated Azure pipeline CD file with secrets: {file_path}")
         logger.info(f"Updated Azure pipeline CD file with secrets: {file_path}")
     except Exception as e:
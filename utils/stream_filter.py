@@ -0,0 +1,95 @@
+import logging
+
+from utils.env_editor import env_names_present, select_containers, upsert_env_vars
+from utils.manifest_index import DOCUMENT_SEPARATOR_PATTERN, index_document
+from utils.manifest_session import ManifestDocument
+from utils.timing import span
+
+logger = logging.getLogger(__name__)
+
+# The other options add documents and pipeline steps that need a repo
+FILTER_OPTIONS = ('Config-map', 'Secret')
+
+# Reference kind of each option's env entries, and the kind they go after/before
+ENV_REFS = {
+    'Config-map': ('configmap_options', 'configMapKeyRef', 'secretKeyRef'),
+    'Secret': ('secretmap_options', 'secretKeyRef', None),
+}
+
+
+def iter_documents(stream):
+    """
+    Yield the documents of a binary stream one at a time, each starting at its '---'
+    separator line. Only the current document is held in memory.
+    """
+    lines = []
+    for line in stream:
+        if lines and DOCUMENT_SEPARATOR_PATTERN.match(line):
+            yield b''.join(lines)
+            lines = []
+        lines.append(line)
+    if lines:
+        yield b''.join(lines)
+
+
+def filter_document(buffer, selection, app=None):
+    """
+    Apply the env entries of a selection to one document.
+
+    Documents other than Deployments (of app, when given) and Deployments that already
+    hold every entry are returned as they are, without being parsed.
+    """
+    entry = index_document(buffer, 0, len(buffer))
+    if entry['kind'] != 'Deployment' or (app and entry['app'] != app):
+        return buffer
+
+    target_containers = selection['target_containers']
+    wanted = []
+    for option, (options_key, ref, before_ref) in ENV_REFS.items():
+        if option in selection['options'] and selection[options_key]:
+            names = [key.upper() for key in selection[options_key]]
+            if not env_names_present([entry], names, target_containers):
+                wanted.append((names, ref, before_ref))
+    if not wanted:
+        return buffer
+
+    document = ManifestDocument(memoryview(buffer), entry)
+    deployment = document.parse()
+    if not isinstance(deployment, dict) or deployment.get('kind') != 'Deployment':
+        return buffer
+
+    # The ConfigMap and Secret are named after the microservice, as in the repo files
+    ref_name = entry['app'] or deployment['metadata'].get('name')
+    for container in select_containers(deployment, target_containers):
+        for names, ref, before_ref in wanted:
+            entries = [{'name': name, 'valueFrom': {ref: {'name': ref_name, 'key': name}}} for name in names]
+            upsert_env_vars(container, entries, after_ref=ref, before_ref=before_ref)
+
+    return bytes(document.render('\r\n' if b'\r\n' in buffer else '\n'))
+
+
+def filter_stream(input_stream, output_stream, selection, app=None):
+    """
+    Copy a multi-document manifest from input_stream to output_stream, adding the
+    selected ConfigMap and Secret env entries to its Deployments on the way.
+
+    Memory use is bounded by the largest single document, not by the input size.
+
+    Returns:
+        tuple: The number of documents and the number of them that were changed.
+    """
+    unsupported = [option for option in selection['options'] if option not in FILTER_OPTIONS]
+    if unsupported:
+        raise ValueError(f"Filter mode only supports {' and '.join(FILTER_OPTIONS)}, not {', '.join(unsupported)}")
+
+    documents = changed = 0
+    for buffer in iter_documents(input_stream):
+        with span('filter.document'):
+            output = filter_document(buffer, selection, app)
+        output_stream.write(output)
+        documents += 1
+        changed += output is not buffer
+
+    output_stream.flush()
+    logger.info(f"Filtered {documents} documents, {changed} changed")
+    return documents, changed
@@ -0,0 +1,149 @@
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Span name -> [count, total seconds, max seconds]
+_spans = {}
+_spans_lock = threading.Lock()
+_profiler = None
+_profile_start = None
+_cprofile_path = None
+_trace_memory = False
+
+
+@contextmanager
+def span(name):
+    """Time a stage of the run. Spans with the same name are aggregated."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, elapsed, count=1):
+    with _spans_lock:
+        stats = _spans.get(name)
+        if stats is None:
+            _spans[name] = [count, elapsed, elapsed]
+        else:
+            stats[0] += count
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+
+def reset():
+    with _spans_lock:
+        _spans.clear()
+
+
+def get_report():
+    """Return the recorded spans as a list of dicts, slowest total first."""
+    with _spans_lock:
+        spans = sorted(((name, list(stats)) for name, stats in _spans.items()), key=lambda item: item[1][1], reverse=True)
+    return [
+        {'span': name, 'count': count, 'total': total, 'mean': total / count, 'max': maximum}
+        for name, (count, total, maximum) in spans
+    ]
+
+
+def merge_report(report):
+    """Add spans recorded elsewhere, e.g. returned by a fleet worker process."""
+    for entry in report:
+        record(entry['span'], entry['total'], entry['count'])
+        with _spans_lock:
+            _spans[entry['span']][2] = max(_spans[entry['span']][2], entry['max'])
+
+
+def format_report(report, wall_time=None):
+    lines = [f"{'span':<32} {'count':>6} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>10} {'% wall':>7}"]
+    for entry in report:
+        share = f"{100 * entry['total'] / wall_time:>6.1f}%" if wall_time else f"{'-':>7}"
+        lines.append(
+            f"{entry['span']:<32} {entry['count']:>6} {entry['total']:>10.4f} "
+            f"{entry['mean'] * 1000:>10.2f} {entry['max'] * 1000:>10.2f} {share}"
+        )
+    if wall_time:
+        lines.append(f"wall time: {wall_time:.4f}s")
+    return '\n'.join(lines)
+
+
+def start_profiling(cprofile_path=None, trace_memory=False):
+    """Reset the spans and optionally start cProfile and tracemalloc."""
+    global _profiler, _profile_start, _cprofile_path, _trace_memory
+
+    reset()
+    _cprofile_path = cprofile_path
+    _trace_memory = trace_memory
+
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    if cprofile_path:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+    _profile_start = time.perf_counter()
+
+
+def stop_profiling(json_path=None, stream=None):
+    """
+    Print the span summary table and write the optional JSON, cProfile and tracemalloc outputs.
+
+    The report goes to stderr by default so stdout stays usable for piped output.
+    """
+    global _profiler
+
+    stream = stream or sys.stderr
+    wall_time = time.perf_counter() - _profile_start if _profile_start else None
+    report = get_report()
+    result = {'wall_time': wall_time, 'spans': report}
+
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_cprofile_path)
+        _profiler = None
+        print(f"cProfile stats written to {_cprofile_path} (view with: python -m pstats {_cprofile_path})", file=stream)
+
+    if _trace_memory:
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top_allocations = [
+            {'location': str(statistic.traceback[0]), 'size': statistic.size, 'count': statistic.count}
+            for statistic in snapshot.statistics('lineno')[:10]
+        ]
+        result['memory'] = {'current': current, 'peak': peak, 'top_allocations': top_allocations}
+
+    print(format_report(report, wall_time), file=stream)
+    if 'memory' in result:
+        print(f"memory: peak {result['memory']['peak'] / 1024:.0f} KiB, current {result['memory']['current'] / 1024:.0f} KiB", file=stream)
+        for allocation in result['memory']['top_allocations']:
+            print(f"  {allocation['size'] / 1024:>8.1f} KiB  {allocation['location']}", file=stream)
+
+    if json_path:
+        with open(json_path, 'w') as json_file:
+            json.dump(result, json_file, indent=2)
+        logger.info(f"Profile report written to {json_path}")
+
+    return result
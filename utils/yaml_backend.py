@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# '{{token}}' placeholders are not valid plain YAML for the safe loaders, where '{'
+# starts a flow mapping. They are swapped for these single characters before a
+# read-only parse and swapped back in the loaded values.
+PLACEHOLDER_OPEN = '\u2983'
+PLACEHOLDER_CLOSE = '\u2984'
+
+READONLY_BACKENDS = ('pyyaml-c', 'ruamel-c', 'pyyaml', 'ruamel')
+
+_round_trip_yaml = None
+_readonly_loaders = {}
+
+# ruamel YAML instances keep per-call state. The shared instances are only used under
+# this lock, so server threads can share them (parsing holds the GIL anyway).
+_yaml_lock = threading.RLock()
+
+
+def _pyyaml_loader(accelerated):
+    import yaml
+
+    if accelerated:
+        if not getattr(yaml, '__with_libyaml__', False):
+            return None
+        loader_class = yaml.CSafeLoader
+    else:
+        loader_class = yaml.SafeLoader
+
+    return lambda text: list(yaml.load_all(text, Loader=loader_class))
+
+
+def _ruamel_loader(accelerated):
+    from ruamel.yaml import YAML
+
+    yaml = YAML(typ='safe', pure=not accelerated)
+    if accelerated:
+        try:
+            import _ruamel_yaml  # noqa: F401
+        except ImportError:
+            return None
+
+    def load(text):
+        with _yaml_lock:
+            return list(yaml.load_all(text))
+
+    return load
+
+
+def get_readonly_loader(backend=None):
+    """
+    Return a function that loads every document of a YAML string for read-only use.
+
+    Args:
+        backend (str): One of READONLY_BACKENDS. Defaults to the EKS_CONFIGURATOR_YAML_BACKEND
+            environment variable, or the fastest backend available (libyaml first).
+
+    Returns:
+        tuple: The backend name and the loader function.
+    """
+    backend = backend or os.environ.get('EKS_CONFIGURATOR_YAML_BACKEND')
+    candidates = [backend] if backend else READONLY_BACKENDS
+
+    for candidate in candidates:
+        if candidate not in _readonly_loaders:
+            if candidate not in READONLY_BACKENDS:
+                raise ValueError(f"Unknown YAML backend '{candidate}', expected one of {', '.join(READONLY_BACKENDS)}")
+            try:
+                if candidate.startswith('pyyaml'):
+                    loader = _pyyaml_loader(accelerated=candidate.endswith('-c'))
+                else:
+                    loader = _ruamel_loader(accelerated=candidate.endswith('-c'))
+            except ImportError:
+                loader = None
+            _readonly_loaders[candidate] = loader
+
+        if _readonly_loaders[candidate] is not None:
+            return candidate, _readonly_loaders[candidate]
+
+    raise RuntimeError(f"YAML backend '{backend}' is not available" if backend else "No YAML backend is available")
+
+
+def _restore_placeholders(node):
+    if isinstance(node, str):
+        if PLACEHOLDER_OPEN in node or PLACEHOLDER_CLOSE in node:
+            return node.replace(PLACEHOLDER_OPEN, '{{').replace(PLACEHOLDER_CLOSE, '}}')
+        return node
+    if isinstance(node, dict):
+        return {_restore_placeholders(key): _restore_placeholders(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_restore_placeholders(item) for item in node]
+    return node
+
+
+def safe_load_all(text, backend=None):
+    """
+    Load every document of a manifest for read-only queries.
+
+    Uses a libyaml-accelerated safe loader when available. '{{token}}' placeholders are
+    kept as strings. The result is plain dicts and lists, not round-trip nodes, so
+    it must not be dumped back to a file.
+    """
+    _, loader = get_readonly_loader(backend)
+    text = text.replace('{{', PLACEHOLDER_OPEN).replace('}}', PLACEHOLDER_CLOSE)
+    return [_restore_placeholders(document) for document in loader(text)]
+
+
+def round_trip_yaml():
+    """Return the shared placeholder-aware round-trip processor, for documents that get mutated."""
+    global _round_trip_yaml
+    if _round_trip_yaml is None:
+        from utils.placeholder_yaml import create_yaml
+        _round_trip_yaml = create_yaml()
+    return _round_trip_yaml
+
+
+def round_trip_load(text):
+    """Load one document with the shared round-trip processor. Safe to call from several threads."""
+    with _yaml_lock:
+        return round_trip_yaml().load(text)
+
+
+def round_trip_dump(data, stream):
+    """Dump one document with the shared round-trip processor. Safe to call from several threads."""
+    with _yaml_lock:
+        round_trip_yaml().dump(data, stream)